@@ -0,0 +1,141 @@
+"""
+Columnar Benchmark
+Times catalog filter queries over synthetic program-level records with the columnar store's vectorized masks
+versus filtering the record dicts field by field in Python
+
+Usage:
+    python -m benchmarks.bench_columnar [--rows 100000] [--repeat 50]
+"""
+
+import argparse
+import random
+import statistics
+import time
+from typing import Callable, Dict, List, Optional
+
+from services.columnar import ColumnarStore, match_text, parse_score_range, required_subjects
+from services.entities import canonical_value
+
+NAMES = [f"{prefix}{suffix}" for prefix in ("東京", "京都", "大阪", "東北", "名古屋", "九州", "北海道", "広島", "神戸", "千葉")
+         for suffix in ("大学", "工業大学", "医科大学", "学院大学", "女子大学")]
+FACULTIES = ["工学部", "理学部", "経済学部", "法学部", "医学部", "文学部", "情報学部", "教育学部", "農学部", "薬学部"]
+DEPARTMENTS = ["第一学科", "第二学科", "第三学科", "第四学科"]
+EXAM_TYPES = ["一般選抜", "総合型選抜", "学校推薦型選抜", "共通テスト利用"]
+REGIONS = ["北海道", "東北", "関東", "中部", "近畿", "中国", "四国", "九州・沖縄"]
+PREFECTURES = ["北海道", "宮城県", "東京都", "愛知県", "大阪府", "広島県", "香川県", "福岡県"]
+INSTITUTION_TYPES = ["国公立", "私立"]
+SUBJECT_POOL = ["数学", "英語", "国語", "物理", "化学", "生物", "地歴", "公民", "小論文", "面接"]
+
+QUERIES: Dict[str, Dict[str, str]] = {
+    "region": {"region": "関東"},
+    "region+faculty": {"region": "東北", "faculty": "工学"},
+    "deviation": {"deviation_score": "60.0-65.0"},
+    "typical": {"region": "関東", "institution_type": "国公立", "faculty": "工学部", "deviation_score": "55.0-65.0"},
+    "subjects": {"required_subjects": "数学: Ⅰ・Ⅱ・A・B / その他: 英語・物理", "common_test_score": "70-85%"},
+    "all": {
+        "region": "近畿", "prefecture": "大阪府", "institution_type": "私立", "faculty": "学",
+        "exam_type": "一般入試", "name_keyword": "大阪", "deviation_score": "50.0-70.0",
+        "common_test_score": "60-90%", "required_subjects": "その他: 英語",
+    },
+}
+
+
+def build_rows(count: int, seed: int = 7) -> List[tuple]:
+    rng = random.Random(seed)
+    rows = []
+    for index in range(count):
+        low = rng.randint(35, 72)
+        region_index = rng.randrange(len(REGIONS))
+        record = {
+            "id": f"u-{index:012x}",
+            "name": rng.choice(NAMES),
+            "faculty": rng.choice(FACULTIES),
+            "department": rng.choice(DEPARTMENTS),
+            "examType": rng.choice(EXAM_TYPES),
+            "deviationScore": f"{low}-{low + rng.choice((2.5, 5))}" if rng.random() < 0.95 else "",
+            "commonTestScore": f"{low + 20}-{low + 25}%",
+            "requiredSubjects": rng.sample(SUBJECT_POOL, rng.randint(1, 4)),
+        }
+        tags = {
+            "region": REGIONS[region_index],
+            "prefecture": PREFECTURES[region_index],
+            "institution_type": rng.choice(INSTITUTION_TYPES),
+        }
+        rows.append((record, tags, 1.0))
+    return rows
+
+
+def python_filter(rows: List[tuple], filters: Dict[str, str]) -> List[dict]:
+    """The same semantics as ``ColumnarStore.select``, one row dict at a time."""
+    deviation = parse_score_range(filters.get("deviation_score"))
+    common_test = parse_score_range(filters.get("common_test_score"))
+    subjects = set(required_subjects(filters.get("required_subjects")))
+    terms = {
+        field: match_text(canonical_value(field, filters[key]))
+        for key, field in (("name_keyword", "name"), ("faculty", "faculty"), ("exam_type", "examType"))
+        if filters.get(key)
+    }
+    matched = []
+    for record, tags, _ in rows:
+        if any(filters.get(key) and tags.get(key) != filters[key] for key in ("region", "prefecture", "institution_type")):
+            continue
+        if any(term not in match_text(record.get(field)) for field, term in terms.items()):
+            continue
+        ok = True
+        for bounds, field in ((deviation, "deviationScore"), (common_test, "commonTestScore")):
+            if bounds:
+                own = parse_score_range(record.get(field))
+                if own is None or own[1] < bounds[0] or own[0] > bounds[1]:
+                    ok = False
+                    break
+        if not ok:
+            continue
+        if subjects and not subjects <= set(required_subjects(" ".join(record["requiredSubjects"]))):
+            continue
+        matched.append(record)
+    return matched
+
+
+def _time(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--python-repeat", type=int, default=3, help="Repetitions of the slower per-row filter")
+    args = parser.parse_args(argv)
+
+    rows = build_rows(args.rows)
+    store = ColumnarStore()
+    started = time.perf_counter()
+    store.extend(rows)
+    append_seconds = time.perf_counter() - started
+
+    # 1割の行を置き換えてから詰め直す
+    replaced = [(dict(record), tags, 2.0) for record, tags, _ in rows[: args.rows // 10]]
+    store.extend(replaced)
+    started = time.perf_counter()
+    store.compact()
+    compact_ms = (time.perf_counter() - started) * 1000
+    store.query({}, limit=1)  # 並び順を作っておく
+
+    print(f"rows: {len(store):,}  append: {append_seconds:.2f}s  compact after {len(replaced):,} upserts: {compact_ms:.1f} ms")
+    print(f"{'query':<16} {'matches':>8} {'select ms':>10} {'query ms':>9} {'python ms':>10} {'speedup':>8}")
+    for name, filters in QUERIES.items():
+        select_ms = _time(lambda: store.select(filters), args.repeat)
+        query_ms = _time(lambda: store.query(filters, limit=50), args.repeat)
+        python_ms = _time(lambda: python_filter(rows, filters), args.python_repeat)
+        matches = store.count(filters)
+        assert matches == len(python_filter(rows, filters)), name
+        print(f"{name:<16} {matches:>8,} {select_ms:>10.3f} {query_ms:>9.3f} {python_ms:>10.1f} {python_ms / select_ms:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compression Benchmark
+Measures compression ratio and CPU time for search responses and SSE streams
+
+Usage:
+    python -m benchmarks.bench_compression
+"""
+
+import time
+from typing import List
+
+from benchmarks.bench_serialization import build_payload
+from services.compression import SUPPORTED_ENCODINGS, _Compressor
+from services.serialization import dumps, format_sse
+
+SIZES = (20, 200)
+
+
+def _compress_whole(encoding: str, body: bytes) -> bytes:
+    compressor = _Compressor(encoding, gzip_level=6, brotli_quality=4)
+    return compressor.compress(body) + compressor.finish()
+
+
+def _compress_stream(encoding: str, frames: List[bytes]) -> bytes:
+    # SSEモード: イベント境界ごとにフラッシュ
+    compressor = _Compressor(encoding, gzip_level=6, brotli_quality=4)
+    output = b"".join(compressor.compress(frame, flush=True) for frame in frames)
+    return output + compressor.finish()
+
+
+def _timed(func, *args, repeat: int = 10):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return result, best * 1000
+
+
+def run() -> None:
+    print(f"Encodings: {', '.join(SUPPORTED_ENCODINGS)}")
+    print(f"{'size':>6} {'payload':<22} {'enc':<5} {'bytes in':>10} {'bytes out':>10} {'ratio':>7} {'ms':>8}")
+    for size in SIZES:
+        universities = build_payload(size)
+        body = dumps({"universities": universities, "count": len(universities)})
+        frames = [format_sse("university", {"university": u}) for u in universities]
+        stream_size = sum(len(frame) for frame in frames)
+
+        for encoding in SUPPORTED_ENCODINGS:
+            compressed, elapsed = _timed(_compress_whole, encoding, body)
+            print(
+                f"{size:>6} {'/api/search':<22} {encoding:<5} {len(body):>10} {len(compressed):>10} "
+                f"{len(compressed) / len(body):>7.3f} {elapsed:>8.3f}"
+            )
+            compressed, elapsed = _timed(_compress_stream, encoding, frames)
+            print(
+                f"{size:>6} {'sse (flush per event)':<22} {encoding:<5} {stream_size:>10} {len(compressed):>10} "
+                f"{len(compressed) / stream_size:>7.3f} {elapsed:>8.3f}"
+            )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,243 @@
+"""
+Hot Path Benchmark
+Times normalization, source ranking and dedup of search_universities on synthetic Japanese datasets
+
+Usage:
+    python -m benchmarks.bench_hotpaths                 # print timings
+    python -m benchmarks.bench_hotpaths --save          # overwrite the stored baseline
+    python -m benchmarks.bench_hotpaths --compare       # exit 1 if a case is slower than the baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.summarize import (
+    SUMMARY_MAX_SOURCES,
+    _compact_result,
+    _dedupe_by_source,
+    _ensure_list_of_strings,
+    _normalize_university_entry,
+    _priority,
+    _result_priority,
+    _result_key,
+    _select_official_url,
+)
+from services.topk import TopKCollector
+
+SIZES = (100, 2000, 10000)
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "hotpaths.json")
+DEFAULT_THRESHOLD = 0.25
+
+NAMES = ["東京大学", "京都大学", "大阪大学", "東北大学", "名古屋大学", "九州大学", "北海道大学", "早稲田大学", "慶應義塾大学", "神戸大学"]
+FACULTIES = ["工学部", "理学部", "経済学部", "法学部", "医学部", "文学部", "情報学部"]
+EXAM_TYPES = ["一般選抜", "総合型選抜", "学校推薦型選抜", "共通テスト利用"]
+SUBJECTS = ["数学", "英語", "国語", "物理", "化学", "生物", "日本史", "世界史"]
+SOURCE_HOSTS = [
+    "passnavi.obunsha.co.jp/univ/",
+    "keinet.ne.jp/univ/",
+    "www.dnc.ac.jp/kyotsu/",
+    "www.example-u.ac.jp/admissions/",
+    "yozemi.ac.jp/nyushi/",
+    "www.toshin.com/univ/",
+    "manabi.benesse.ne.jp/univ/",
+]
+SEPARATORS = ["、", "・", ",", "\n", "，"]
+
+
+def _subject_value(rng: random.Random):
+    subjects = rng.sample(SUBJECTS, rng.randint(1, 4))
+    # LLMの出力は配列・区切り文字列のどちらも返ってくる
+    if rng.random() < 0.5:
+        return subjects
+    return rng.choice(SEPARATORS).join(subjects)
+
+
+def _source_urls(rng: random.Random, count: int) -> List[str]:
+    urls = []
+    for _ in range(count):
+        host = rng.choice(SOURCE_HOSTS)
+        scheme = rng.choice(["https://", "http://", "//", ""])
+        urls.append(f"{scheme}{host}{rng.randint(1, 99999)}")
+    return urls
+
+
+def build_raw_entries(size: int, seed: int = 42) -> List[dict]:
+    """Raw LLM-shaped entries with the inconsistencies ``_normalize_university_entry`` cleans up."""
+    rng = random.Random(seed)
+    entries = []
+    for index in range(size):
+        sources = _source_urls(rng, rng.randint(1, 5))
+        entries.append({
+            "id": index + 1,
+            "name": f" {rng.choice(NAMES)} ",
+            "officialUrl": rng.choice(["", f"www.u{index}.ac.jp", sources[0]]),
+            "faculty": rng.choice(FACULTIES),
+            "department": "",
+            "deviationScore": rng.choice(["55-60", "60-65", 62.5, None]),
+            "commonTestScore": rng.choice(["75-80%", "", None]),
+            "examType": rng.choice(EXAM_TYPES),
+            "requiredSubjects": _subject_value(rng),
+            "examDate": "2026年2月25日",
+            "examSchedules": "出願締切: 2026年1月20日\n試験日: 2026年2月25日\n合格発表: 2026年3月10日",
+            "admissionMethods": ["一般選抜: 前期日程", "共通テスト利用型"],
+            "subjectHighlights": rng.choice(["数学: 200点、英語: 150点", ["数学: 200点"]]),
+            "commonTestRatio": "共通テスト60% / 個別試験40%",
+            "selectionNotes": None,
+            "applicationDeadline": "2026年1月20日",
+            "aiSummary": "研究環境が充実しており、就職実績も高い。",
+            "sources": sources if rng.random() < 0.7 else ", ".join(sources),
+        })
+    return entries
+
+
+def build_search_results(size: int, seed: int = 7) -> List[dict]:
+    """Aggregated Tavily/Serper results as collected by the search fan-out."""
+    rng = random.Random(seed)
+    results = []
+    for index in range(size):
+        url = f"https://{rng.choice(SOURCE_HOSTS)}{index}"
+        key = "url" if rng.random() < 0.7 else "link"
+        results.append({"title": f"{rng.choice(NAMES)} 入試情報", key: url, "content": "偏差値・共通テスト得点率・入試日程"})
+    return results
+
+
+def build_cases(size: int) -> List[Tuple[str, Callable[[], object]]]:
+    raw_entries = build_raw_entries(size)
+    normalized = [_normalize_university_entry(entry) for entry in raw_entries]
+    list_values = [entry["requiredSubjects"] for entry in raw_entries]
+    url_inputs = [(entry["officialUrl"], entry["sources"]) for entry in raw_entries]
+    search_results = build_search_results(size)
+
+    return [
+        ("normalize_entries", lambda: [_normalize_university_entry(entry) for entry in raw_entries]),
+        ("ensure_list_of_strings", lambda: [_ensure_list_of_strings(value) for value in list_values]),
+        ("select_official_url", lambda: [_select_official_url(candidate, sources) for candidate, sources in url_inputs]),
+        (
+            "priority_sort",
+            lambda: sorted(search_results, key=lambda r: _priority(r.get("url") or r.get("link") or ""), reverse=True),
+        ),
+        ("topk_collect", lambda: _collect_top(search_results)),
+        ("dedupe_by_source", lambda: _dedupe_by_source(normalized)),
+    ]
+
+
+def _collect_top(search_results: List[dict]) -> List[dict]:
+    # ファンアウトと同じく1クエリ20件ずつ到着する想定
+    collector = TopKCollector(SUMMARY_MAX_SOURCES, priority=_result_priority, key=_result_key, compact=_compact_result)
+    for index, item in enumerate(search_results):
+        collector.offer(item, (index // 20, index % 20))
+    return collector.results()
+
+
+def measure(func: Callable[[], object], rounds: int, min_time: float = 0.2) -> Dict[str, float]:
+    """Run ``func`` for at least ``rounds`` rounds and ``min_time`` seconds; times are in milliseconds."""
+    func()  # ウォームアップ
+    timings: List[float] = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < rounds or time.perf_counter() < deadline:
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+        if len(timings) >= rounds * 20:
+            break
+    return {
+        "min_ms": round(min(timings), 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "stddev_ms": round(statistics.pstdev(timings), 4),
+        "rounds": len(timings),
+    }
+
+
+def run(sizes: Tuple[int, ...] = SIZES, rounds: int = 5) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    for size in sizes:
+        for name, func in build_cases(size):
+            results[f"{name}[{size}]"] = measure(func, rounds)
+    return results
+
+
+def load_baseline(path: str = BASELINE_PATH) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def save_baseline(results: Dict[str, Dict[str, float]], path: str = BASELINE_PATH) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(data, handle, indent=2, sort_keys=True)
+        handle.write("\n")
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: dict, threshold: float) -> List[str]:
+    """Return the cases whose median is more than ``threshold`` slower than the baseline."""
+    regressions = []
+    for case, stats in results.items():
+        base = baseline.get("results", {}).get(case)
+        if not base or not base.get("median_ms"):
+            continue
+        ratio = stats["median_ms"] / base["median_ms"]
+        if ratio > 1 + threshold:
+            regressions.append(f"{case}: {base['median_ms']:.3f} ms -> {stats['median_ms']:.3f} ms ({ratio:.2f}x)")
+    return regressions
+
+
+def format_table(results: Dict[str, Dict[str, float]], baseline: Optional[dict] = None) -> str:
+    lines = [f"{'case':<32} {'min ms':>10} {'median ms':>10} {'stddev':>8} {'rounds':>7} {'vs base':>8}"]
+    base_results = (baseline or {}).get("results", {})
+    for case, stats in results.items():
+        base = base_results.get(case)
+        delta = f"{stats['median_ms'] / base['median_ms']:.2f}x" if base and base.get("median_ms") else ""
+        lines.append(
+            f"{case:<32} {stats['min_ms']:>10.3f} {stats['median_ms']:>10.3f} "
+            f"{stats['stddev_ms']:>8.3f} {stats['rounds']:>7} {delta:>8}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="Fail when a case regresses past the threshold")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = run(rounds=args.rounds)
+    baseline = load_baseline(args.baseline)
+    print(format_table(results, baseline))
+
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if args.compare:
+        if baseline is None:
+            print(f"No baseline at {args.baseline}; run with --save first")
+            return 1
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Slower than baseline by more than {args.threshold:.0%}:")
+            print("\n".join(f"  {line}" for line in regressions))
+            return 1
+        print(f"No regressions above {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
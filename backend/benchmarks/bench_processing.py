@@ -0,0 +1,102 @@
+"""
+Processing Benchmark
+Measures event-loop lag while concurrent requests parse, normalize and dedupe large LLM responses
+inline on the loop versus in the thread and process pools
+
+Usage:
+    python -m benchmarks.bench_processing [--entries 2000] [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import List, Optional
+
+from services import processing
+from services.loop_monitor import LoopLagMonitor
+from services.processing import estimate_size, run_cpu
+from services.summarize import (
+    _dedupe_and_sort,
+    _extract_university_array,
+    _normalize_universities,
+    generate_mock_universities,
+)
+
+# (PROCESSING_INLINE_MAX, PROCESSING_PROCESS_MIN) for each mode
+MODES = {
+    "inline": (float("inf"), 0),
+    "thread": (0, 0),
+    "process": (0, 1),
+}
+
+
+def build_completion(entries: int) -> str:
+    """An LLM completion with prose around a JSON array of ``entries`` universities, some of them duplicated."""
+    base = generate_mock_universities()
+    universities = []
+    for index in range(entries):
+        entry = dict(base[index % len(base)])
+        entry["id"] = str(index + 1)
+        entry["name"] = f"{entry['name']} {index % (entries // 2 or 1)}"
+        universities.append(entry)
+    return f"以下が検索結果です。\n{json.dumps(universities, ensure_ascii=False)}\n以上です。"
+
+
+async def _handle(content: str) -> int:
+    universities = await run_cpu(_extract_university_array, content, size=len(content))
+    universities = await run_cpu(_normalize_universities, universities, size=estimate_size(universities))
+    universities = await run_cpu(_dedupe_and_sort, universities, size=estimate_size(universities))
+    return len(universities)
+
+
+async def run_mode(mode: str, content: str, concurrency: int, rounds: int) -> dict:
+    processing.PROCESSING_INLINE_MAX, processing.PROCESSING_PROCESS_MIN = MODES[mode]
+    # プールの起動コストを計測に含めないよう一度流しておく
+    await _handle(content)
+
+    monitor = LoopLagMonitor(interval=0.005, slow_threshold=0.05, history=1000)
+    monitor.start()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(_handle(content) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.02)
+    await monitor.stop()
+    processing.shutdown_pools()
+
+    snapshot = monitor.snapshot()
+    return {
+        "mode": mode,
+        "seconds": elapsed,
+        "lagP50": snapshot["lagMs"]["p50"],
+        "lagP99": snapshot["lagMs"]["p99"],
+        "lagMax": snapshot["lagMs"]["max"],
+        "stalls": len(snapshot["stalls"]),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=2000, help="Universities per LLM response")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--mode", action="append", choices=sorted(MODES), help="Only run the given mode(s)")
+    args = parser.parse_args(argv)
+
+    # 計測中の停止警告は表に集計する
+    logging.getLogger("services.loop_monitor").setLevel(logging.ERROR)
+    content = build_completion(args.entries)
+    print(f"response: {len(content):,} chars, {args.entries} entries, concurrency {args.concurrency}")
+    print(f"{'mode':<8} {'seconds':>8} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11} {'stalls':>7}")
+    for mode in args.mode or list(MODES):
+        result = asyncio.run(run_mode(mode, content, args.concurrency, args.rounds))
+        print(
+            f"{result['mode']:<8} {result['seconds']:>8.2f} {result['lagP50']:>11.2f} "
+            f"{result['lagP99']:>11.2f} {result['lagMax']:>11.2f} {result['stalls']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Serialization Benchmark
+Compares the pydantic response_model path with the fast JSON path
+
+Usage:
+    python -m benchmarks.bench_serialization
+"""
+
+import json
+import time
+from typing import Callable, List
+
+from main import SearchResponse
+from services.serialization import JSON_BACKEND, dumps, format_sse
+from services.summarize import _normalize_university_entry, generate_mock_universities
+
+SIZES = (20, 200, 2000)
+
+
+def build_payload(size: int) -> List[dict]:
+    """Build ``size`` normalized universities by cycling the mock records."""
+    base = generate_mock_universities()
+    universities = []
+    for index in range(size):
+        entry = dict(base[index % len(base)])
+        entry["id"] = str(index + 1)
+        universities.append(_normalize_university_entry(entry))
+    return universities
+
+
+def _measure(func: Callable[[], object], repeat: int) -> float:
+    """Return the best per-call time in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def run(repeat: int = 20) -> None:
+    print(f"JSON backend: {JSON_BACKEND}")
+    print(f"{'size':>6} {'case':<28} {'ms':>10} {'speedup':>8}")
+    for size in SIZES:
+        universities = build_payload(size)
+
+        def pydantic_response() -> bytes:
+            # FastAPIのresponse_model経由と同等: 検証 + シリアライズ
+            response = SearchResponse(universities=universities, count=len(universities))
+            return response.model_dump_json().encode("utf-8")
+
+        def fast_response() -> bytes:
+            return dumps({"universities": universities, "count": len(universities)})
+
+        def stdlib_sse() -> List[str]:
+            return [
+                f"event: result\ndata: {json.dumps({'university': u}, ensure_ascii=False)}\n\n"
+                for u in universities
+            ]
+
+        def fast_sse() -> List[bytes]:
+            return [format_sse("result", {"university": u}) for u in universities]
+
+        cases = [
+            ("response: pydantic", pydantic_response, None),
+            ("response: fast", fast_response, "response: pydantic"),
+            ("sse: json.dumps str", stdlib_sse, None),
+            ("sse: pre-encoded frames", fast_sse, "sse: json.dumps str"),
+        ]
+        timings = {}
+        for label, func, baseline in cases:
+            elapsed = _measure(func, repeat)
+            timings[label] = elapsed
+            speedup = f"{timings[baseline] / elapsed:.1f}x" if baseline else ""
+            print(f"{size:>6} {label:<28} {elapsed:>10.3f} {speedup:>8}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,212 @@
+"""
+Load Test
+Drives the search and chat endpoints at fixed concurrency levels and reports latency percentiles
+
+Start the upstream simulator and the backend pointed at it first (see README), then run:
+    python -m benchmarks.load_test --concurrency 1,4,16 --requests 32
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+SEARCH_PAYLOADS = [
+    {"region": "関東", "faculty": "工学部"},
+    {"region": "近畿", "faculty": "経済学部", "examType": "一般選抜"},
+    {"region": "九州", "faculty": "医学部", "useCommonTest": "あり"},
+    {"region": "東北", "faculty": "理学部", "deviationScore": "55-60"},
+    {"region": "中部", "faculty": "法学部", "institutionType": "国公立"},
+]
+CHAT_PAYLOAD = {"message": "情報系の学部を選ぶときに気をつけることは？", "history": []}
+
+ENDPOINTS = ("search", "search_stream", "chat_stream")
+
+
+@dataclass
+class RequestSample:
+    latency: float
+    first_event: Optional[float]
+    ok: bool
+
+
+@dataclass
+class LoadResult:
+    endpoint: str
+    concurrency: int
+    requests: int
+    errors: int
+    duration: float
+    throughput: float
+    p50: float
+    p95: float
+    p99: float
+    ttfe_p50: Optional[float]
+    ttfe_p95: Optional[float]
+    upstream_calls_per_request: Dict[str, float] = field(default_factory=dict)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; ``values`` need not be sorted."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+async def _post_json(client: httpx.AsyncClient, path: str, payload: dict) -> RequestSample:
+    started = time.perf_counter()
+    response = await client.post(path, json=payload)
+    latency = time.perf_counter() - started
+    return RequestSample(latency=latency, first_event=None, ok=response.status_code == 200)
+
+
+async def _post_stream(client: httpx.AsyncClient, path: str, payload: dict) -> RequestSample:
+    started = time.perf_counter()
+    first_event = None
+    ok = False
+    async with client.stream("POST", path, json=payload) as response:
+        async for line in response.aiter_lines():
+            if first_event is None and line.startswith("data:"):
+                first_event = time.perf_counter() - started
+            if line.startswith("event: error"):
+                break
+            if line.startswith("event: complete") or line.startswith("event: results"):
+                ok = response.status_code == 200
+    return RequestSample(latency=time.perf_counter() - started, first_event=first_event, ok=ok)
+
+
+def _request_factory(endpoint: str) -> Callable[[httpx.AsyncClient, int], Awaitable[RequestSample]]:
+    if endpoint == "search":
+        return lambda client, i: _post_json(client, "/api/search", SEARCH_PAYLOADS[i % len(SEARCH_PAYLOADS)])
+    if endpoint == "search_stream":
+        return lambda client, i: _post_stream(client, "/api/search/stream", SEARCH_PAYLOADS[i % len(SEARCH_PAYLOADS)])
+    if endpoint == "chat_stream":
+        return lambda client, i: _post_stream(client, "/api/chat/stream", CHAT_PAYLOAD)
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+async def _simulator_calls(client: Optional[httpx.AsyncClient]) -> Dict[str, int]:
+    if client is None:
+        return {}
+    try:
+        response = await client.get("/_stats")
+        return response.json().get("calls", {})
+    except httpx.HTTPError:
+        return {}
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    simulator: Optional[httpx.AsyncClient],
+    endpoint: str,
+    concurrency: int,
+    total_requests: int,
+) -> LoadResult:
+    send = _request_factory(endpoint)
+    samples: List[RequestSample] = []
+    counter = iter(range(total_requests))
+
+    async def worker() -> None:
+        for index in counter:
+            try:
+                samples.append(await send(client, index))
+            except httpx.HTTPError:
+                samples.append(RequestSample(latency=0.0, first_event=None, ok=False))
+
+    calls_before = await _simulator_calls(simulator)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+    calls_after = await _simulator_calls(simulator)
+
+    latencies = [s.latency for s in samples if s.ok]
+    first_events = [s.first_event for s in samples if s.ok and s.first_event is not None]
+    upstream_calls = {
+        upstream: round((calls_after.get(upstream, 0) - calls_before.get(upstream, 0)) / max(len(samples), 1), 2)
+        for upstream in sorted(set(calls_after) | set(calls_before))
+    }
+    return LoadResult(
+        endpoint=endpoint,
+        concurrency=concurrency,
+        requests=len(samples),
+        errors=sum(1 for s in samples if not s.ok),
+        duration=round(duration, 3),
+        throughput=round(len(latencies) / duration, 3) if duration else 0.0,
+        p50=round(percentile(latencies, 50), 4),
+        p95=round(percentile(latencies, 95), 4),
+        p99=round(percentile(latencies, 99), 4),
+        ttfe_p50=round(percentile(first_events, 50), 4) if first_events else None,
+        ttfe_p95=round(percentile(first_events, 95), 4) if first_events else None,
+        upstream_calls_per_request=upstream_calls,
+    )
+
+
+async def run(
+    base_url: str,
+    simulator_url: Optional[str],
+    endpoints: List[str],
+    concurrency_levels: List[int],
+    total_requests: int,
+    timeout: float = 300.0,
+) -> List[LoadResult]:
+    results = []
+    limits = httpx.Limits(max_connections=max(concurrency_levels) * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        simulator = httpx.AsyncClient(base_url=simulator_url, timeout=10.0) if simulator_url else None
+        try:
+            for endpoint in endpoints:
+                for concurrency in concurrency_levels:
+                    results.append(await run_level(client, simulator, endpoint, concurrency, total_requests))
+        finally:
+            if simulator is not None:
+                await simulator.aclose()
+    return results
+
+
+def format_table(results: List[LoadResult]) -> str:
+    lines = [
+        f"{'endpoint':<14} {'conc':>4} {'reqs':>5} {'err':>4} {'req/s':>7} "
+        f"{'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'ttfe50':>7} {'ttfe95':>7}  upstream calls/req"
+    ]
+    for r in results:
+        ttfe50 = f"{r.ttfe_p50:.3f}" if r.ttfe_p50 is not None else "-"
+        ttfe95 = f"{r.ttfe_p95:.3f}" if r.ttfe_p95 is not None else "-"
+        calls = ", ".join(f"{k}={v}" for k, v in r.upstream_calls_per_request.items()) or "-"
+        lines.append(
+            f"{r.endpoint:<14} {r.concurrency:>4} {r.requests:>5} {r.errors:>4} {r.throughput:>7.2f} "
+            f"{r.p50:>7.3f} {r.p95:>7.3f} {r.p99:>7.3f} {ttfe50:>7} {ttfe95:>7}  {calls}"
+        )
+    return "\n".join(lines)
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--simulator-url", default="http://127.0.0.1:8100", help="Empty to skip upstream call counts")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"Comma separated subset of {', '.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--json", dest="json_path", default="", help="Also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = _parse_args(argv)
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    results = asyncio.run(run(args.base_url, args.simulator_url or None, endpoints, levels, args.requests))
+    print(format_table(results))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump([asdict(r) for r in results], handle, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Upstream Simulator
+Local stand-in for the Tavily, Serper and Hugging Face Chat Completions APIs
+
+Point the backend at it with:
+    TAVILY_API_URL=http://127.0.0.1:8100/tavily/search
+    SERPER_API_URL=http://127.0.0.1:8100/serper/search
+    HF_API_BASE_URL=http://127.0.0.1:8100/hf/v1
+    HF_API_KEY=dummy TAVILY_API_KEY=dummy
+
+Usage:
+    python -m benchmarks.upstream_simulator --port 8100 --latency hf=800,0.4 --rate-limit 0.02
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+UNIVERSITY_POOL = [
+    ("東京大学", "https://www.u-tokyo.ac.jp/", "関東", "東京都"),
+    ("京都大学", "https://www.kyoto-u.ac.jp/", "近畿", "京都府"),
+    ("大阪大学", "https://www.osaka-u.ac.jp/", "近畿", "大阪府"),
+    ("東北大学", "https://www.tohoku.ac.jp/", "東北", "宮城県"),
+    ("名古屋大学", "https://www.nagoya-u.ac.jp/", "中部", "愛知県"),
+    ("九州大学", "https://www.kyushu-u.ac.jp/", "九州", "福岡県"),
+    ("北海道大学", "https://www.hokudai.ac.jp/", "北海道", "北海道"),
+    ("早稲田大学", "https://www.waseda.jp/", "関東", "東京都"),
+    ("慶應義塾大学", "https://www.keio.ac.jp/", "関東", "東京都"),
+    ("神戸大学", "https://www.kobe-u.ac.jp/", "近畿", "兵庫県"),
+    ("広島大学", "https://www.hiroshima-u.ac.jp/", "中国", "広島県"),
+    ("筑波大学", "https://www.tsukuba.ac.jp/", "関東", "茨城県"),
+]
+
+
+@dataclass
+class LatencyProfile:
+    """Log-normal latency with the given median; ``sigma`` controls the tail."""
+
+    median_ms: float
+    sigma: float = 0.3
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        return self.median_ms * math.exp(rng.gauss(0.0, self.sigma)) / 1000
+
+    @classmethod
+    def parse(cls, value: str) -> "LatencyProfile":
+        median, _, sigma = value.partition(",")
+        return cls(float(median), float(sigma) if sigma else 0.3)
+
+
+@dataclass
+class SimulatorConfig:
+    latency: Dict[str, LatencyProfile] = field(default_factory=lambda: {
+        "tavily": LatencyProfile(300),
+        "serper": LatencyProfile(200),
+        "hf": LatencyProfile(1500, 0.5),
+    })
+    # ストリーミング時のトークン間隔（秒）
+    token_interval: float = 0.02
+    rate_limit_ratio: float = 0.0
+    retry_after: int = 1
+    results_per_search: int = 8
+    seed: Optional[int] = None
+
+
+def _stable_index(text: str, modulo: int) -> int:
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16) % modulo
+
+
+def _pick_universities(text: str, count: int) -> List[tuple]:
+    start = _stable_index(text, len(UNIVERSITY_POOL))
+    return [UNIVERSITY_POOL[(start + offset) % len(UNIVERSITY_POOL)] for offset in range(count)]
+
+
+def _search_hits(query: str, count: int) -> List[dict]:
+    hits = []
+    for index, (name, url, region, prefecture) in enumerate(_pick_universities(query, count)):
+        hits.append({
+            "title": f"{name} 入試情報 | {region}",
+            "url": f"{url}admissions/{_stable_index(query, 1000)}-{index}",
+            "content": f"{name}（{prefecture}）の入試情報。偏差値 60-65、共通テスト得点率 75-80%。一般選抜・総合型選抜を実施。",
+        })
+    return hits
+
+
+def _university_entries(prompt: str) -> List[dict]:
+    entries = []
+    for name, url, region, prefecture in _pick_universities(prompt, 3):
+        entries.append({
+            "name": name,
+            "officialUrl": url,
+            "faculty": "工学部",
+            "department": "情報工学科",
+            "deviationScore": "60-65",
+            "commonTestScore": "75-80%",
+            "examType": "一般選抜",
+            "requiredSubjects": ["数学", "英語", "理科"],
+            "examDate": "2026年2月25日",
+            "examSchedules": ["出願締切: 2026年1月20日", "試験日: 2026年2月25日"],
+            "admissionMethods": ["一般選抜: 前期日程"],
+            "subjectHighlights": ["数学: 200点"],
+            "commonTestRatio": "共通テスト50% / 個別試験50%",
+            "selectionNotes": "",
+            "applicationDeadline": "2026年1月20日",
+            "aiSummary": f"{region}の{name}。シミュレーターが生成したデータです。",
+            "sources": [url],
+            "region": region,
+            "prefecture": prefecture,
+        })
+    return entries
+
+
+def _completion_text(messages: List[dict]) -> str:
+    """Answer in the shape each backend prompt expects."""
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    if '"matches"' in system:
+        return json.dumps({"matches": True, "reason": "シミュレーター: 条件に合致"}, ensure_ascii=False)
+    if "JSON" in system or "JSON" in user:
+        return json.dumps(_university_entries(user), ensure_ascii=False)
+    return f"シミュレーターの回答です。ご質問「{user[:40]}」について、志望校の入試情報を確認しましょう。"
+
+
+def _usage(messages: List[dict], text: str) -> dict:
+    prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 2
+    completion_tokens = max(1, len(text) // 2)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+def create_app(config: SimulatorConfig) -> FastAPI:
+    app = FastAPI(title="UniNavi Upstream Simulator")
+    rng = random.Random(config.seed)
+    calls: Counter = Counter()
+    rate_limited: Counter = Counter()
+
+    async def _admit(upstream: str) -> Optional[JSONResponse]:
+        calls[upstream] += 1
+        profile = config.latency.get(upstream)
+        if profile is not None:
+            await asyncio.sleep(profile.sample(rng))
+        if config.rate_limit_ratio and rng.random() < config.rate_limit_ratio:
+            rate_limited[upstream] += 1
+            return JSONResponse(
+                {"error": "rate limited"},
+                status_code=429,
+                headers={"Retry-After": str(config.retry_after)},
+            )
+        return None
+
+    @app.get("/_stats")
+    def stats():
+        return {"calls": dict(calls), "rateLimited": dict(rate_limited)}
+
+    @app.post("/_reset")
+    def reset():
+        calls.clear()
+        rate_limited.clear()
+        return {"status": "ok"}
+
+    @app.post("/tavily/search")
+    async def tavily_search(request: Request):
+        body = await request.json()
+        rejected = await _admit("tavily")
+        if rejected is not None:
+            return rejected
+        count = min(int(body.get("max_results", config.results_per_search)), config.results_per_search)
+        return {"query": body.get("query", ""), "results": _search_hits(body.get("query", ""), count)}
+
+    @app.post("/serper/search")
+    async def serper_search(request: Request):
+        body = await request.json()
+        rejected = await _admit("serper")
+        if rejected is not None:
+            return rejected
+        count = min(int(body.get("num", config.results_per_search)), config.results_per_search)
+        hits = _search_hits(body.get("q", ""), count)
+        return {"organic": [{"title": h["title"], "link": h["url"], "snippet": h["content"]} for h in hits]}
+
+    @app.post("/hf/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "simulator")
+        if body.get("stream"):
+            calls["hf"] += 1
+            return StreamingResponse(_stream_completion(model, messages), media_type="text/event-stream")
+        rejected = await _admit("hf")
+        if rejected is not None:
+            return rejected
+        text = _completion_text(messages)
+        return {
+            "id": f"sim-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": _usage(messages, text),
+        }
+
+    async def _stream_completion(model: str, messages: List[dict]) -> AsyncIterator[str]:
+        # 最初のトークンまでの遅延はHFのレイテンシ分布の一部として扱う
+        profile = config.latency.get("hf")
+        if profile is not None:
+            await asyncio.sleep(profile.sample(rng) / 4)
+        text = _completion_text(messages)
+        for start in range(0, len(text), 4):
+            chunk = {"model": model, "choices": [{"index": 0, "delta": {"content": text[start:start + 4]}}]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            await asyncio.sleep(config.token_interval)
+        final = {"model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": _usage(messages, text)}
+        yield f"data: {json.dumps(final, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return app
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument(
+        "--latency",
+        action="append",
+        default=[],
+        metavar="UPSTREAM=MEDIAN_MS[,SIGMA]",
+        help="Latency profile per upstream (tavily, serper, hf); may be repeated",
+    )
+    parser.add_argument("--token-interval", type=float, default=0.02, help="Seconds between streamed chunks")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429")
+    parser.add_argument("--results", type=int, default=8, help="Results returned per search call")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+
+    args = _parse_args(argv)
+    config = SimulatorConfig(
+        token_interval=args.token_interval,
+        rate_limit_ratio=args.rate_limit,
+        retry_after=args.retry_after,
+        results_per_search=args.results,
+        seed=args.seed,
+    )
+    for item in args.latency:
+        upstream, _, value = item.partition("=")
+        config.latency[upstream.strip()] = LatencyProfile.parse(value)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
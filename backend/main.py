@@ -5,34 +5,231 @@ Main application entry point
 
 import asyncio
 import contextlib
-import json
 
-from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import os
 import logging
+import secrets
 import traceback
-# .envから環境変数をロードするためにdotenvライブラリを追加
-from dotenv import load_dotenv # 追加
-
-# 環境変数ロード
-load_dotenv() # 追加: .envファイルから環境変数を読み込む
 
 # インポートは前回の修正のまま（ファイル名がservices/ai_search.pyの場合）
 from services.ai_search import chat_with_ai, chat_with_ai_stream 
-from services.summarize import search_universities
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from services import summarize
+from services.summarize import (
+    initialize_model,
+    preload_static_data,
+    refresh_search,
+    search_result_cache,
+    search_universities,
+    seed_suggest_index,
+    speculative_prefetcher,
+)
+from services.suggest import NODE_TOP_K, SUGGEST_LIMIT, suggest_index
+from services.http_client import close_pool, warm_up
+from services.processing import shutdown_pools
+from services.catalog import university_catalog
+from services.verdict_model import verdict_model
+from services.refresh import (
+    REFRESH_BUDGET_CALLS,
+    REFRESH_ENABLED,
+    REFRESH_HOURS,
+    REFRESH_INTERVAL_SECONDS,
+    REFRESH_JITTER,
+    REFRESH_MAX_AGE_HOURS,
+    REFRESH_MIN_REQUESTS,
+    REFRESH_RETRY_MINUTES,
+    REFRESH_TOP_N,
+    RefreshScheduler,
+    filter_popularity,
 )
+from services.startup import FirstRequestTimer, startup_state
+from services.admission import AdmissionController, AdmissionRejected, AdmissionTicket
+from services.metrics import registry as metrics_registry
+from services.tracing import begin_trace, exporter as trace_exporter, use_span
+from services.logging_config import PAYLOAD, RequestIdMiddleware, configure_logging
+from services.loop_monitor import LOOP_MONITOR_ENABLED, loop_monitor, sample_stacks
+from services.compression import CompressionMiddleware, compression_stats, parse_exclude_paths
+from services.serialization import FAST_JSON_ENABLED, JSON_BACKEND, FastJSONResponse, format_sse
+from services.search_jobs import SearchJob, SearchJobStore
+from services.streaming import CoalescingEventQueue, UniversityRefTracker
+
+# Configure logging (LOG_LEVEL / LOG_FORMAT)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="UniNavi API", version="1.0.0")
+# SSEキューの上限（遅いクライアントに対するバックプレッシャー）
+SEARCH_STREAM_QUEUE_SIZE = int(os.getenv("SEARCH_STREAM_QUEUE_SIZE", "64"))
+# 完了した検索ジョブを保持する秒数（再接続時のリプレイ用）
+SEARCH_JOB_TTL_SECONDS = float(os.getenv("SEARCH_JOB_TTL_SECONDS", "600"))
+
+search_jobs = SearchJobStore(ttl_seconds=SEARCH_JOB_TTL_SECONDS)
+
+# 検索パイプラインの同時実行数と待ち行列の上限
+SEARCH_MAX_CONCURRENT = int(os.getenv("SEARCH_MAX_CONCURRENT", "4"))
+SEARCH_MAX_QUEUE = int(os.getenv("SEARCH_MAX_QUEUE", "16"))
+SEARCH_MAX_QUEUE_WAIT_SECONDS = float(os.getenv("SEARCH_MAX_QUEUE_WAIT_SECONDS", "15"))
+
+admission = AdmissionController(
+    max_concurrent=SEARCH_MAX_CONCURRENT,
+    max_queue=SEARCH_MAX_QUEUE,
+    max_wait_seconds=SEARCH_MAX_QUEUE_WAIT_SECONDS,
+)
+
+# 人気条件の定期更新（ユーザーの検索が動いている間は待つ）
+refresh_scheduler = RefreshScheduler(
+    filter_popularity,
+    refresh_search,
+    top_n=REFRESH_TOP_N,
+    min_requests=REFRESH_MIN_REQUESTS,
+    hours=REFRESH_HOURS,
+    budget_calls=REFRESH_BUDGET_CALLS,
+    interval=REFRESH_INTERVAL_SECONDS,
+    max_age_hours=REFRESH_MAX_AGE_HOURS,
+    jitter=REFRESH_JITTER,
+    retry_minutes=REFRESH_RETRY_MINUTES,
+    is_busy=lambda: admission.active > 0 or admission.waiting > 0,
+)
+
+# 先読みも検索パイプラインの枠を使い、空きがなければ行わない
+speculative_prefetcher.admission = admission
+
+def _admission_samples():
+    yield {"state": "active"}, admission.active
+    yield {"state": "waiting"}, admission.waiting
+
+
+def _shed_samples():
+    for reason, count in admission.snapshot()["shedTotal"].items():
+        yield {"reason": reason}, count
+
+
+def _compression_samples(field: str):
+    def _samples():
+        for encoding, stats in compression_stats.snapshot()["encodings"].items():
+            yield {"encoding": encoding}, stats[field]
+    return _samples
+
+
+metrics_registry.gauge(
+    "uninavi_admission_pipelines", "Search pipelines by admission state", ["state"], callback=_admission_samples
+)
+metrics_registry.counter(
+    "uninavi_admission_shed_total", "Search requests shed since startup", ["reason"], callback=_shed_samples
+)
+metrics_registry.gauge(
+    "uninavi_refresh_coverage_ratio",
+    "Share of top-N filter set demand whose results are younger than REFRESH_MAX_AGE_HOURS",
+    callback=lambda: [({}, refresh_scheduler.coverage()["demandShare"])],
+)
+metrics_registry.gauge(
+    "uninavi_search_jobs", "Search jobs held in memory", callback=lambda: [({}, len(search_jobs))]
+)
+metrics_registry.counter(
+    "uninavi_compression_bytes_in_total", "Uncompressed response bytes", ["encoding"],
+    callback=_compression_samples("bytesIn"),
+)
+metrics_registry.counter(
+    "uninavi_compression_bytes_out_total", "Compressed response bytes", ["encoding"],
+    callback=_compression_samples("bytesOut"),
+)
+metrics_registry.counter(
+    "uninavi_compression_cpu_seconds_total", "Time spent compressing responses", ["encoding"],
+    callback=_compression_samples("cpuSeconds"),
+)
+
+# レスポンス圧縮の設定（最小サイズ・除外パス・SSEの圧縮有無）
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_EXCLUDE_PATHS = parse_exclude_paths(os.getenv("COMPRESSION_EXCLUDE_PATHS", ""))
+COMPRESS_EVENT_STREAMS = os.getenv("COMPRESS_EVENT_STREAMS", "1") != "0"
+
+# 起動時のウォームアップ（接続プール・モデル選択・静的データ）
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") != "0"
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "20"))
+
+# /debug/profile を有効にするトークン（未設定ならエンドポイントは無効）
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+
+_profile_lock = asyncio.Lock()
+
+logger.info(f"JSON backend: {JSON_BACKEND} (fast path enabled: {FAST_JSON_ENABLED})")
+
+def _upstream_urls() -> List[str]:
+    urls = []
+    if summarize.HF_API_KEY:
+        urls.append(summarize.HUGGINGFACE_API_URL)
+    if summarize.TAVILY_API_KEY:
+        urls.append(summarize.TAVILY_API_URL)
+    if summarize.SERPER_API_KEY:
+        urls.append(summarize.SERPER_API_URL)
+    return urls
+
+
+async def _run_step(name: str, coro) -> None:
+    startup_state.step_started(name)
+    try:
+        detail = await coro
+        startup_state.step_finished(name, detail=detail)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning(f"Warmup step {name} failed: {exc}")
+        startup_state.step_finished(name, status="error", detail=str(exc))
+
+
+async def _preload() -> dict:
+    return preload_static_data()
+
+
+async def _warm_up_service() -> None:
+    """Open upstream connections, resolve the model and preload static data, then report ready."""
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(
+                _run_step("connections", warm_up(_upstream_urls())),
+                _run_step("model", initialize_model()),
+                _run_step("static_data", _preload()),
+            ),
+            timeout=WARMUP_TIMEOUT_SECONDS,
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Warmup did not finish within {WARMUP_TIMEOUT_SECONDS}s, reporting ready anyway")
+    startup_state.mark_ready()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    if REFRESH_ENABLED:
+        refresh_scheduler.start()
+    # 判定の記録はイベントループを止めないようにワーカースレッドで読み込む
+    if verdict_model.enabled:
+        await asyncio.to_thread(verdict_model.load)
+    # ウォームアップはバックグラウンドで行い、完了までは /ready が 503 を返す
+    warmup_task = asyncio.create_task(_warm_up_service()) if WARMUP_ENABLED else None
+    if warmup_task is None:
+        startup_state.mark_ready()
+    try:
+        yield
+    finally:
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+        await refresh_scheduler.stop()
+        await speculative_prefetcher.stop()
+        await search_jobs.shutdown()
+        await loop_monitor.stop()
+        await close_pool()
+        shutdown_pools()
+        if university_catalog is not None:
+            university_catalog.close()
+        verdict_model.close()
+
+
+app = FastAPI(title="UniNavi API", version="1.0.0", lifespan=lifespan)
 
 # CORS configuration for Next.js frontend
 app.add_middleware(
@@ -43,6 +240,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MIN_SIZE,
+    exclude_paths=COMPRESSION_EXCLUDE_PATHS,
+    compress_event_streams=COMPRESS_EVENT_STREAMS,
+)
+
+app.add_middleware(FirstRequestTimer)
+
+# 最も外側でリクエストIDを設定し、すべてのログに付与する
+app.add_middleware(RequestIdMiddleware)
+
 
 # Global exception handler
 @app.exception_handler(Exception)
@@ -97,6 +306,16 @@ class ChatRequest(BaseModel):
     history: List[ChatMessage] = []
 
 
+class ScheduleEvent(BaseModel):
+    """Calendar event parsed from a university's exam schedule (same shape as data/schedules.json)"""
+
+    title: str
+    date: str
+    type: str
+    description: str = ""
+    endDate: Optional[str] = None
+
+
 class University(BaseModel):
     """University information model"""
 
@@ -118,6 +337,7 @@ class University(BaseModel):
     commonTestRatio: Optional[str] = ""
     selectionNotes: Optional[str] = ""
     applicationDeadline: Optional[str] = ""
+    scheduleEvents: List[ScheduleEvent] = Field(default_factory=list)
 
 
 class SearchResponse(BaseModel):
@@ -133,6 +353,30 @@ class ChatResponse(BaseModel):
     message: str
 
 
+class Suggestion(BaseModel):
+    """Autocomplete suggestion model"""
+
+    text: str
+    kind: str
+    names: List[str]
+
+
+class SuggestResponse(BaseModel):
+    """Autocomplete response model"""
+
+    query: str
+    suggestions: List[Suggestion]
+
+
+class SearchJobResponse(BaseModel):
+    """Search job status model"""
+
+    jobId: str
+    status: str
+    events: int
+    traceId: Optional[str] = None
+
+
 @app.get("/")
 def read_root():
     """Root endpoint"""
@@ -145,87 +389,228 @@ def health_check():
     return {"status": "healthy"}
 
 
-def _format_sse(event: str, data: dict) -> str:
-    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+@app.get("/ready")
+def readiness_check():
+    """Readiness probe: 503 until the startup warmup has finished"""
+    snapshot = startup_state.snapshot()
+    if not startup_state.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **snapshot})
+    return {"status": "ready", **snapshot}
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics in the text exposition format"""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/traces")
+def list_traces(limit: int = Query(50, ge=1, le=500)):
+    """Most recent request traces, newest first"""
+    return {"traces": trace_exporter.recent(limit)}
+
+
+@app.get("/debug/traces/{trace_id}")
+def get_trace(trace_id: str):
+    """Span tree of a single request"""
+    trace = trace_exporter.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+
+@app.get("/debug/loop")
+def loop_stats_endpoint():
+    """Event-loop lag percentiles and stacks captured while the loop was blocked"""
+    return loop_monitor.snapshot()
+
+
+@app.get("/debug/profile")
+async def profile_endpoint(request: Request, seconds: float = Query(5.0, gt=0)):
+    """
+    Sample all thread stacks for ``seconds`` and return collapsed stacks for flamegraph tools.
+    Requires PROFILE_TOKEN to be configured and sent in the X-Profile-Token header.
+    """
+    if not PROFILE_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not secrets.compare_digest(request.headers.get("X-Profile-Token", ""), PROFILE_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    async with _profile_lock:
+        collapsed = await asyncio.to_thread(sample_stacks, min(seconds, PROFILE_MAX_SECONDS))
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'},
+    )
+
+
+@app.get("/debug/admission")
+def admission_stats_endpoint():
+    """Concurrent pipelines, queue depth and shed counts for autoscaling"""
+    return {**admission.snapshot(), "cacheEntries": len(search_result_cache)}
+
+
+@app.get("/debug/catalog")
+async def catalog_stats_endpoint():
+    """Record count, age range and regions of the local university catalog"""
+    if university_catalog is None:
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(university_catalog.stats)}
+
+
+@app.get("/debug/refresh")
+def refresh_stats_endpoint():
+    """Background refresh runs, upstream budget use and coverage of popular filter sets"""
+    return {"enabled": REFRESH_ENABLED, **refresh_scheduler.snapshot()}
+
+
+@app.get("/debug/prefetch")
+def prefetch_stats_endpoint():
+    """Speculative prefetch results, hit rate and upstream budget use"""
+    return speculative_prefetcher.snapshot()
+
+
+@app.get("/debug/verdicts")
+def verdict_model_stats_endpoint():
+    """Filter verdicts answered by the local model, agreement with the LLM and the last training run"""
+    return verdict_model.snapshot()
+
+
+@app.get("/debug/compression")
+def compression_stats_endpoint():
+    """Compression ratio and CPU time per encoding since startup"""
+    return compression_stats.snapshot()
+
+
+def _format_sse(event: str, data: dict, event_id: Optional[int] = None) -> bytes:
+    return format_sse(event, data, event_id=event_id)
+
+
+def _search_kwargs(search_request: SearchRequest) -> dict:
+    """Map the request model onto search_universities keyword arguments."""
+    return {
+        "region": search_request.region,
+        "faculty": search_request.faculty,
+        "exam_type": search_request.examType,
+        "use_common_test": search_request.useCommonTest,
+        "deviation_score": search_request.deviationScore,
+        "institution_type": search_request.institutionType,
+        "prefecture": search_request.prefecture,
+        "name_keyword": search_request.nameKeyword,
+        "common_test_score": search_request.commonTestScore,
+        "external_english": search_request.externalEnglish,
+        "required_subjects": search_request.requiredSubjects,
+        "tuition_max": search_request.tuitionMax,
+        "scholarship": search_request.scholarship,
+        "qualification": search_request.qualification,
+        "exam_schedule": search_request.examSchedule,
+    }
+
+
+def _trace_headers(span) -> dict:
+    return {"X-Trace-Id": span.trace_id} if span.trace_id else {}
+
+
+async def _admit_search(search_request: SearchRequest) -> Optional[AdmissionTicket]:
+    """
+    Reserve a pipeline slot for a search request.
+    Cached searches skip the queue and get no ticket; a full queue is answered with 503.
+    """
+    if search_result_cache.contains(_search_kwargs(search_request)):
+        return None
+    try:
+        return await admission.acquire()
+    except AdmissionRejected as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after)},
+        )
 
 
 @app.post("/api/search", response_model=SearchResponse)
-async def search_endpoint(request: SearchRequest):
+async def search_endpoint(request: SearchRequest, response: Response):
     """
     Search universities based on filters
     Uses AI to search web and summarize results
     """
-    logger.info(f"Received search request: {request.model_dump()}")
+    logger.info("Received search request: %s", request, extra=PAYLOAD)
+    ticket = await _admit_search(request)
+    trace_root = begin_trace("POST /api/search")
+    trace_headers = _trace_headers(trace_root)
+    response.headers.update(trace_headers)
     
     try:
         logger.debug(f"Calling search_universities with params: region={request.region}, faculty={request.faculty}")
-        universities = await search_universities(
-            region=request.region,
-            faculty=request.faculty,
-            exam_type=request.examType,
-            use_common_test=request.useCommonTest,
-            deviation_score=request.deviationScore,
-            institution_type=request.institutionType,
-            prefecture=request.prefecture,
-            name_keyword=request.nameKeyword,
-            common_test_score=request.commonTestScore,
-            external_english=request.externalEnglish,
-            required_subjects=request.requiredSubjects,
-            tuition_max=request.tuitionMax,
-            scholarship=request.scholarship,
-            qualification=request.qualification,
-            exam_schedule=request.examSchedule,
-        )
+        with use_span(trace_root):
+            universities = await search_universities(**_search_kwargs(request))
 
         logger.info(f"Search completed successfully, found {len(universities)} universities")
+        trace_root.end()
+        if FAST_JSON_ENABLED:
+            # _normalize_university_entry で正規化済みのため、pydanticによる再検証を省略
+            return FastJSONResponse({"universities": universities, "count": len(universities)}, headers=trace_headers)
         return SearchResponse(universities=universities, count=len(universities))
 
     except Exception as e:
         logger.error(f"Search failed: {str(e)}")
         logger.error(f"Traceback:\n{traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+        trace_root.end("error")
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}", headers=trace_headers)
+    except asyncio.CancelledError:
+        trace_root.end("cancelled")
+        raise
+    finally:
+        if ticket is not None:
+            ticket.release()
 
 
 @app.post("/api/search/stream")
-async def search_stream_endpoint(request: Request, search_request: SearchRequest):
-    """Stream university search results with progress updates via Server-Sent Events."""
+async def search_stream_endpoint(
+    request: Request,
+    search_request: SearchRequest,
+    mode: str = Query("full", pattern="^(full|refs)$"),
+):
+    """
+    Stream university search results with progress updates via Server-Sent Events.
+
+    ``mode=full`` re-sends every university as ``result`` events at the end.
+    ``mode=refs`` tags each ``university`` event with a ``ref`` and finishes with a
+    ``complete`` event listing the refs of the final results instead of repeating them.
+    """
 
-    queue: asyncio.Queue[tuple[str, dict]] = asyncio.Queue()
+    ticket = await _admit_search(search_request)
+    trace_root = begin_trace("POST /api/search/stream", mode=mode)
+    queue = CoalescingEventQueue(maxsize=SEARCH_STREAM_QUEUE_SIZE)
+    refs_tracker = UniversityRefTracker()
 
     async def progress_callback(payload: dict) -> None:
-        await queue.put(("progress", payload))
+        await queue.put("progress", payload)
 
     async def university_callback(university: dict) -> None:
         """Callback to stream individual university results as they are filtered."""
-        await queue.put(("university", {"university": university}))
+        if mode == "refs":
+            await queue.put("university", {"ref": refs_tracker.assign(university), "university": university})
+        else:
+            await queue.put("university", {"university": university})
 
     async def run_search() -> None:
         try:
-            universities = await search_universities(
-                region=search_request.region,
-                faculty=search_request.faculty,
-                exam_type=search_request.examType,
-                use_common_test=search_request.useCommonTest,
-                deviation_score=search_request.deviationScore,
-                institution_type=search_request.institutionType,
-                prefecture=search_request.prefecture,
-                name_keyword=search_request.nameKeyword,
-                common_test_score=search_request.commonTestScore,
-                external_english=search_request.externalEnglish,
-                required_subjects=search_request.requiredSubjects,
-                tuition_max=search_request.tuitionMax,
-                scholarship=search_request.scholarship,
-                qualification=search_request.qualification,
-                exam_schedule=search_request.examSchedule,
-                progress_callback=progress_callback,
-                university_callback=university_callback,
-            )
-            await queue.put(("results", {"universities": universities}))
+            with use_span(trace_root):
+                universities = await search_universities(
+                    **_search_kwargs(search_request),
+                    progress_callback=progress_callback,
+                    university_callback=university_callback,
+                )
+            await queue.put("results", {"universities": universities})
         except Exception as exc:  # noqa: BLE001
             logger.error(f"Streaming search failed: {exc}")
-            await queue.put(("error", {"message": str(exc)}))
+            trace_root.set_attribute("error", str(exc))
+            trace_root.status = "error"
+            await queue.put("error", {"message": str(exc)})
         finally:
-            await queue.put(("done", {}))
+            await queue.put("done", {})
 
     async def event_generator(request_obj: Request):
         search_task = asyncio.create_task(run_search())
@@ -237,12 +622,20 @@ async def search_stream_endpoint(request: Request, search_request: SearchRequest
                     yield _format_sse("progress", payload)
                 elif event_type == "university":
                     # Stream individual university results as they are filtered
-                    university_data = payload.get("university", {})
-                    yield _format_sse("university", {"university": university_data})
+                    yield _format_sse("university", payload)
                 elif event_type == "results":
                     universities = payload.get("universities") or []
                     total = len(universities)
-                    if total == 0:
+                    if mode == "refs":
+                        # 送信済みの大学はrefで参照し、未送信または重複排除で別のレコードが選ばれた大学のみ本体を送る
+                        refs: list[str] = []
+                        for university in universities:
+                            ref, changed = refs_tracker.resolve(university)
+                            if changed:
+                                yield _format_sse("university", {"ref": ref, "university": university})
+                            refs.append(ref)
+                        yield _format_sse("complete", {"total": total, "refs": refs})
+                    elif total == 0:
                         yield _format_sse("complete", {"total": 0})
                     else:
                         for index, university in enumerate(universities, start=1):
@@ -258,21 +651,142 @@ async def search_stream_endpoint(request: Request, search_request: SearchRequest
                     yield _format_sse("error", payload)
                     return
                 elif event_type == "done":
+                    if queue.coalesced:
+                        logger.debug(f"Coalesced {queue.coalesced} progress events for search stream")
                     return
 
                 if await request_obj.is_disconnected():
                     logger.info("Client disconnected from search stream")
                     return
         finally:
+            # クライアントがいなくなったので、満杯の待ちで止まっている検索タスクの put を解放する
+            await queue.close()
             if not search_task.done():
                 search_task.cancel()
                 with contextlib.suppress(asyncio.CancelledError):
                     await search_task
+            if ticket is not None:
+                ticket.release()
+            trace_root.end()
+
+    # ジェネレーターが開始されずに終了した場合もスロットを解放する
+    response = StreamingResponse(
+        event_generator(request),
+        media_type="text/event-stream",
+        headers=_trace_headers(trace_root),
+        background=BackgroundTask(ticket.release) if ticket is not None else None,
+    )
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Accept"
+    return response
+
+
+@app.post("/api/search/jobs", response_model=SearchJobResponse, status_code=202)
+async def create_search_job(search_request: SearchRequest):
+    """
+    Start a university search in the background.
+    Progress is read from /api/search/jobs/{job_id}/events and survives reconnects.
+    """
+    logger.info("Received search job request: %s", search_request, extra=PAYLOAD)
+
+    ticket = await _admit_search(search_request)
+    trace_root = begin_trace("search_job")
+
+    async def run_job(job: SearchJob) -> None:
+        trace_root.set_attribute("jobId", job.id)
+        try:
+            with use_span(trace_root):
+                await _run_search_job(job)
+        except BaseException:
+            trace_root.status = "error"
+            raise
+        finally:
+            trace_root.end()
+            if ticket is not None:
+                ticket.release()
+
+    async def _run_search_job(job: SearchJob) -> None:
+        refs_tracker = UniversityRefTracker()
+
+        async def progress_callback(payload: dict) -> None:
+            await job.append("progress", payload)
+
+        async def university_callback(university: dict) -> None:
+            await job.append("university", {"ref": refs_tracker.assign(university), "university": university})
+
+        universities = await search_universities(
+            **_search_kwargs(search_request),
+            progress_callback=progress_callback,
+            university_callback=university_callback,
+        )
+
+        refs: list[str] = []
+        for university in universities:
+            ref, changed = refs_tracker.resolve(university)
+            if changed:
+                await job.append("university", {"ref": ref, "university": university})
+            refs.append(ref)
+        await job.append("complete", {"total": len(universities), "refs": refs})
+
+    try:
+        job = search_jobs.create(run_job)
+    except RuntimeError as exc:
+        if ticket is not None:
+            ticket.release()
+        trace_root.end("error")
+        raise HTTPException(status_code=503, detail=str(exc))
+
+    return SearchJobResponse(jobId=job.id, status=job.status, events=job.event_count, traceId=trace_root.trace_id)
+
+
+@app.get("/api/suggest", response_model=SuggestResponse)
+def suggest_endpoint(q: str = "", limit: int = Query(SUGGEST_LIMIT, ge=1, le=NODE_TOP_K)):
+    """University, faculty and group-name completions for the name keyword field"""
+    if not suggest_index.seeded:
+        seed_suggest_index()
+    return {"query": q, "suggestions": suggest_index.suggest(q, limit)}
+
+
+@app.get("/api/search/jobs/{job_id}", response_model=SearchJobResponse)
+async def get_search_job(job_id: str):
+    """Return the status of a search job"""
+    job = search_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Search job not found")
+    return SearchJobResponse(jobId=job.id, status=job.status, events=job.event_count)
+
+
+@app.get("/api/search/jobs/{job_id}/events")
+async def search_job_events(request: Request, job_id: str, lastEventId: Optional[int] = None):
+    """
+    Stream the events of a search job via Server-Sent Events.
+    Reconnecting clients resume after the ``Last-Event-ID`` header (or ``lastEventId`` query).
+    Disconnecting does not cancel the job.
+    """
+    job = search_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Search job not found")
+
+    last_event_id = lastEventId or 0
+    header_value = request.headers.get("last-event-id")
+    if header_value:
+        try:
+            last_event_id = int(header_value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID header")
+
+    async def event_generator(request_obj: Request):
+        async for event_id, event_type, payload in job.stream(last_event_id):
+            yield _format_sse(event_type, payload, event_id=event_id)
+            if await request_obj.is_disconnected():
+                logger.info(f"Client disconnected from search job {job.id} at event {event_id}")
+                return
 
     response = StreamingResponse(event_generator(request), media_type="text/event-stream")
     response.headers["Access-Control-Allow-Origin"] = "*"
     response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Accept"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Accept, Last-Event-ID"
     return response
 
 
@@ -1 +1,5 @@
 # Services module
+from services.config import load_config
+
+# 各サービスはインポート時に環境変数を読むため、最初に一度だけ .env を読み込む
+load_config()
@@ -0,0 +1,129 @@
+"""
+Admission Control
+Limits concurrent search pipelines and sheds load when the wait queue is full
+"""
+
+import asyncio
+import contextlib
+import logging
+import math
+import time
+from typing import AsyncIterator, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a pipeline cannot be admitted; ``retry_after`` is in seconds."""
+
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(f"Search service is busy ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """Handle for an admitted pipeline; ``release`` is safe to call more than once."""
+
+    def __init__(self, controller: "AdmissionController") -> None:
+        self._controller = controller
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(time.monotonic() - self._started)
+
+
+class AdmissionController:
+    """
+    Admit at most ``max_concurrent`` pipelines at once.
+
+    Up to ``max_queue`` further requests wait for a slot for at most
+    ``max_wait_seconds``; beyond that requests are rejected immediately so the
+    caller can answer with ``503`` and a ``Retry-After`` hint.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_queue: int = 16, max_wait_seconds: float = 15.0) -> None:
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._active = 0
+        self._waiting = 0
+        self._admitted_total = 0
+        self._shed_total: Dict[str, int] = {"queue_full": 0, "timeout": 0}
+        # パイプライン所要時間の指数移動平均（Retry-After の推定に使用）
+        self._avg_duration = 30.0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    def retry_after(self) -> int:
+        """Estimate how long until a queued request would be admitted."""
+        backlog = (self._waiting + 1) / max(self.max_concurrent, 1)
+        return max(1, math.ceil(self._avg_duration * backlog))
+
+    async def acquire(self) -> AdmissionTicket:
+        if not self._semaphore.locked():
+            # 空きスロットがあれば待ち行列を経由せず即座に取得
+            await self._semaphore.acquire()
+        else:
+            if self._waiting >= self.max_queue:
+                self._shed("queue_full")
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_wait_seconds)
+            except asyncio.TimeoutError:
+                self._shed("timeout")
+            finally:
+                self._waiting -= 1
+
+        self._active += 1
+        self._admitted_total += 1
+        return AdmissionTicket(self)
+
+    async def try_acquire(self) -> Optional[AdmissionTicket]:
+        """Admit without waiting: None when every slot is taken or requests are already queued."""
+        if self._waiting or self._semaphore.locked():
+            return None
+        await self._semaphore.acquire()
+        self._active += 1
+        self._admitted_total += 1
+        return AdmissionTicket(self)
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[AdmissionTicket]:
+        ticket = await self.acquire()
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self._active,
+            "waiting": self._waiting,
+            "maxConcurrent": self.max_concurrent,
+            "maxQueue": self.max_queue,
+            "admittedTotal": self._admitted_total,
+            "shedTotal": dict(self._shed_total),
+        }
+
+    def _shed(self, reason: str) -> None:
+        self._shed_total[reason] += 1
+        retry_after = self.retry_after()
+        logger.warning(f"Shedding search request ({reason}), active={self._active}, waiting={self._waiting}")
+        raise AdmissionRejected(reason, retry_after)
+
+    def _release(self, duration: float) -> None:
+        self._active -= 1
+        self._avg_duration = self._avg_duration * 0.8 + duration * 0.2
+        self._semaphore.release()
@@ -8,23 +8,23 @@ import logging
 import json
 import asyncio
 from typing import AsyncIterator, Dict, List
+import time
 import httpx
 
-# 💡 .envから環境変数をロードするためにdotenvライブラリを追加
-from dotenv import load_dotenv # 👈 追加
-
-# 🚨 【修正】環境変数ロード
-load_dotenv() # 👈 追加: .envファイルから環境変数を読み込む
+from services.http_client import upstream_client
+from services.logging_config import PAYLOAD
+from services.metrics import UPSTREAM_DURATION, record_llm_usage
+from services.tracing import traced
 
 # ロギング設定
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO) # 必要に応じてDEBUGに変更
 
 # 🚨 【修正箇所】Hugging Face Chat Completions API configuration
 # 📝 サンプルコードに合わせてURLとモデルを更新
 HF_API_KEY = os.getenv("HF_API_KEY", "")
-# Chat Completions APIのURL
-HUGGINGFACE_API_URL = "https://router.huggingface.co/v1/chat/completions"
+# Chat Completions APIのURL（ローカルのシミュレーターに向ける場合は HF_API_BASE_URL を変更）
+HF_API_BASE_URL = os.getenv("HF_API_BASE_URL", "https://router.huggingface.co/v1").rstrip("/")
+HUGGINGFACE_API_URL = f"{HF_API_BASE_URL}/chat/completions"
 # Chat Completions APIで利用可能な日本語に強いInstructモデル
 HUGGINGFACE_MODEL_ID = os.getenv("HF_MODEL_ID", "MiniMaxAI/MiniMax-M2:novita") # サンプルコードと同じモデル名を使用
 
@@ -32,6 +32,7 @@ logger.info(f"Chat service initialized, using model: {HUGGINGFACE_MODEL_ID}")
 
 # --- API呼び出し関数 ---
 # 🚨 【修正箇所】Hugging Face Chat Completions APIのクエリ関数
+@traced("hf.chat")
 async def query_hf_inference_chat(messages: List[Dict[str, str]]) -> str:
     """
     Send chat messages to Hugging Face Chat Completions API and get response
@@ -53,17 +54,22 @@ async def query_hf_inference_chat(messages: List[Dict[str, str]]) -> str:
         "top_p": 0.9,
     }
     
-    async with httpx.AsyncClient(timeout=60.0) as client:
+    started = time.perf_counter()
+    status = "error"
+    async with upstream_client() as client:
         try:
             response = await client.post(
                 HUGGINGFACE_API_URL, # 修正されたURLを使用
                 headers=headers,
                 json=payload,
+                timeout=60.0,
             )
+            status = str(response.status_code)
             
             if response.status_code == 200:
                 result = response.json()
                 if 'choices' in result and result['choices'] and 'message' in result['choices'][0]:
+                    record_llm_usage(HUGGINGFACE_MODEL_ID, result)
                     # 応答からメッセージの内容を抽出して返却
                     return result['choices'][0]['message']['content'].strip()
                 else:
@@ -76,6 +82,10 @@ async def query_hf_inference_chat(messages: List[Dict[str, str]]) -> str:
         except Exception as e:
             logger.error(f"Error querying HF Chat API: {str(e)}")
             raise
+        finally:
+            UPSTREAM_DURATION.observe(
+                time.perf_counter() - started, upstream=f"hf:{HUGGINGFACE_MODEL_ID}", status=status
+            )
 
 # --- ユーザーとのチャットロジック関数 ---
 def _build_chat_messages(message: str, history: List[dict]) -> List[Dict[str, str]]:
@@ -127,7 +137,7 @@ async def chat_with_ai(message: str, history: List[dict]) -> str:
     messages = _build_chat_messages(message, history)
 
     try:
-        logger.debug(f"Sending messages to Hugging Face: {messages}")
+        logger.debug("Sending messages to Hugging Face: %s", messages, extra=PAYLOAD)
         ai_response = await query_hf_inference_chat(messages)
 
         ai_response = ai_response.replace('<s>', '').replace('</s>', '').strip()
@@ -167,7 +177,9 @@ async def chat_with_ai_stream(message: str, history: List[dict]) -> AsyncIterato
         "stream": True,
     }
 
-    async with httpx.AsyncClient(timeout=None) as client:
+    started = time.perf_counter()
+    status = "error"
+    async with upstream_client() as client:
         try:
             async with client.stream(
                 "POST",
@@ -177,7 +189,9 @@ async def chat_with_ai_stream(message: str, history: List[dict]) -> AsyncIterato
                     "Content-Type": "application/json",
                 },
                 json=payload,
+                timeout=None,
             ) as response:
+                status = str(response.status_code)
                 response.raise_for_status()
 
                 async for line in response.aiter_lines():
@@ -193,6 +207,7 @@ async def chat_with_ai_stream(message: str, history: List[dict]) -> AsyncIterato
                             logger.debug(f"Skipping non-JSON streaming line: {data_str}")
                             continue
 
+                        record_llm_usage(HUGGINGFACE_MODEL_ID, data)
                         delta = (
                             data.get("choices", [{}])[0]
                             .get("delta", {})
@@ -204,6 +219,10 @@ async def chat_with_ai_stream(message: str, history: List[dict]) -> AsyncIterato
         except Exception as exc:  # noqa: BLE001
             logger.error(f"Streaming chat failed: {exc}")
             raise
+        finally:
+            UPSTREAM_DURATION.observe(
+                time.perf_counter() - started, upstream=f"hf:{HUGGINGFACE_MODEL_ID}", status=status
+            )
 
 # --- 実行例 ---
 async def main():
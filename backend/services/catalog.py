@@ -0,0 +1,299 @@
+"""
+University Catalog
+Persistent SQLite catalog of normalized search results with a bigram FTS5 index, used to answer searches
+without the web fan-out and LLM calls when it covers the filters well enough
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Collection, Dict, List, Optional, Tuple
+
+from services.columnar import ColumnarStore, np, parse_score_range, required_subjects
+from services.entities import canonical_value, normalize_text
+from services.metrics import registry
+from services.schedules import parse_schedule_filter
+
+logger = logging.getLogger(__name__)
+
+# カタログのSQLiteファイル（既定は空で無効。例: data/catalog.sqlite3）
+CATALOG_PATH = os.getenv("CATALOG_PATH", "")
+# 条件に合う新しいレコードがこの件数以上あればWeb検索とLLMを省略する
+CATALOG_MIN_RESULTS = int(os.getenv("CATALOG_MIN_RESULTS", "5"))
+# これより古いレコードは検索に使わない（時間）
+CATALOG_MAX_AGE_HOURS = float(os.getenv("CATALOG_MAX_AGE_HOURS", "168"))
+CATALOG_MAX_RESULTS = int(os.getenv("CATALOG_MAX_RESULTS", "50"))
+
+# 保存済みのフィールドから判定できる条件。これ以外の条件がある検索は常にWeb検索に回す
+SUPPORTED_FILTERS = {
+    "region", "prefecture", "institution_type", "faculty", "exam_type", "name_keyword",
+    "deviation_score", "common_test_score", "required_subjects", "exam_schedule",
+}
+# 検索で確認済みの条件として、結果のレコードに付ける属性
+TAG_FILTERS = ("region", "prefecture", "institution_type")
+# 属性 → レコードのフィールド
+TAG_FIELDS = {"region": "region", "prefecture": "prefecture", "institution_type": "institutionType"}
+
+CATALOG_LOOKUPS = registry.counter(
+    "uninavi_catalog_lookups_total",
+    "Catalog lookups by outcome (hit, thin, unsupported)",
+    ["result"],
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS universities (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    faculty TEXT NOT NULL,
+    exam_type TEXT NOT NULL,
+    region TEXT NOT NULL DEFAULT '',
+    prefecture TEXT NOT NULL DEFAULT '',
+    institution_type TEXT NOT NULL DEFAULT '',
+    deviation_low REAL,
+    deviation_high REAL,
+    common_test_low REAL,
+    common_test_high REAL,
+    record TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS universities_region ON universities (region, updated_at);
+CREATE INDEX IF NOT EXISTS universities_prefecture ON universities (prefecture, updated_at);
+CREATE INDEX IF NOT EXISTS universities_updated_at ON universities (updated_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS universities_fts USING fts5(
+    name, faculty, exam_type, subjects, tokenize = 'unicode61'
+);
+"""
+
+
+def bigrams(value: object) -> str:
+    """
+    Space-separated character bigrams of each word plus its last character, so FTS5's unicode61
+    tokenizer can match Japanese substrings: ``工学部`` → ``工学 学部 部``.
+    """
+    tokens: List[str] = []
+    for word in normalize_text(value).lower().split():
+        tokens.extend(word[index:index + 2] for index in range(len(word) - 1))
+        tokens.append(word[-1])
+    return " ".join(tokens)
+
+
+def _phrase(value: str) -> str:
+    # 検索語のバイグラムを連続した並び（フレーズ）として照合する
+    text = normalize_text(value).lower().replace(" ", "")
+    if len(text) == 1:
+        # 1文字は、その文字で始まるバイグラム（末尾の文字は単独のトークン）への前方一致で探す
+        return '"' + text.replace('"', '""') + '"*'
+    return '"' + " ".join(text[index:index + 2] for index in range(len(text) - 1)).replace('"', '""') + '"'
+
+
+class UniversityCatalog:
+    """
+    University/faculty/exam-type records keyed by entity ID. Structured filters run on indexed
+    columns, text filters on an FTS5 table of character bigrams. When numpy is installed, searches
+    run on an in-memory ``ColumnarStore`` loaded from the database and kept in sync on every store.
+    One connection is shared behind a lock; callers on the event loop should go through ``asyncio.to_thread``.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._columns: Optional[ColumnarStore] = ColumnarStore() if np is not None else None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            if self.path != ":memory:":
+                connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+            if self._columns is not None:
+                self._columns.extend(
+                    (json.loads(record), {"region": region, "prefecture": prefecture, "institution_type": institution_type}, updated_at)
+                    for record, region, prefecture, institution_type, updated_at in connection.execute(
+                        "SELECT record, region, prefecture, institution_type, updated_at FROM universities ORDER BY rowid"
+                    )
+                )
+        return self._connection
+
+    def store(
+        self,
+        universities: List[dict],
+        filters: Dict[str, str],
+        now: Optional[float] = None,
+        verified: Collection[str] = (),
+    ) -> int:
+        """
+        Upsert pipeline results. Region, prefecture and institution type are taken from the entry or,
+        for entries whose IDs are in ``verified`` (judged to match the filters), from ``filters``;
+        known values are never cleared.
+        """
+        now = time.time() if now is None else now
+        rows = []
+        columns = []
+        for university in universities:
+            if not university.get("id") or not university.get("name"):
+                continue
+            checked = filters if university["id"] in verified else {}
+            tags = {
+                key: normalize_text(university.get(TAG_FIELDS[key]) or checked.get(key) or "") for key in TAG_FILTERS
+            }
+            deviation = parse_score_range(university.get("deviationScore")) or (None, None)
+            common_test = parse_score_range(university.get("commonTestScore")) or (None, None)
+            rows.append((
+                university["id"], university.get("name", ""), university.get("faculty", ""), university.get("examType", ""),
+                tags["region"], tags["prefecture"], tags["institution_type"],
+                deviation[0], deviation[1], common_test[0], common_test[1],
+                json.dumps(university, ensure_ascii=False), now,
+                " ".join(university.get("requiredSubjects") or []),
+            ))
+            columns.append((university, tags, now))
+        if not rows:
+            return 0
+
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                for row in rows:
+                    rowid = connection.execute(
+                        """
+                        INSERT INTO universities (
+                            id, name, faculty, exam_type, region, prefecture, institution_type,
+                            deviation_low, deviation_high, common_test_low, common_test_high, record, updated_at
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (id) DO UPDATE SET
+                            name = excluded.name,
+                            faculty = excluded.faculty,
+                            exam_type = excluded.exam_type,
+                            region = CASE WHEN excluded.region != '' THEN excluded.region ELSE region END,
+                            prefecture = CASE WHEN excluded.prefecture != '' THEN excluded.prefecture ELSE prefecture END,
+                            institution_type = CASE WHEN excluded.institution_type != ''
+                                THEN excluded.institution_type ELSE institution_type END,
+                            deviation_low = excluded.deviation_low,
+                            deviation_high = excluded.deviation_high,
+                            common_test_low = excluded.common_test_low,
+                            common_test_high = excluded.common_test_high,
+                            record = excluded.record,
+                            updated_at = excluded.updated_at
+                        RETURNING rowid
+                        """,
+                        row[:13],
+                    ).fetchone()[0]
+                    connection.execute("DELETE FROM universities_fts WHERE rowid = ?", (rowid,))
+                    connection.execute(
+                        "INSERT INTO universities_fts (rowid, name, faculty, exam_type, subjects) VALUES (?, ?, ?, ?, ?)",
+                        (rowid, bigrams(row[1]), bigrams(row[2]), bigrams(row[3]), bigrams(row[13])),
+                    )
+            if self._columns is not None:
+                self._columns.extend(columns)
+        return len(rows)
+
+    def _query(self, filters: Dict[str, str], since: float) -> Tuple[str, list]:
+        where = ["u.updated_at >= ?"]
+        params: list = [since]
+        for key in TAG_FILTERS:
+            if filters.get(key):
+                where.append(f"u.{key} = ?")
+                params.append(normalize_text(filters[key]))
+
+        for key, low_column, high_column in (
+            ("deviation_score", "deviation_low", "deviation_high"),
+            ("common_test_score", "common_test_low", "common_test_high"),
+        ):
+            bounds = parse_score_range(filters.get(key))
+            if bounds:
+                # 範囲が重なるものを条件に合うとみなす
+                where.append(f"u.{high_column} >= ? AND u.{low_column} <= ?")
+                params.extend(bounds)
+
+        terms = []
+        if filters.get("name_keyword"):
+            terms.append(f"name : {_phrase(canonical_value('name', filters['name_keyword']))}")
+        if filters.get("faculty"):
+            terms.append(f"faculty : {_phrase(canonical_value('faculty', filters['faculty']))}")
+        if filters.get("exam_type"):
+            terms.append(f"exam_type : {_phrase(canonical_value('examType', filters['exam_type']))}")
+        terms.extend(f"subjects : {_phrase(subject)}" for subject in required_subjects(filters.get("required_subjects")))
+
+        sql = "SELECT u.record FROM universities u"
+        if terms:
+            sql += " JOIN universities_fts f ON f.rowid = u.rowid"
+            where.append("universities_fts MATCH ?")
+            params.append(" AND ".join(terms))
+        return f"{sql} WHERE {' AND '.join(where)} ORDER BY u.name, u.faculty, u.exam_type", params
+
+    def search(self, filters: Dict[str, str], now: Optional[float] = None, limit: Optional[int] = None) -> List[dict]:
+        """Fresh records matching ``filters`` (only the supported ones are applied)."""
+        since = (time.time() if now is None else now) - CATALOG_MAX_AGE_HOURS * 3600
+        schedule_filter = parse_schedule_filter(filters.get("exam_schedule", ""))
+        with self._lock:
+            connection = self._connect()
+            if self._columns is not None:
+                # 日程条件は取り出した行に対して判定するため、その場合は件数を絞らない
+                universities = self._columns.query(filters, since, limit=None if schedule_filter else limit)
+            else:
+                sql, params = self._query(filters, since)
+                universities = [json.loads(row[0]) for row in connection.execute(sql, params).fetchall()]
+
+        if schedule_filter is not None:
+            # 日程から判定できない行は条件に合うとは言えないため返さない
+            verdicts = schedule_filter.judge(universities)
+            universities = [uni for uni, verdict in zip(universities, verdicts) if verdict]
+        return universities if limit is None else universities[:limit]
+
+    def lookup(self, filters: Dict[str, str], now: Optional[float] = None) -> Optional[List[dict]]:
+        """
+        Answer a search from the catalog, or return None when a filter cannot be checked against
+        stored fields or fewer than ``CATALOG_MIN_RESULTS`` fresh records match.
+        """
+        unsupported = [key for key, value in filters.items() if value and key not in SUPPORTED_FILTERS]
+        if unsupported:
+            CATALOG_LOOKUPS.inc(result="unsupported")
+            return None
+        universities = self.search(filters, now, limit=max(CATALOG_MAX_RESULTS, CATALOG_MIN_RESULTS))
+        if len(universities) < CATALOG_MIN_RESULTS:
+            CATALOG_LOOKUPS.inc(result="thin")
+            logger.info(f"Catalog has {len(universities)} fresh matches, falling back to web search")
+            return None
+        CATALOG_LOOKUPS.inc(result="hit")
+        return universities[:CATALOG_MAX_RESULTS]
+
+    def names(self) -> List[dict]:
+        """Distinct (name, faculty) pairs of stored records."""
+        with self._lock:
+            rows = self._connect().execute("SELECT DISTINCT name, faculty FROM universities").fetchall()
+        return [{"name": name, "faculty": faculty} for name, faculty in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            connection = self._connect()
+            total, oldest, newest = connection.execute(
+                "SELECT COUNT(*), MIN(updated_at), MAX(updated_at) FROM universities"
+            ).fetchone()
+            regions = dict(connection.execute(
+                "SELECT region, COUNT(*) FROM universities GROUP BY region ORDER BY COUNT(*) DESC"
+            ).fetchall())
+        stats = {"path": self.path, "records": total, "oldest": oldest, "newest": newest, "regions": regions}
+        if self._columns is not None:
+            stats["columnar"] = {
+                "rows": len(self._columns),
+                "capacity": self._columns.capacity,
+                "compactions": self._columns.compactions,
+            }
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+university_catalog: Optional[UniversityCatalog] = UniversityCatalog(CATALOG_PATH) if CATALOG_PATH else None
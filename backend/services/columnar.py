@@ -0,0 +1,339 @@
+"""
+Columnar Query Engine
+In-memory column store over catalog records that evaluates search filters as vectorized NumPy masks
+"""
+
+import logging
+import os
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.entities import canonical_value, normalize_text
+
+try:  # numpy is optional; the catalog falls back to SQL queries when it is not installed
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# 削除・置き換え済みの行がこの割合を超えたら詰め直す
+COLUMNAR_COMPACT_RATIO = float(os.getenv("COLUMNAR_COMPACT_RATIO", "0.25"))
+INITIAL_CAPACITY = 1024
+# 小さなストアでは詰め直しの頻度を抑える
+COMPACT_MIN_DEAD_ROWS = 1024
+# 候補の行がこの割合（1/N）を下回ったら、残りの条件は候補だけで評価する
+SPARSE_RATIO = 16
+LUT_CACHE_SIZE = 256
+
+# 検索フォームの科目名（「数学: Ⅰ・A / その他: 英語・理科」のような必要科目の条件から取り出す）
+SUBJECTS = ("数学", "国語", "英語", "理科", "物理", "化学", "生物", "地学", "地歴", "公民", "小論文", "面接", "実技")
+_SUBJECT_BITS = {subject: 1 << index for index, subject in enumerate(SUBJECTS)}
+
+# カテゴリ値として辞書エンコードする列（region などは完全一致、それ以外は部分一致で判定）
+CATEGORICAL_COLUMNS = ("region", "prefecture", "institution_type", "exam_type", "name", "faculty")
+TAG_COLUMNS = ("region", "prefecture", "institution_type")
+
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+Row = Tuple[dict, Dict[str, str], float]
+
+
+def parse_score_range(value: object) -> Optional[Tuple[float, float]]:
+    """``"60.0-70.0"``, ``"70-75"`` or ``"90-95%"`` as ``(low, high)``; a single number gives ``(n, n)``."""
+    numbers = [float(number) for number in _NUMBER_RE.findall(normalize_text(value))]
+    if not numbers:
+        return None
+    return min(numbers), max(numbers)
+
+
+def required_subjects(value: object) -> List[str]:
+    """Subjects named in a ``required_subjects`` condition or an entry's subject list."""
+    text = normalize_text(value)
+    return [subject for subject in SUBJECTS if subject in text]
+
+
+def subject_bits(value: object) -> int:
+    bits = 0
+    for subject in required_subjects(value):
+        bits |= _SUBJECT_BITS[subject]
+    return bits
+
+
+def match_text(value: object) -> str:
+    """Form used for substring matching: NFKC, lowercase, no whitespace."""
+    return normalize_text(value).lower().replace(" ", "")
+
+
+class _Dictionary:
+    """Value ↔ code mapping of one categorical column; code 0 is the empty value."""
+
+    def __init__(self) -> None:
+        self.values: List[str] = [""]
+        self.codes: Dict[str, int] = {"": 0}
+        self._luts: Dict[Tuple[str, str], "np.ndarray"] = {}
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+            self._luts.clear()
+        return code
+
+    def lookup(self, kind: str, term: str, predicate: Callable[[str], bool]) -> "np.ndarray":
+        # 条件の判定は行ではなく辞書の値ごとに1回だけ行い、codes で行に展開する
+        lut = self._luts.get((kind, term))
+        if lut is None:
+            if len(self._luts) >= LUT_CACHE_SIZE:
+                self._luts.clear()
+            lut = np.fromiter((bool(value) and predicate(value) for value in self.values), dtype=bool, count=len(self.values))
+            self._luts[(kind, term)] = lut
+        return lut
+
+
+def _code_predicate(codes: "np.ndarray", lut: "np.ndarray", matching: "np.ndarray") -> Callable[[object], "np.ndarray"]:
+    if len(matching) <= 4:
+        # 一致する値が少なければ、比較を重ねる方がルックアップ表の参照より速い
+        def predicate(rows):
+            selected = codes[rows]
+            result = selected == matching[0]
+            for code in matching[1:]:
+                result |= selected == code
+            return result
+        return predicate
+    return lambda rows: np.take(lut, codes[rows])
+
+
+class ColumnarStore:
+    """
+    Catalog records as columns: deviation and common test ranges in float ``low``/``high`` arrays
+    (NaN when unknown), dictionary-encoded categoricals and a subject bitset per row.
+
+    Rows are appended in place with amortized growth; upserting an existing ID marks the old
+    row dead, and the store is rebuilt without dead rows once they exceed ``compact_ratio``.
+    """
+
+    def __init__(self, compact_ratio: float = COLUMNAR_COMPACT_RATIO) -> None:
+        if np is None:
+            raise RuntimeError("numpy is required for the columnar store")
+        self.compact_ratio = compact_ratio
+        self.compactions = 0
+        self._reset(INITIAL_CAPACITY)
+
+    def _reset(self, capacity: int) -> None:
+        self._size = 0
+        self._dead = 0
+        self._records: List[dict] = []
+        self._rows: Dict[str, int] = {}
+        self._dictionaries = {column: _Dictionary() for column in CATEGORICAL_COLUMNS}
+        self._codes = {column: np.zeros(capacity, dtype=np.intp) for column in CATEGORICAL_COLUMNS}
+        self._ranges = {
+            name: np.full(capacity, np.nan) for name in ("deviation_low", "deviation_high", "common_test_low", "common_test_high")
+        }
+        self._subjects = np.zeros(capacity, dtype=np.uint32)
+        self._updated_at = np.zeros(capacity)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._rank: Optional["np.ndarray"] = None
+
+    def __len__(self) -> int:
+        return self._size - self._dead
+
+    @property
+    def capacity(self) -> int:
+        return len(self._alive)
+
+    def _grow(self, needed: int) -> None:
+        capacity = self.capacity
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+
+        def resized(array: "np.ndarray", fill) -> "np.ndarray":
+            grown = np.full(capacity, fill, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            return grown
+
+        self._codes = {column: resized(codes, 0) for column, codes in self._codes.items()}
+        self._ranges = {name: resized(values, np.nan) for name, values in self._ranges.items()}
+        self._subjects = resized(self._subjects, 0)
+        self._updated_at = resized(self._updated_at, 0.0)
+        self._alive = resized(self._alive, False)
+
+    def upsert(self, record: dict, tags: Dict[str, str], updated_at: float) -> None:
+        self.extend([(record, tags, updated_at)])
+
+    def extend(self, rows: Iterable[Row]) -> None:
+        """Append rows; a row whose ``id`` is already stored replaces it, keeping known tags."""
+        rows = list(rows)
+        self._grow(self._size + len(rows))
+        for record, tags, updated_at in rows:
+            record_id = record.get("id")
+            previous = self._rows.get(record_id)
+            if previous is not None:
+                # 空のタグは置き換え前の値を引き継ぐ（カタログの upsert と同じ）
+                tags = {
+                    column: tags.get(column) or self._dictionaries[column].values[self._codes[column][previous]]
+                    for column in TAG_COLUMNS
+                }
+                self._alive[previous] = False
+                self._dead += 1
+            index = self._size
+            self._size += 1
+            self._records.append(record)
+            self._rows[record_id] = index
+
+            values = {
+                "region": normalize_text(tags.get("region")),
+                "prefecture": normalize_text(tags.get("prefecture")),
+                "institution_type": normalize_text(tags.get("institution_type")),
+                "exam_type": match_text(record.get("examType")),
+                "name": match_text(record.get("name")),
+                "faculty": match_text(record.get("faculty")),
+            }
+            for column, value in values.items():
+                self._codes[column][index] = self._dictionaries[column].encode(value)
+            for prefix, field in (("deviation", "deviationScore"), ("common_test", "commonTestScore")):
+                bounds = parse_score_range(record.get(field))
+                if bounds:
+                    self._ranges[f"{prefix}_low"][index], self._ranges[f"{prefix}_high"][index] = bounds
+            self._subjects[index] = subject_bits(" ".join(record.get("requiredSubjects") or []))
+            self._updated_at[index] = updated_at
+            self._alive[index] = True
+        self._rank = None
+        if self._dead > max(self.compact_ratio * self._size, COMPACT_MIN_DEAD_ROWS):
+            self.compact()
+
+    def compact(self) -> None:
+        """Drop dead rows from every column and unused values from the dictionaries."""
+        live = np.flatnonzero(self._alive[:self._size])
+        before = self._size
+        capacity = max(INITIAL_CAPACITY, len(live) * 2)
+
+        def packed(array: "np.ndarray", fill) -> "np.ndarray":
+            result = np.full(capacity, fill, dtype=array.dtype)
+            result[:len(live)] = array[live]
+            return result
+
+        for column, dictionary in self._dictionaries.items():
+            # 使われている値だけで辞書を作り直し、コードを振り直す
+            used, remapped = np.unique(self._codes[column][live], return_inverse=True)
+            if len(used) == 0 or used[0] != 0:
+                used = np.concatenate(([0], used))
+                remapped = remapped + 1
+            rebuilt = _Dictionary()
+            for code in used[1:]:
+                rebuilt.encode(dictionary.values[code])
+            self._dictionaries[column] = rebuilt
+            codes = np.zeros(capacity, dtype=np.intp)
+            codes[:len(live)] = remapped
+            self._codes[column] = codes
+        self._ranges = {name: packed(values, np.nan) for name, values in self._ranges.items()}
+        self._subjects = packed(self._subjects, 0)
+        self._updated_at = packed(self._updated_at, 0.0)
+        self._alive = packed(self._alive, False)
+        self._records = [self._records[index] for index in live]
+        self._rows = {record.get("id"): index for index, record in enumerate(self._records)}
+        self._size = len(live)
+        self._dead = 0
+        self._rank = None
+        self.compactions += 1
+        logger.debug(f"Compacted columnar store from {before} to {self._size} rows")
+
+    def _sort_rank(self) -> "np.ndarray":
+        # 各行の (大学名, 学部, 入試形態) 順での順位。追加があるまで使い回す
+        if self._rank is None:
+            keys = [
+                (record.get("name") or "", record.get("faculty") or "", record.get("examType") or "")
+                for record in self._records
+            ]
+            order = np.array(sorted(range(self._size), key=keys.__getitem__), dtype=np.intp)
+            rank = np.empty(self._size, dtype=np.intp)
+            rank[order] = np.arange(self._size, dtype=np.intp)
+            self._rank = rank
+        return self._rank
+
+    def _predicates(self, filters: Dict[str, str]) -> Optional[List[Callable[[object], "np.ndarray"]]]:
+        """
+        Row predicates for ``filters``, most selective first. Each takes a slice or an index array
+        of rows and returns a boolean array; None means no row can match.
+        """
+        predicates: List[Callable[[object], "np.ndarray"]] = []
+        for column in TAG_COLUMNS:
+            value = normalize_text(filters.get(column))
+            if value:
+                code = self._dictionaries[column].codes.get(value)
+                if code is None:
+                    return None
+                predicates.append(lambda rows, codes=self._codes[column], code=code: codes[rows] == code)
+
+        for column, key, field in (
+            ("name", "name_keyword", "name"),
+            ("faculty", "faculty", "faculty"),
+            ("exam_type", "exam_type", "examType"),
+        ):
+            if filters.get(key):
+                term = match_text(canonical_value(field, filters[key]))
+                lut = self._dictionaries[column].lookup("contains", term, lambda value, term=term: term in value)
+                matching = np.flatnonzero(lut)
+                if len(matching) == 0:
+                    return None
+                predicates.append(_code_predicate(self._codes[column], lut, matching))
+
+        for key, prefix in (("deviation_score", "deviation"), ("common_test_score", "common_test")):
+            bounds = parse_score_range(filters.get(key))
+            if bounds:
+                # 範囲が重なるものを条件に合うとみなす（不明な値 NaN は比較で False になる）
+                high, low = self._ranges[f"{prefix}_high"], self._ranges[f"{prefix}_low"]
+                predicates.append(lambda rows, high=high, low=low, bounds=bounds: (high[rows] >= bounds[0]) & (low[rows] <= bounds[1]))
+
+        required = subject_bits(filters.get("required_subjects"))
+        if required:
+            predicates.append(lambda rows, subjects=self._subjects: (subjects[rows] & required) == required)
+        return predicates
+
+    def select(self, filters: Dict[str, str], since: float = 0.0) -> "np.ndarray":
+        """Indices of the rows matching ``filters`` and a minimum ``updated_at``, in storage order."""
+        size = self._size
+        predicates = self._predicates(filters)
+        if predicates is None:
+            return np.empty(0, dtype=np.intp)
+        full = slice(0, size)
+        mask = self._alive[:size].copy()
+        if since:
+            mask &= self._updated_at[:size] >= since
+        rows: Optional["np.ndarray"] = None
+        for predicate in predicates:
+            if rows is None:
+                mask &= predicate(full)
+                # 候補が少なくなったら、残りの条件は候補の行だけで評価する
+                if np.count_nonzero(mask) * SPARSE_RATIO < size:
+                    rows = np.flatnonzero(mask)
+            else:
+                rows = rows[predicate(rows)]
+                if len(rows) == 0:
+                    break
+        return np.flatnonzero(mask) if rows is None else rows
+
+    def mask(self, filters: Dict[str, str], since: float = 0.0) -> "np.ndarray":
+        """Boolean mask over stored rows for the supported ``filters`` and a minimum ``updated_at``."""
+        mask = np.zeros(self._size, dtype=bool)
+        mask[self.select(filters, since)] = True
+        return mask
+
+    def query(self, filters: Dict[str, str], since: float = 0.0, limit: Optional[int] = None) -> List[dict]:
+        """Records matching ``filters``, sorted by name, faculty and exam type."""
+        rows = self.select(filters, since)
+        if len(rows) == 0:
+            return []
+        rank = self._sort_rank()
+        ranks = rank[rows]
+        if limit is not None and limit < len(rows):
+            # 上位 limit 件だけを部分ソートする
+            nearest = np.argpartition(ranks, limit - 1)[:limit]
+            rows, ranks = rows[nearest], ranks[nearest]
+        return [self._records[index] for index in rows[np.argsort(ranks)]]
+
+    def count(self, filters: Dict[str, str], since: float = 0.0) -> int:
+        return len(self.select(filters, since))
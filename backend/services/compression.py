@@ -0,0 +1,249 @@
+"""
+Response Compression
+ASGI middleware with gzip/brotli negotiation that keeps Server-Sent Events incremental
+"""
+
+import logging
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:  # brotli is optional; only gzip is offered when it is not installed
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+class CompressionStats:
+    """Running totals per encoding so compression ratio and CPU cost can be measured."""
+
+    def __init__(self) -> None:
+        self.responses: Dict[str, int] = {}
+        self.bytes_in: Dict[str, int] = {}
+        self.bytes_out: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+        self.skipped_small = 0
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int, seconds: float) -> None:
+        self.bytes_in[encoding] = self.bytes_in.get(encoding, 0) + bytes_in
+        self.bytes_out[encoding] = self.bytes_out.get(encoding, 0) + bytes_out
+        self.seconds[encoding] = self.seconds.get(encoding, 0.0) + seconds
+
+    def record_response(self, encoding: str) -> None:
+        self.responses[encoding] = self.responses.get(encoding, 0) + 1
+
+    def snapshot(self) -> dict:
+        encodings = {}
+        for encoding, bytes_in in self.bytes_in.items():
+            bytes_out = self.bytes_out.get(encoding, 0)
+            encodings[encoding] = {
+                "responses": self.responses.get(encoding, 0),
+                "bytesIn": bytes_in,
+                "bytesOut": bytes_out,
+                "ratio": round(bytes_out / bytes_in, 4) if bytes_in else None,
+                "cpuSeconds": round(self.seconds.get(encoding, 0.0), 6),
+            }
+        return {"encodings": encodings, "skippedSmall": self.skipped_small}
+
+
+compression_stats = CompressionStats()
+
+
+def negotiate_encoding(accept_encoding: str, supported: Iterable[str] = SUPPORTED_ENCODINGS) -> Optional[str]:
+    """Pick the best supported encoding from an ``Accept-Encoding`` header value."""
+    supported = tuple(supported)
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[token] = weight
+
+    best: Optional[Tuple[float, int, str]] = None
+    for preference, encoding in enumerate(supported):
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight <= 0:
+            continue
+        candidate = (weight, -preference, encoding)
+        if best is None or candidate > best:
+            best = candidate
+    return best[2] if best else None
+
+
+class _Compressor:
+    """Thin wrapper giving gzip and brotli the same streaming interface."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int) -> None:
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            # wbits=31 で gzip ヘッダー付きのストリームを生成
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self._brotli is not None:
+            output = self._brotli.process(data)
+            return output + self._brotli.flush() if flush else output
+        output = self._zlib.compress(data)
+        return output + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else output
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    Compress HTTP responses according to ``Accept-Encoding``.
+
+    Buffered responses smaller than ``minimum_size`` are sent as-is.
+    ``text/event-stream`` responses are compressed chunk by chunk and the
+    compressor is flushed after every chunk (one SSE event), so clients keep
+    receiving events incrementally. Paths starting with an entry of
+    ``exclude_paths`` are never compressed.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        exclude_paths: Iterable[str] = (),
+        compress_event_streams: bool = True,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        stats: CompressionStats = compression_stats,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.exclude_paths = tuple(path for path in exclude_paths if path)
+        self.compress_event_streams = compress_event_streams
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stats = stats
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._is_excluded(scope.get("path", "")):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def _is_excluded(self, path: str) -> bool:
+        return any(path.startswith(prefix) for prefix in self.exclude_paths)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+        self.flush_each_chunk = False
+        self.started = False
+
+    async def send(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            if "content-encoding" in headers:
+                self.passthrough = True
+            elif headers.get("content-type", "").startswith("text/event-stream"):
+                self.passthrough = not self.middleware.compress_event_streams
+                self.flush_each_chunk = True
+            return
+
+        if message_type != "http.response.body":
+            await self.downstream(message)
+            return
+
+        if self.passthrough:
+            await self._start_uncompressed()
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.started:
+            if not more_body and not self.flush_each_chunk:
+                await self._send_whole(body)
+                return
+            await self._start_streaming()
+
+        started = time.perf_counter()
+        if more_body:
+            chunk = self.compressor.compress(body, flush=self.flush_each_chunk)
+        else:
+            chunk = self.compressor.compress(body) + self.compressor.finish()
+        self.middleware.stats.record(self.encoding, len(body), len(chunk), time.perf_counter() - started)
+        await self.downstream({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def _start_uncompressed(self) -> None:
+        if not self.started:
+            self.started = True
+            await self.downstream(self.start_message)
+
+    async def _send_whole(self, body: bytes) -> None:
+        if len(body) < self.middleware.minimum_size:
+            self.middleware.stats.skipped_small += 1
+            await self._start_uncompressed()
+            await self.downstream({"type": "http.response.body", "body": body, "more_body": False})
+            return
+
+        started = time.perf_counter()
+        compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+        compressed = compressor.compress(body) + compressor.finish()
+        self.middleware.stats.record(self.encoding, len(body), len(compressed), time.perf_counter() - started)
+        self.middleware.stats.record_response(self.encoding)
+
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers["Content-Length"] = str(len(compressed))
+        headers.add_vary_header("Accept-Encoding")
+        self.started = True
+        await self.downstream(self.start_message)
+        await self.downstream({"type": "http.response.body", "body": compressed, "more_body": False})
+
+    async def _start_streaming(self) -> None:
+        self.compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+        self.middleware.stats.record_response(self.encoding)
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "content-length" in headers:
+            del headers["content-length"]
+        self.started = True
+        await self.downstream(self.start_message)
+
+
+def parse_exclude_paths(value: str) -> List[str]:
+    """Parse a comma separated list of path prefixes."""
+    return [path.strip() for path in value.split(",") if path.strip()]
@@ -0,0 +1,21 @@
+"""
+Configuration
+Loads environment variables from .env once, before any service reads its settings
+"""
+
+import time
+
+from dotenv import load_dotenv
+
+# services パッケージが最初にインポートされた時刻（起動時間の計測基準）
+PROCESS_STARTED = time.monotonic()
+
+_loaded = False
+
+
+def load_config() -> None:
+    """Load ``.env`` into the environment; variables that are already set take precedence."""
+    global _loaded
+    if not _loaded:
+        load_dotenv()
+        _loaded = True
@@ -0,0 +1,191 @@
+"""
+University Entity Resolution
+Japanese text normalization, alias resolution, fuzzy matching and stable content-hash IDs for university records
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 大学名の類似度がこれ以上なら同一大学とみなす（0〜1）。学部は正規化後の一致か別名でのみ同一とみなす
+# （理工学部/工学部、文学部/人文学部のように1文字違いでも別の学部になるため）
+ENTITY_NAME_THRESHOLD = float(os.getenv("ENTITY_NAME_THRESHOLD", "0.9"))
+# 追加の別名テーブル（JSON: {"name": {"東工大": "東京科学大学"}, "faculty": {...}, "examType": {...}}）
+ENTITY_ALIASES_FILE = os.getenv("ENTITY_ALIASES_FILE", "")
+
+# 別名 → 正式名称（統合・改称・略称・旧入試区分）
+DEFAULT_ALIASES: Dict[str, Dict[str, str]] = {
+    "name": {
+        "東京工業大学": "東京科学大学",
+        "東京医科歯科大学": "東京科学大学",
+        "東工大": "東京科学大学",
+        "大阪府立大学": "大阪公立大学",
+        "大阪市立大学": "大阪公立大学",
+        "慶応義塾大学": "慶應義塾大学",
+        "慶応大学": "慶應義塾大学",
+        "慶大": "慶應義塾大学",
+        "早大": "早稲田大学",
+        "東大": "東京大学",
+        "京大": "京都大学",
+        "阪大": "大阪大学",
+    },
+    "faculty": {},
+    "examType": {
+        "一般入試": "一般選抜",
+        "AO入試": "総合型選抜",
+        "推薦入試": "学校推薦型選抜",
+        "センター試験利用": "共通テスト利用",
+        "センター利用": "共通テスト利用",
+    },
+}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(value: object) -> str:
+    """Display form: NFKC (full-width ASCII → half-width, half-width kana → full-width) with collapsed whitespace."""
+    if value is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(value))
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def _load_aliases(path: str) -> Dict[str, Dict[str, str]]:
+    aliases = {field: dict(table) for field, table in DEFAULT_ALIASES.items()}
+    if path:
+        try:
+            with open(path, encoding="utf-8") as handle:
+                for field, table in json.load(handle).items():
+                    aliases.setdefault(field, {}).update(table)
+        except (OSError, ValueError, AttributeError) as exc:
+            logger.error(f"Could not load entity aliases from {path}: {exc}")
+    # 別名も比較用の形にそろえておく
+    return {
+        field: {_compact(alias): canonical for alias, canonical in table.items()}
+        for field, table in aliases.items()
+    }
+
+
+def _compact(value: object) -> str:
+    return _WHITESPACE_RE.sub("", normalize_text(value)).lower()
+
+
+ALIASES = _load_aliases(ENTITY_ALIASES_FILE)
+
+
+def canonical_value(field: str, value: object) -> str:
+    """Display value with aliases resolved, e.g. ``canonical_value("name", "東京工業大学") == "東京科学大学"``."""
+    text = normalize_text(value)
+    return ALIASES.get(field, {}).get(_compact(text), text)
+
+
+@lru_cache(maxsize=8192)
+def _match_key(field: str, value: str) -> str:
+    return _compact(ALIASES.get(field, {}).get(_compact(value), value))
+
+
+def entity_key(university: dict) -> Tuple[str, str, str]:
+    """Comparison key (name, faculty, examType): NFKC, aliases resolved, whitespace removed, lowercase."""
+    return (
+        _match_key("name", str(university.get("name") or "")),
+        _match_key("faculty", str(university.get("faculty") or "")),
+        _match_key("examType", str(university.get("examType") or "")),
+    )
+
+
+def entity_id(university: dict) -> str:
+    """Deterministic ID derived from the entity key, identical across searches, processes and restarts."""
+    digest = hashlib.sha1("\x1f".join(entity_key(university)).encode("utf-8")).hexdigest()
+    return f"u-{digest[:12]}"
+
+
+def _similar(left: str, right: str, threshold: float) -> bool:
+    if left == right:
+        return True
+    if not left or not right:
+        return False
+    matcher = SequenceMatcher(None, left, right, autojunk=False)
+    return matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold
+
+
+# 「大学」と「大学院」「短期大学」のように1〜2文字違いでも別の機関になる種別（長いものから判定）
+_INSTITUTION_KINDS = ("短期大学", "大学院", "高等専門学校", "大学")
+
+
+def _institution_kind(name: str) -> str:
+    for kind in _INSTITUTION_KINDS:
+        if name.endswith(kind):
+            return kind
+    return ""
+
+
+class EntityResolver:
+    """
+    Group university records that describe the same (university, faculty, exam type).
+
+    Records with equal keys are grouped directly; otherwise a record joins an existing
+    group with the same exam type and faculty (after normalization and aliases) whose
+    name is similar enough. Fuzzy comparison only runs within the exam type, once per
+    distinct pair of names.
+    """
+
+    def __init__(self, name_threshold: float = ENTITY_NAME_THRESHOLD) -> None:
+        self.name_threshold = name_threshold
+        self._exact: Dict[Tuple[str, str, str], int] = {}
+        # 入試形態 → 大学名 → [(学部, グループ番号)]
+        self._by_exam: Dict[str, Dict[str, List[Tuple[str, int]]]] = {}
+        # 同じ名称の組み合わせは何度も比較されるため、類似度判定を覚えておく
+        self._similar_cache: Dict[Tuple[str, str, float], bool] = {}
+        self.groups: List[List[dict]] = []
+        self.fuzzy_matches = 0
+
+    def add(self, university: dict) -> int:
+        """Place ``university`` in a group and return the group index."""
+        key = entity_key(university)
+        index = self._exact.get(key)
+        if index is None:
+            index = self._find_similar(key)
+            if index is None:
+                index = len(self.groups)
+                self.groups.append([])
+                self._by_exam.setdefault(key[2], {}).setdefault(key[0], []).append((key[1], index))
+            else:
+                self.fuzzy_matches += 1
+            self._exact[key] = index
+        self.groups[index].append(university)
+        return index
+
+    def _similar(self, left: str, right: str, threshold: float) -> bool:
+        pair = (left, right, threshold) if left <= right else (right, left, threshold)
+        result = self._similar_cache.get(pair)
+        if result is None:
+            result = self._similar_cache[pair] = _similar(left, right, threshold)
+        return result
+
+    def _find_similar(self, key: Tuple[str, str, str]) -> Optional[int]:
+        name, faculty, exam = key
+        kind = _institution_kind(name)
+        for other_name, faculties in self._by_exam.get(exam, {}).items():
+            if other_name != name:
+                if _institution_kind(other_name) != kind or not self._similar(name, other_name, self.name_threshold):
+                    continue
+            for other_faculty, index in faculties:
+                if faculty == other_faculty:
+                    return index
+        return None
+
+
+def resolve_entities(universities: List[dict], choose: Callable[[List[dict]], dict]) -> List[dict]:
+    """Collapse records of the same entity into one chosen by ``choose``, preserving first-seen order."""
+    resolver = EntityResolver()
+    for university in universities:
+        resolver.add(university)
+    return [choose(group) for group in resolver.groups]
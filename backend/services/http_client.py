@@ -0,0 +1,368 @@
+"""
+HTTP Client
+Factory for upstream httpx clients with optional cassette record/replay and cost accounting
+"""
+
+import asyncio
+import atexit
+import base64
+import contextlib
+import contextvars
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# record: 実APIを呼び出してカセットに保存 / replay: カセットのみで応答（ネットワーク不要）
+UPSTREAM_CASSETTE = os.getenv("UPSTREAM_CASSETTE", "")
+UPSTREAM_CASSETTE_MODE = os.getenv("UPSTREAM_CASSETTE_MODE", "replay")
+
+# 上流APIへの接続プール（ウォームアップした接続を再利用できるようにアイドル接続を長めに保持）
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+# 記録しないヘッダー・リクエストボディのキー（APIキーなど）
+_REDACTED_HEADERS = {"authorization", "x-api-key", "cookie", "set-cookie"}
+_REDACTED_BODY_KEYS = {"api_key"}
+_RECORDED_RESPONSE_HEADERS = {"content-type", "retry-after"}
+
+
+class CassetteMiss(httpx.TransportError):
+    """Raised in replay mode when a request has no recorded interaction."""
+
+
+def classify_upstream(url: str) -> str:
+    """Name used for budgets and reports: ``hf``, ``tavily``, ``serper`` or the host."""
+    if "chat/completions" in url:
+        return "hf"
+    if "tavily" in url:
+        return "tavily"
+    if "serper" in url:
+        return "serper"
+    return httpx.URL(url).host
+
+
+def _request_key(request: httpx.Request) -> Tuple[str, str, str]:
+    body = request.content or b""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        canonical = body
+    else:
+        if isinstance(data, dict):
+            data = {key: value for key, value in data.items() if key not in _REDACTED_BODY_KEYS}
+        canonical = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return request.method, str(request.url.copy_with(query=None)), hashlib.sha256(canonical).hexdigest()
+
+
+def _token_usage(body: bytes) -> Tuple[int, int]:
+    """Sum prompt/completion tokens from a JSON completion or an SSE stream of chunks."""
+    text = body.decode("utf-8", errors="replace")
+    payloads = []
+    if text.lstrip().startswith("{"):
+        payloads.append(text)
+    else:
+        payloads.extend(
+            line[5:].strip() for line in text.splitlines() if line.startswith("data:") and "usage" in line
+        )
+    prompt = completion = 0
+    for payload in payloads:
+        try:
+            usage = json.loads(payload).get("usage")
+        except (ValueError, AttributeError):
+            continue
+        if isinstance(usage, dict):
+            prompt += int(usage.get("prompt_tokens") or 0)
+            completion += int(usage.get("completion_tokens") or 0)
+    return prompt, completion
+
+
+@dataclass
+class UpstreamUsage:
+    """Upstream cost of a run: calls per upstream, LLM tokens and bytes on the wire."""
+
+    calls: Counter = field(default_factory=Counter)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+
+    def record(self, request: httpx.Request, status: int, body: bytes) -> None:
+        upstream = classify_upstream(str(request.url))
+        self.calls[upstream] += 1
+        self.bytes_sent += len(request.content or b"")
+        self.bytes_received += len(body)
+        if upstream == "hf" and status == 200:
+            prompt, completion = _token_usage(body)
+            self.prompt_tokens += prompt
+            self.completion_tokens += completion
+
+    def count(self, request: httpx.Request) -> None:
+        """Count a call without its response (no token or received-byte accounting)."""
+        self.calls[classify_upstream(str(request.url))] += 1
+        self.bytes_sent += len(request.content or b"")
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": dict(sorted(self.calls.items())),
+            "promptTokens": self.prompt_tokens,
+            "completionTokens": self.completion_tokens,
+            "bytesSent": self.bytes_sent,
+            "bytesReceived": self.bytes_received,
+        }
+
+
+@dataclass
+class Budget:
+    """Per-request upper bounds; ``None`` leaves a dimension unchecked."""
+
+    calls: Dict[str, int] = field(default_factory=dict)
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    bytes_total: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Budget":
+        return cls(
+            calls=dict(data.get("calls", {})),
+            prompt_tokens=data.get("promptTokens"),
+            completion_tokens=data.get("completionTokens"),
+            bytes_total=data.get("bytes"),
+        )
+
+    def violations(self, usage: UpstreamUsage) -> List[str]:
+        problems = []
+        for upstream, limit in self.calls.items():
+            if usage.calls.get(upstream, 0) > limit:
+                problems.append(f"{upstream} calls {usage.calls[upstream]} > {limit}")
+        if self.prompt_tokens is not None and usage.prompt_tokens > self.prompt_tokens:
+            problems.append(f"prompt tokens {usage.prompt_tokens} > {self.prompt_tokens}")
+        if self.completion_tokens is not None and usage.completion_tokens > self.completion_tokens:
+            problems.append(f"completion tokens {usage.completion_tokens} > {self.completion_tokens}")
+        total_bytes = usage.bytes_sent + usage.bytes_received
+        if self.bytes_total is not None and total_bytes > self.bytes_total:
+            problems.append(f"bytes {total_bytes} > {self.bytes_total}")
+        return problems
+
+
+class Cassette:
+    """Recorded upstream interactions stored as one JSON file; replayed in recording order per request."""
+
+    def __init__(self, path: str, mode: str = "replay") -> None:
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.usage = UpstreamUsage()
+        self.misses: List[str] = []
+        self._recorded: List[dict] = []
+        self._replay: Dict[Tuple[str, str, str], Deque[dict]] = defaultdict(deque)
+        if mode == "replay":
+            self._load()
+
+    def _load(self) -> None:
+        with open(self.path, encoding="utf-8") as handle:
+            data = json.load(handle)
+        for interaction in data.get("interactions", []):
+            request = interaction["request"]
+            key = (request["method"], request["url"], request["bodyHash"])
+            self._replay[key].append(interaction["response"])
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as handle:
+            json.dump({"version": 1, "interactions": self._recorded}, handle, ensure_ascii=False, indent=1)
+            handle.write("\n")
+
+    def replay(self, request: httpx.Request) -> httpx.Response:
+        key = _request_key(request)
+        queue = self._replay.get(key)
+        if not queue:
+            self.misses.append(f"{request.method} {key[1]} {key[2][:12]}")
+            raise CassetteMiss(f"No recorded interaction for {request.method} {key[1]}", request=request)
+        recorded = queue.popleft()
+        if recorded.get("encoding") == "base64":
+            body = base64.b64decode(recorded["body"])
+        else:
+            body = recorded["body"].encode("utf-8")
+        self.usage.record(request, recorded["status"], body)
+        return httpx.Response(recorded["status"], headers=recorded.get("headers", {}), content=body, request=request)
+
+    def record(self, request: httpx.Request, response: httpx.Response, body: bytes) -> None:
+        method, url, body_hash = _request_key(request)
+        try:
+            encoded, encoding = body.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            encoded, encoding = base64.b64encode(body).decode("ascii"), "base64"
+        self._recorded.append({
+            "request": {
+                "method": method,
+                "url": url,
+                "bodyHash": body_hash,
+                "headers": {k: v for k, v in request.headers.items() if k.lower() not in _REDACTED_HEADERS},
+            },
+            "response": {
+                "status": response.status_code,
+                "headers": {k: v for k, v in response.headers.items() if k.lower() in _RECORDED_RESPONSE_HEADERS},
+                "body": encoded,
+                "encoding": encoding,
+            },
+        })
+        self.usage.record(request, response.status_code, body)
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cassette: Cassette, wrapped: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        self._cassette = cassette
+        self._wrapped = wrapped
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self._cassette.mode == "replay":
+            return self._cassette.replay(request)
+        if self._wrapped is None:
+            self._wrapped = httpx.AsyncHTTPTransport()
+        response = await self._wrapped.handle_async_request(request)
+        # 記録モードではストリーミング応答も全体を読み込んでから返す
+        body = await response.aread()
+        self._cassette.record(request, response, body)
+        headers = [
+            (key, value) for key, value in response.headers.multi_items()
+            if key.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+        ]
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    async def aclose(self) -> None:
+        if self._wrapped is not None:
+            await self._wrapped.aclose()
+
+
+_active_cassette: Optional[Cassette] = (
+    Cassette(UPSTREAM_CASSETTE, UPSTREAM_CASSETTE_MODE) if UPSTREAM_CASSETTE else None
+)
+if _active_cassette is not None:
+    logger.warning(f"Upstream cassette active ({UPSTREAM_CASSETTE_MODE}): {UPSTREAM_CASSETTE}")
+    # プロセスプールのワーカーもこのモジュールを読み込むため、保存は親プロセスだけが行う
+    if UPSTREAM_CASSETTE_MODE == "record" and multiprocessing.parent_process() is None:
+        atexit.register(_active_cassette.save)
+
+
+def active_cassette() -> Optional[Cassette]:
+    return _active_cassette
+
+
+@contextlib.contextmanager
+def use_cassette(path: str, mode: str = "replay") -> Iterator[Cassette]:
+    """Route every client created by ``create_client`` through a cassette; recordings are saved on exit."""
+    global _active_cassette
+    previous = _active_cassette
+    cassette = Cassette(path, mode)
+    _active_cassette = cassette
+    try:
+        yield cassette
+    finally:
+        _active_cassette = previous
+        if mode == "record":
+            cassette.save()
+
+
+_tracked_usage: contextvars.ContextVar[Optional[UpstreamUsage]] = contextvars.ContextVar(
+    "uninavi_upstream_usage", default=None
+)
+
+
+@contextlib.contextmanager
+def track_usage() -> Iterator[UpstreamUsage]:
+    """Count the upstream calls made by the current task and the tasks it starts."""
+    usage = UpstreamUsage()
+    token = _tracked_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _tracked_usage.reset(token)
+
+
+async def _count_request(request: httpx.Request) -> None:
+    usage = _tracked_usage.get()
+    if usage is not None:
+        usage.count(request)
+
+
+def create_client(**kwargs: Any) -> httpx.AsyncClient:
+    """``httpx.AsyncClient`` for upstream APIs; use instead of constructing clients directly."""
+    if _active_cassette is not None:
+        kwargs["transport"] = CassetteTransport(_active_cassette, kwargs.get("transport"))
+    kwargs.setdefault("event_hooks", {"request": [_count_request]})
+    return httpx.AsyncClient(**kwargs)
+
+
+_shared_client: Optional[httpx.AsyncClient] = None
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _pooled_client() -> httpx.AsyncClient:
+    """Client shared by all upstream calls on the running event loop."""
+    global _shared_client, _shared_loop
+    loop = asyncio.get_running_loop()
+    if _shared_client is None or _shared_loop is not loop or _shared_client.is_closed:
+        _shared_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            event_hooks={"request": [_count_request]},
+        )
+        _shared_loop = loop
+    return _shared_client
+
+
+@contextlib.asynccontextmanager
+async def upstream_client() -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Yield the pooled client so connections (DNS, TLS) are reused across requests.
+    Pass ``timeout=`` per request. While a cassette is active a dedicated client is used instead.
+    """
+    if _active_cassette is not None:
+        async with create_client() as client:
+            yield client
+        return
+    yield _pooled_client()
+
+
+async def warm_up(urls: List[str], timeout: float = 5.0) -> Dict[str, str]:
+    """Open pooled connections to ``urls`` ahead of the first request; returns the outcome per URL."""
+    if _active_cassette is not None or not urls:
+        return {}
+    client = _pooled_client()
+
+    async def _open(url: str) -> str:
+        try:
+            response = await client.head(url, timeout=timeout)
+            return str(response.status_code)
+        except httpx.HTTPError as exc:
+            return type(exc).__name__
+
+    outcomes = await asyncio.gather(*(_open(url) for url in urls))
+    return dict(zip(urls, outcomes))
+
+
+async def close_pool() -> None:
+    global _shared_client, _shared_loop
+    if _shared_client is not None:
+        await _shared_client.aclose()
+    _shared_client = None
+    _shared_loop = None
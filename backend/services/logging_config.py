@@ -0,0 +1,234 @@
+"""
+Logging Configuration
+Queue-based, structured logging with request IDs and per-category sampling of large payload logs
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import secrets
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# json: 1行1レコードの構造化ログ / text: 従来の人間向けフォーマット
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# カテゴリごとのサンプリング率と1秒あたりの上限（例: "payload=0.1"、"payload=5"）
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "payload=1.0")
+LOG_RATE_LIMITS = os.getenv("LOG_RATE_LIMITS", "payload=5")
+# 大きなペイロードログの最大文字数
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+
+# ペイロード（プロンプト全文・LLM応答・リクエスト本文）をログに出す際のカテゴリ
+PAYLOAD = {"category": "payload"}
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("uninavi_request_id", default="")
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "category"}
+
+
+def parse_category_values(spec: str) -> Dict[str, float]:
+    """Parse ``"payload=0.1,prompt=0.5"`` into a mapping; malformed items are ignored."""
+    values: Dict[str, float] = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        try:
+            values[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return values
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request ID to every record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class CategorySamplingFilter(logging.Filter):
+    """
+    Sample and rate-limit records logged with ``extra={"category": ...}``.
+
+    Records without a category always pass. Dropped records are counted and the
+    count is reported on the next record of that category that gets through.
+    """
+
+    def __init__(self, sample_rates: Dict[str, float], rate_limits: Dict[str, float], max_chars: int = 2000) -> None:
+        super().__init__()
+        self.sample_rates = sample_rates
+        self.rate_limits = rate_limits
+        self.max_chars = max_chars
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._dropped: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _take_token(self, category: str) -> bool:
+        limit = self.rate_limits.get(category)
+        if not limit:
+            return True
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(category, (limit, now))
+        tokens = min(limit, tokens + (now - updated) * limit)
+        if tokens < 1:
+            self._buckets[category] = (tokens, now)
+            return False
+        self._buckets[category] = (tokens - 1, now)
+        return True
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        category = getattr(record, "category", None)
+        if not category:
+            return True
+        with self._lock:
+            rate = self.sample_rates.get(category, 1.0)
+            if (rate < 1.0 and random.random() >= rate) or not self._take_token(category):
+                self._dropped[category] = self._dropped.get(category, 0) + 1
+                return False
+            dropped = self._dropped.pop(category, 0)
+        # 書式化はここで一度だけ行い、長いペイロードは切り詰める
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            message = f"{message[:self.max_chars]}... [{len(message) - self.max_chars} chars truncated]"
+        if dropped:
+            message = f"{message} [{dropped} similar records dropped]"
+        record.msg, record.args = message, None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", "")
+        if request_id:
+            data["requestId"] = request_id
+        category = getattr(record, "category", None)
+        if category:
+            data["category"] = category
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(request_id)s%(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        request_id = getattr(record, "request_id", "")
+        record.request_id = f"[{request_id}] " if request_id else ""
+        try:
+            return super().format(record)
+        finally:
+            record.request_id = request_id
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never block the event loop: when the queue is full the record is dropped."""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 書式化はリスナースレッドで行うため、ここではメッセージを確定させない
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging() -> None:
+    """Route all logging through a bounded queue drained by a background thread."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = _DroppingQueueHandler(log_queue)
+    # フィルターはイベントループ側で評価し、捨てるレコードはキューに入れない
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(
+        CategorySamplingFilter(
+            parse_category_values(LOG_SAMPLE_RATES),
+            parse_category_values(LOG_RATE_LIMITS),
+            LOG_PAYLOAD_MAX_CHARS,
+        )
+    )
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def new_request_id() -> str:
+    return secrets.token_hex(8)
+
+
+class RequestIdMiddleware:
+    """Take the request ID from ``X-Request-ID`` (or generate one), expose it to logs and echo it back."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = ""
+        for key, value in scope.get("headers", []):
+            if key == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or new_request_id()
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,172 @@
+"""
+Event Loop Monitor
+Samples event-loop scheduling lag, captures stacks of stalls and runs an on-demand sampling profiler
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional
+
+from services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "1") != "0"
+# ラグの計測間隔（秒）
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+# これ以上イベントループが応答しない場合にスタックを記録（秒）
+LOOP_SLOW_THRESHOLD = float(os.getenv("LOOP_SLOW_THRESHOLD", "0.1"))
+LOOP_SLOW_HISTORY = int(os.getenv("LOOP_SLOW_HISTORY", "50"))
+
+LOOP_LAG = registry.histogram(
+    "uninavi_event_loop_lag_seconds",
+    "Delay between when the loop monitor was scheduled to wake up and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_STALLS = registry.counter(
+    "uninavi_event_loop_stalls_total",
+    "Times the event loop was blocked longer than LOOP_SLOW_THRESHOLD",
+)
+
+
+def _format_stack(frame) -> List[str]:
+    return [line.rstrip() for line in traceback.format_stack(frame)]
+
+
+class LoopLagMonitor:
+    """
+    Measure how late a periodic ``asyncio.sleep`` wakes up.
+
+    A watchdog thread checks the loop's heartbeat; when the loop has been
+    unresponsive for ``slow_threshold`` seconds it captures the loop thread's
+    stack, which points at the blocking callback.
+    """
+
+    def __init__(self, interval: float = 0.1, slow_threshold: float = 0.1, history: int = 50) -> None:
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.max_lag = 0.0
+        self.samples = 0
+        self.stalls: Deque[Dict[str, object]] = deque(maxlen=history)
+        self._recent_lag: Deque[float] = deque(maxlen=600)
+        self._heartbeat = time.monotonic()
+        self._pending_stall: Optional[Dict[str, object]] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sample(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._heartbeat = now
+            stall = self._pending_stall
+            if stall is not None:
+                # ウォッチドッグが記録した停止の実際の長さで更新
+                stall["blockedMs"] = round(lag * 1000, 1)
+                self._pending_stall = None
+            self.samples += 1
+            self.max_lag = max(self.max_lag, lag)
+            self._recent_lag.append(lag)
+            LOOP_LAG.observe(lag)
+
+    def _watch(self) -> None:
+        reported_for = None
+        while not self._stop.wait(self.slow_threshold / 2):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.slow_threshold or reported_for == heartbeat:
+                continue
+            # 同じ停止は一度だけ記録する
+            reported_for = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = _format_stack(frame) if frame is not None else []
+            LOOP_STALLS.inc()
+            stall = {"time": time.time(), "blockedMs": round(blocked * 1000, 1), "stack": stack}
+            self.stalls.append(stall)
+            self._pending_stall = stall
+            logger.warning(f"Event loop blocked for {blocked * 1000:.0f} ms")
+
+    def snapshot(self) -> dict:
+        recent = sorted(self._recent_lag)
+
+        def pct(p: float) -> float:
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))] * 1000, 3) if recent else 0.0
+
+        return {
+            "running": self.running,
+            "intervalMs": self.interval * 1000,
+            "slowThresholdMs": self.slow_threshold * 1000,
+            "samples": self.samples,
+            "lagMs": {"p50": pct(0.5), "p99": pct(0.99), "max": round(self.max_lag * 1000, 3)},
+            "stalls": list(self.stalls),
+        }
+
+
+loop_monitor = LoopLagMonitor(
+    interval=LOOP_MONITOR_INTERVAL,
+    slow_threshold=LOOP_SLOW_THRESHOLD,
+    history=LOOP_SLOW_HISTORY,
+)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> str:
+    """
+    Sample every thread's stack for ``seconds`` and return collapsed stacks
+    (``thread;outer;...;inner count`` per line), the input format of flamegraph.pl and speedscope.
+    Blocks the calling thread, so run it via ``asyncio.to_thread``.
+    """
+    own_id = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(thread_id, str(thread_id)))
+            counts[";".join(reversed(labels))] += 1
+        time.sleep(interval)
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common()) + "\n"
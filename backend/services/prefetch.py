@@ -0,0 +1,266 @@
+"""
+Speculative Prefetch
+Fetches the filter sets a user is likely to search next (one more filter, a neighbouring prefecture)
+in the background after a search completes and puts them in the result cache
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.admission import AdmissionController
+from services.http_client import track_usage
+from services.metrics import registry
+from services.refresh import FilterPopularity
+from services.result_cache import SearchResultCache, make_cache_key
+
+logger = logging.getLogger(__name__)
+
+# 既定では無効（有効にすると検索のたびに上流APIを追加で呼び出す）
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "0") == "1"
+# 1回の検索から先読みする条件数
+PREFETCH_MAX_PER_SEARCH = int(os.getenv("PREFETCH_MAX_PER_SEARCH", "3"))
+# PREFETCH_BUDGET_WINDOW_SECONDS ごとの上流API呼び出し数の上限
+PREFETCH_BUDGET_CALLS = int(os.getenv("PREFETCH_BUDGET_CALLS", "200"))
+PREFETCH_BUDGET_WINDOW_SECONDS = float(os.getenv("PREFETCH_BUDGET_WINDOW_SECONDS", "3600"))
+# 待機できる先読みの数（超えた分は捨てる）
+PREFETCH_QUEUE_SIZE = int(os.getenv("PREFETCH_QUEUE_SIZE", "16"))
+# 隣接する都道府県の検索も先読みする（Web検索を伴うため高コスト）
+PREFETCH_NEIGHBOURS = os.getenv("PREFETCH_NEIGHBOURS", "1") != "0"
+
+# 絞り込みとして追加されやすい条件と値（フロントエンドの選択肢と同じ）
+REFINEMENTS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("institution_type", ("国公立", "私立")),
+    ("exam_type", ("一般選抜", "学校推薦型", "総合型選抜")),
+)
+
+# 地方ごとの都道府県（JISコード順。隣り合う県を近隣として扱う）
+PREFECTURES_BY_REGION: Dict[str, List[str]] = {
+    "北海道": ["北海道"],
+    "東北": ["青森県", "岩手県", "宮城県", "秋田県", "山形県", "福島県"],
+    "関東": ["茨城県", "栃木県", "群馬県", "埼玉県", "千葉県", "東京都", "神奈川県"],
+    "中部": ["新潟県", "富山県", "石川県", "福井県", "山梨県", "長野県", "岐阜県", "静岡県", "愛知県"],
+    "近畿": ["三重県", "滋賀県", "京都府", "大阪府", "兵庫県", "奈良県", "和歌山県"],
+    "中国": ["鳥取県", "島根県", "岡山県", "広島県", "山口県"],
+    "四国": ["徳島県", "香川県", "愛媛県", "高知県"],
+    "九州・沖縄": ["福岡県", "佐賀県", "長崎県", "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県"],
+}
+
+PREFETCH_RUNS = registry.counter(
+    "uninavi_prefetch_total",
+    "Speculative prefetches by kind (derive, fetch) and result",
+    ["kind", "result"],
+)
+PREFETCH_HITS = registry.counter(
+    "uninavi_prefetch_hits_total",
+    "Searches answered from a result cache entry filled by a prefetch",
+)
+PREFETCH_UPSTREAM_CALLS = registry.counter(
+    "uninavi_prefetch_upstream_calls_total",
+    "Upstream API calls made by speculative prefetches",
+    ["upstream"],
+)
+
+
+def _prefetch_hit_ratio():
+    stored = sum(PREFETCH_RUNS.value(kind=kind, result="stored") for kind in ("derive", "fetch"))
+    yield {}, (PREFETCH_HITS.value() / stored if stored else 0.0)
+
+
+registry.gauge(
+    "uninavi_prefetch_hit_ratio",
+    "Share of prefetched filter sets that were later searched while cached",
+    callback=_prefetch_hit_ratio,
+)
+
+
+def neighbouring_prefectures(prefecture: str) -> List[str]:
+    for prefectures in PREFECTURES_BY_REGION.values():
+        if prefecture in prefectures:
+            index = prefectures.index(prefecture)
+            return [prefectures[i] for i in (index - 1, index + 1) if 0 <= i < len(prefectures)]
+    return []
+
+
+class SpeculativePrefetcher:
+    """
+    After a search, queue its likely follow-ups: the same filters plus one of ``REFINEMENTS``
+    (``derive``: re-filter the results already fetched, no web search) and the same search in a
+    neighbouring prefecture (``fetch``: a full pipeline run). Candidates are ranked by how often users
+    searched them. One background worker runs the queue; each prefetch takes an admission slot without
+    waiting, so work is dropped while the search pipelines are full, and once the upstream calls of
+    the current budget window are spent.
+    """
+
+    def __init__(
+        self,
+        cache: SearchResultCache,
+        popularity: FilterPopularity,
+        derive: Callable[[List[dict], Dict[str, str]], Awaitable[Optional[List[dict]]]],
+        fetch: Callable[[Dict[str, str]], Awaitable[List[dict]]],
+        enabled: bool = False,
+        max_per_search: int = 3,
+        budget_calls: int = 200,
+        budget_window: float = 3600.0,
+        queue_size: int = 16,
+        neighbours: bool = True,
+        admission: Optional[AdmissionController] = None,
+    ) -> None:
+        self.cache = cache
+        self.popularity = popularity
+        self._derive = derive
+        self._fetch = fetch
+        self.enabled = enabled
+        self.max_per_search = max_per_search
+        self.budget_calls = budget_calls
+        self.budget_window = budget_window
+        self.queue_size = queue_size
+        self.neighbours = neighbours
+        self.admission = admission
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._window_started = time.monotonic()
+        self.budget_used = 0
+        # 種類ごとの1回あたりの上流呼び出し数（指数移動平均）
+        self.calls_per_prefetch: Dict[str, float] = {"derive": 0.0, "fetch": 0.0}
+        # 先読みした条件（ヒット判定用）
+        self._prefetched: "OrderedDict[str, float]" = OrderedDict()
+        self.hits = 0
+        self.stored = 0
+
+    def candidates(self, filters: Dict[str, str]) -> List[Tuple[str, Dict[str, str]]]:
+        """Likely next filter sets, most requested first, as ``(kind, filters)``."""
+        options: List[Tuple[str, Dict[str, str]]] = []
+        for field, values in REFINEMENTS:
+            if not filters.get(field):
+                options.extend(("derive", {**filters, field: value}) for value in values)
+        if self.neighbours and filters.get("prefecture"):
+            options.extend(
+                ("fetch", {**filters, "prefecture": prefecture})
+                for prefecture in neighbouring_prefectures(filters["prefecture"])
+            )
+        # 人気順（同点は上の並び順）。絞り込みは安価なので近隣県より先にする
+        ranked = sorted(
+            enumerate(options),
+            key=lambda item: (-self.popularity.score(item[1][1]), item[1][0] != "derive", item[0]),
+        )
+        return [option for _, option in ranked if not self.cache.contains(option[1])]
+
+    def schedule(self, filters: Dict[str, str], universities: List[dict]) -> int:
+        """Queue the follow-ups of a finished search; returns how many were queued."""
+        if not self.enabled or self.cache.ttl_seconds <= 0:
+            return 0
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        if self._worker is None or self._worker.done():
+            # ワーカーは最初に先読みを登録したリクエストより長く動くため、そのトレースやリクエストIDを引き継がない
+            self._worker = asyncio.get_running_loop().create_task(self._work(), context=contextvars.Context())
+        parent = [dict(university) for university in universities]
+        queued = 0
+        for kind, candidate in self.candidates(filters)[: self.max_per_search]:
+            try:
+                self._queue.put_nowait((kind, candidate, parent))
+                queued += 1
+            except asyncio.QueueFull:
+                PREFETCH_RUNS.inc(kind=kind, result="dropped")
+        return queued
+
+    async def _work(self) -> None:
+        while True:
+            kind, filters, parent = await self._queue.get()
+            try:
+                await self._run(kind, filters, parent)
+            except Exception as exc:  # noqa: BLE001
+                PREFETCH_RUNS.inc(kind=kind, result="failed")
+                logger.warning(f"Prefetch of {make_cache_key(filters)} failed: {exc}")
+            finally:
+                self._queue.task_done()
+
+    def _budget_left(self, kind: str) -> bool:
+        now = time.monotonic()
+        if now - self._window_started >= self.budget_window:
+            self._window_started = now
+            self.budget_used = 0
+        return self.budget_used + max(self.calls_per_prefetch[kind], 1.0) <= self.budget_calls
+
+    async def _run(self, kind: str, filters: Dict[str, str], parent: List[dict]) -> None:
+        if self.cache.contains(filters):
+            PREFETCH_RUNS.inc(kind=kind, result="cached")
+            return
+        if not self._budget_left(kind):
+            PREFETCH_RUNS.inc(kind=kind, result="budget")
+            return
+        ticket = await self.admission.try_acquire() if self.admission is not None else None
+        if self.admission is not None and ticket is None:
+            PREFETCH_RUNS.inc(kind=kind, result="busy")
+            return
+
+        with track_usage() as usage:
+            try:
+                if kind == "derive":
+                    results = await self._derive(parent, filters)
+                else:
+                    results = await self._fetch(filters)
+            finally:
+                if ticket is not None:
+                    ticket.release()
+                calls = usage.total_calls
+                self.budget_used += calls
+                for upstream, upstream_calls in usage.calls.items():
+                    PREFETCH_UPSTREAM_CALLS.inc(upstream_calls, upstream=upstream)
+        if results is None:
+            PREFETCH_RUNS.inc(kind=kind, result="unavailable")
+            return
+        estimate = self.calls_per_prefetch[kind]
+        self.calls_per_prefetch[kind] = calls if estimate == 0 else 0.8 * estimate + 0.2 * calls
+        if kind == "derive":
+            # 全件取得（fetch）は検索パイプライン側でキャッシュに入る
+            self.cache.set(filters, results)
+        key = make_cache_key(filters)
+        self._prefetched[key] = time.time()
+        self._prefetched.move_to_end(key)
+        while len(self._prefetched) > self.cache.max_entries:
+            self._prefetched.popitem(last=False)
+        self.stored += 1
+        PREFETCH_RUNS.inc(kind=kind, result="stored")
+        logger.info(f"Prefetched {key} ({kind}, {len(results)} results, {calls} upstream calls)")
+
+    def note_hit(self, filters: Dict[str, str]) -> None:
+        """Count a result cache hit on a prefetched filter set (once per prefetch)."""
+        if self._prefetched.pop(make_cache_key(filters), None) is not None:
+            self.hits += 1
+            PREFETCH_HITS.inc()
+
+    def snapshot(self) -> dict:
+        self._budget_left("derive")
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "stored": self.stored,
+            "hits": self.hits,
+            "hitRate": round(self.hits / self.stored, 4) if self.stored else 0.0,
+            "budget": {
+                "limit": self.budget_calls,
+                "used": self.budget_used,
+                "windowSeconds": self.budget_window,
+                "callsPerPrefetch": {kind: round(calls, 2) for kind, calls in self.calls_per_prefetch.items()},
+            },
+            "runs": {
+                f"{labels['kind']}:{labels['result']}": int(PREFETCH_RUNS.value(**labels))
+                for labels in PREFETCH_RUNS.labelsets()
+            },
+        }
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._queue = None
@@ -0,0 +1,88 @@
+"""
+Processing
+Runs CPU-bound post-processing off the event loop in a thread or process pool chosen by payload size
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Sized, TypeVar
+
+from services.metrics import registry
+
+T = TypeVar("T")
+
+# これ未満（文字数換算）はイベントループ上でそのまま実行（プールへの受け渡しの方が高くつく）
+PROCESSING_INLINE_MAX = int(os.getenv("PROCESSING_INLINE_MAX", "4000"))
+# これ以上はプロセスプールで実行（GILを避ける）。0 でプロセスプールを無効化
+PROCESSING_PROCESS_MIN = int(os.getenv("PROCESSING_PROCESS_MIN", "1000000"))
+PROCESSING_THREADS = int(os.getenv("PROCESSING_THREADS", "4"))
+PROCESSING_PROCESSES = int(os.getenv("PROCESSING_PROCESSES", "2"))
+
+# 1件の大学エントリをJSONにしたときのおおよその文字数（リスト処理のサイズ見積もり用）
+ENTRY_SIZE_ESTIMATE = 800
+
+PROCESSING_DURATION = registry.histogram(
+    "uninavi_processing_seconds",
+    "Wall time of CPU-bound post-processing steps, including pool hand-off",
+    ["task", "executor"],
+)
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def estimate_size(items: Sized) -> int:
+    """Approximate payload size of a list of university entries or search results."""
+    return len(items) * ENTRY_SIZE_ESTIMATE
+
+
+def _executor_for(size: int) -> Optional[Executor]:
+    global _thread_pool, _process_pool
+    if size < PROCESSING_INLINE_MAX:
+        return None
+    if PROCESSING_PROCESS_MIN and size >= PROCESSING_PROCESS_MIN:
+        if _process_pool is None:
+            # fork はイベントループや監視スレッドの状態を複製するため spawn を使う
+            _process_pool = ProcessPoolExecutor(
+                max_workers=PROCESSING_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=PROCESSING_THREADS, thread_name_prefix="processing")
+    return _thread_pool
+
+
+async def run_cpu(func: Callable[..., T], *args: Any, size: int = 0) -> T:
+    """
+    Run ``func(*args)`` inline, in the thread pool or in the process pool depending on ``size``.
+
+    Cancelling the awaiting task cancels work that has not started yet; work that is already
+    running finishes in the background and its result is discarded. Functions sent to the
+    process pool must be importable module-level functions with picklable arguments.
+    """
+    task = getattr(func, "__name__", "task")
+    executor = _executor_for(size)
+    started = time.perf_counter()
+    if executor is None:
+        try:
+            return func(*args)
+        finally:
+            PROCESSING_DURATION.observe(time.perf_counter() - started, task=task, executor="inline")
+
+    label = "process" if executor is _process_pool else "thread"
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    finally:
+        PROCESSING_DURATION.observe(time.perf_counter() - started, task=task, executor=label)
+
+
+def shutdown_pools() -> None:
+    global _thread_pool, _process_pool
+    for pool in (_thread_pool, _process_pool):
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    _thread_pool = None
+    _process_pool = None
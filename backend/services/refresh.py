@@ -0,0 +1,338 @@
+"""
+Background Refresh
+Tracks how often each canonical filter set is searched and re-runs the most popular ones during
+off-peak hours within an upstream call budget, so admission-season traffic finds warm caches
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from services.http_client import track_usage
+from services.metrics import registry
+from services.result_cache import make_cache_key
+from services.schedules import JST
+
+logger = logging.getLogger(__name__)
+
+# 既定では無効（有効にすると閑散時間帯に上流APIを呼び出す）
+REFRESH_ENABLED = os.getenv("REFRESH_ENABLED", "0") == "1"
+# 更新する人気条件の数
+REFRESH_TOP_N = int(os.getenv("REFRESH_TOP_N", "20"))
+# 更新対象にする最低リクエスト数
+REFRESH_MIN_REQUESTS = int(os.getenv("REFRESH_MIN_REQUESTS", "2"))
+# 閑散時間帯（日本時間、"開始-終了" 時。日付をまたいでもよい）
+REFRESH_HOURS = os.getenv("REFRESH_HOURS", "2-6")
+# 閑散時間帯1回あたりの上流API呼び出し数の上限
+REFRESH_BUDGET_CALLS = int(os.getenv("REFRESH_BUDGET_CALLS", "300"))
+# 更新の間隔（秒、±50%のランダムな揺らぎを加える）
+REFRESH_INTERVAL_SECONDS = float(os.getenv("REFRESH_INTERVAL_SECONDS", "120"))
+# 結果がこれより古くなった条件を更新する（時間）
+REFRESH_MAX_AGE_HOURS = float(os.getenv("REFRESH_MAX_AGE_HOURS", "24"))
+# 条件ごとに更新周期を最大この割合だけ短くし、期限切れの時刻を分散する
+REFRESH_JITTER = float(os.getenv("REFRESH_JITTER", "0.25"))
+# 更新に失敗した条件を再試行するまでの時間（分）
+REFRESH_RETRY_MINUTES = float(os.getenv("REFRESH_RETRY_MINUTES", "60"))
+# リクエスト数の半減期（時間）と追跡する条件数の上限
+REFRESH_HALF_LIFE_HOURS = float(os.getenv("REFRESH_HALF_LIFE_HOURS", "72"))
+REFRESH_TRACKED_MAX = int(os.getenv("REFRESH_TRACKED_MAX", "2000"))
+
+REFRESH_RUNS = registry.counter(
+    "uninavi_refresh_runs_total",
+    "Background refresh attempts by result (refreshed, failed, budget)",
+    ["result"],
+)
+REFRESH_UPSTREAM_CALLS = registry.counter(
+    "uninavi_refresh_upstream_calls_total",
+    "Upstream API calls made by background refreshes",
+    ["upstream"],
+)
+
+
+def parse_hours(value: str) -> Set[int]:
+    """JST hours covered by ``"2-6"`` (2:00 until 6:00); ranges may wrap past midnight, e.g. ``"23-5"``."""
+    hours: Set[int] = set()
+    for part in value.split(","):
+        start, _, end = part.strip().partition("-")
+        if not start.strip().isdigit():
+            continue
+        first = int(start) % 24
+        last = int(end) % 24 if end.strip().isdigit() else (first + 1) % 24
+        hour = first
+        while True:
+            hours.add(hour)
+            hour = (hour + 1) % 24
+            if hour == last:
+                break
+    return hours
+
+
+def _key_fraction(key: str) -> float:
+    """Stable value in [0, 1) per filter set, used to stagger refresh periods."""
+    return int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:8], 16) / 0x100000000
+
+
+class FilterPopularity:
+    """
+    Request counts per canonical filter set (``make_cache_key``) with exponential decay, plus
+    when each set last produced results that were stored.
+    """
+
+    def __init__(self, half_life_hours: float = 72.0, max_entries: int = 2000) -> None:
+        self.half_life = half_life_hours * 3600
+        self.max_entries = max_entries
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _score(self, entry: dict, now: float) -> float:
+        if self.half_life <= 0:
+            return entry["score"]
+        return entry["score"] * 0.5 ** ((now - entry["scoredAt"]) / self.half_life)
+
+    def record(self, filters: Dict[str, str], now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        key = make_cache_key(filters)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                cleaned = {name: value.strip() for name, value in filters.items() if isinstance(value, str) and value.strip()}
+                entry = self._entries[key] = {
+                    "filters": cleaned, "requests": 0, "score": 0.0, "scoredAt": now,
+                    "fetchedAt": None, "attemptedAt": None,
+                }
+            entry["score"] = self._score(entry, now) + 1.0
+            entry["scoredAt"] = now
+            entry["requests"] += 1
+            if len(self._entries) > self.max_entries:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        # 人気の低い1割を捨てる
+        ranked = sorted(self._entries, key=lambda key: self._score(self._entries[key], now))
+        for key in ranked[: max(1, len(ranked) // 10)]:
+            del self._entries[key]
+
+    def score(self, filters: Dict[str, str], now: Optional[float] = None) -> float:
+        """Decayed request count of a filter set (0 if never requested)."""
+        entry = self._entries.get(make_cache_key(filters))
+        if entry is None:
+            return 0.0
+        return self._score(entry, time.time() if now is None else now)
+
+    def mark_fetched(self, filters: Dict[str, str], now: Optional[float] = None) -> None:
+        entry = self._entries.get(make_cache_key(filters))
+        if entry is not None:
+            entry["fetchedAt"] = time.time() if now is None else now
+
+    def mark_attempted(self, key: str, now: Optional[float] = None) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry["attemptedAt"] = time.time() if now is None else now
+
+    def top(self, limit: int, min_requests: int = 1, now: Optional[float] = None) -> List[dict]:
+        """The ``limit`` most requested filter sets, most popular first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            ranked = [
+                {"key": key, "score": self._score(entry, now), **entry}
+                for key, entry in self._entries.items()
+                if entry["requests"] >= min_requests
+            ]
+        ranked.sort(key=lambda entry: entry["score"], reverse=True)
+        return ranked[:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+filter_popularity = FilterPopularity(half_life_hours=REFRESH_HALF_LIFE_HOURS, max_entries=REFRESH_TRACKED_MAX)
+
+
+class RefreshScheduler:
+    """
+    Every ``interval`` seconds (randomized ±50%) during ``hours``, re-run the most popular filter set
+    whose results are older than its refresh period. Each set's period is ``max_age`` shortened by a
+    stable per-set fraction of up to ``jitter``, so sets fetched together come due at different times.
+    Refreshes stop for the window once the upstream calls spent would exceed ``budget_calls``.
+    """
+
+    def __init__(
+        self,
+        popularity: FilterPopularity,
+        refresh: Callable[[Dict[str, str]], Awaitable[List[dict]]],
+        top_n: int = 20,
+        min_requests: int = 2,
+        hours: str = "2-6",
+        budget_calls: int = 300,
+        interval: float = 120.0,
+        max_age_hours: float = 24.0,
+        jitter: float = 0.25,
+        retry_minutes: float = 60.0,
+        is_busy: Optional[Callable[[], bool]] = None,
+    ) -> None:
+        self.popularity = popularity
+        self._refresh = refresh
+        self.top_n = top_n
+        self.min_requests = min_requests
+        self.hours = parse_hours(hours)
+        self.budget_calls = budget_calls
+        self.interval = interval
+        self.max_age = max_age_hours * 3600
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self.retry_seconds = retry_minutes * 60
+        self._is_busy = is_busy
+        self._task: Optional[asyncio.Task] = None
+        self._window: Optional[str] = None
+        self.budget_used = 0
+        # 1回の更新あたりの上流呼び出し数（指数移動平均）
+        self.calls_per_refresh = 0.0
+        self.runs: Dict[str, int] = {"refreshed": 0, "failed": 0, "budget": 0}
+        self.last_run: Optional[dict] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running or not self.hours:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval * random.uniform(0.5, 1.5))
+            try:
+                await self.tick()
+            except Exception as exc:  # noqa: BLE001
+                logger.warning(f"Refresh tick failed: {exc}")
+
+    def _window_id(self, now: float) -> Optional[str]:
+        """Date-stamped id of the off-peak window containing ``now``, or None outside it."""
+        local = datetime.fromtimestamp(now, JST)
+        if local.hour not in self.hours:
+            return None
+        if len(self.hours) == 24:
+            return local.strftime("%Y-%m-%d")
+        # 日付をまたぐ時間帯は開始時刻で数える
+        start = local
+        while (start - timedelta(hours=1)).hour in self.hours:
+            start -= timedelta(hours=1)
+        return start.strftime("%Y-%m-%d %H:00")
+
+    def period(self, key: str) -> float:
+        return self.max_age * (1.0 - self.jitter * _key_fraction(key))
+
+    def is_due(self, entry: dict, now: float) -> bool:
+        attempted = entry.get("attemptedAt")
+        if attempted is not None and now - attempted < self.retry_seconds:
+            return False
+        fetched = entry.get("fetchedAt")
+        return fetched is None or now - fetched >= self.period(entry["key"])
+
+    async def tick(self, now: Optional[float] = None) -> str:
+        """Refresh at most one filter set; returns what happened."""
+        now = time.time() if now is None else now
+        window = self._window_id(now)
+        if window is None:
+            return "off_hours"
+        if window != self._window:
+            self._window = window
+            self.budget_used = 0
+        if self._is_busy is not None and self._is_busy():
+            return "busy"
+        due = [entry for entry in self.popularity.top(self.top_n, self.min_requests, now) if self.is_due(entry, now)]
+        if not due:
+            return "idle"
+        if self.budget_used + max(self.calls_per_refresh, 1.0) > self.budget_calls:
+            self.runs["budget"] += 1
+            REFRESH_RUNS.inc(result="budget")
+            return "budget"
+
+        entry = due[0]
+        self.popularity.mark_attempted(entry["key"], now)
+        started = time.perf_counter()
+        result = "refreshed"
+        count = 0
+        with track_usage() as usage:
+            try:
+                count = len(await self._refresh(dict(entry["filters"])))
+            except Exception as exc:  # noqa: BLE001
+                logger.warning(f"Background refresh of {entry['key']} failed: {exc}")
+                result = "failed"
+        calls = usage.total_calls
+        self.budget_used += calls
+        for upstream, upstream_calls in usage.calls.items():
+            REFRESH_UPSTREAM_CALLS.inc(upstream_calls, upstream=upstream)
+        if result == "refreshed":
+            self.calls_per_refresh = calls if self.calls_per_refresh == 0 else 0.8 * self.calls_per_refresh + 0.2 * calls
+        self.runs[result] += 1
+        REFRESH_RUNS.inc(result=result)
+        self.last_run = {
+            "filters": entry["filters"],
+            "result": result,
+            "results": count,
+            "upstreamCalls": calls,
+            "seconds": round(time.perf_counter() - started, 3),
+            "at": now,
+        }
+        logger.info(f"Background refresh {result}: {entry['key']} ({count} results, {calls} upstream calls)")
+        return result
+
+    def coverage(self, now: Optional[float] = None) -> dict:
+        """How much of the top-N demand has results younger than ``max_age``."""
+        now = time.time() if now is None else now
+        top = self.popularity.top(self.top_n, self.min_requests, now)
+        fresh = [entry for entry in top if entry["fetchedAt"] is not None and now - entry["fetchedAt"] < self.max_age]
+        demand = sum(entry["score"] for entry in top)
+        return {
+            "tracked": len(self.popularity),
+            "top": len(top),
+            "fresh": len(fresh),
+            "demandShare": round(sum(entry["score"] for entry in fresh) / demand, 4) if demand else 0.0,
+        }
+
+    def snapshot(self, now: Optional[float] = None) -> dict:
+        now = time.time() if now is None else now
+        return {
+            "running": self.running,
+            "hours": sorted(self.hours),
+            "inWindow": self._window_id(now) is not None,
+            "runs": dict(self.runs),
+            "budget": {
+                "window": self._window,
+                "limit": self.budget_calls,
+                "used": self.budget_used,
+                "callsPerRefresh": round(self.calls_per_refresh, 2),
+            },
+            "coverage": self.coverage(now),
+            "lastRun": self.last_run,
+            "top": [
+                {
+                    "filters": entry["filters"],
+                    "requests": entry["requests"],
+                    "score": round(entry["score"], 3),
+                    "fetchedAt": entry["fetchedAt"],
+                    "due": self.is_due(entry, now),
+                }
+                for entry in self.popularity.top(self.top_n, self.min_requests, now)
+            ],
+        }
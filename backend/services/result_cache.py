@@ -0,0 +1,124 @@
+"""
+Search Result Cache
+In-memory TTL/LRU caches of finished search results keyed by the filter set and of per-university filter verdicts
+"""
+
+import hashlib
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(filters: Dict[str, str]) -> str:
+    """Canonical key for a filter set: empty values are dropped and keys are sorted."""
+    cleaned = {key: value.strip() for key, value in filters.items() if isinstance(value, str) and value.strip()}
+    return json.dumps(cleaned, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+class SearchResultCache:
+    """
+    Keep up to ``max_entries`` search results for ``ttl_seconds`` each. ``jitter`` shortens each
+    entry's TTL by a random fraction up to that share so entries filled together do not expire together.
+    """
+
+    def __init__(self, ttl_seconds: float = 1800.0, max_entries: int = 256, jitter: float = 0.0) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self._entries: "OrderedDict[str, Tuple[float, List[dict]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: str) -> Optional[List[dict]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, universities = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        return universities
+
+    def contains(self, filters: Dict[str, str]) -> bool:
+        """Check for a fresh entry without touching hit/miss counters or LRU order."""
+        if self.ttl_seconds <= 0:
+            return False
+        return self._lookup(make_cache_key(filters)) is not None
+
+    def get(self, filters: Dict[str, str]) -> Optional[List[dict]]:
+        if self.ttl_seconds <= 0:
+            return None
+        key = make_cache_key(filters)
+        universities = self._lookup(key)
+        if universities is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return [dict(university) for university in universities]
+
+    def set(self, filters: Dict[str, str], universities: List[dict]) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        key = make_cache_key(filters)
+        ttl = self.ttl_seconds * (1.0 - self.jitter * random.random())
+        self._entries[key] = (time.monotonic() + ttl, [dict(university) for university in universities])
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class VerdictCache:
+    """
+    Remember the LLM's ``matches`` verdict for a (university, filter set) pair so the same
+    entity is not re-verified by every search that finds it. Keys come from ``verdict_key``.
+    """
+
+    def __init__(self, ttl_seconds: float = 1800.0, max_entries: int = 4096) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, bool]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bool]:
+        if self.ttl_seconds <= 0:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, matches = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return matches
+
+    def set(self, key: str, matches: bool) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, matches)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def verdict_key(university_info: str, filters: Dict[str, str]) -> str:
+    """Hash of the university details shown to the verifier and the canonical filter set."""
+    payload = f"{university_info}\x1f{make_cache_key(filters)}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,436 @@
+"""
+Exam Schedule Parsing
+Turns free-text Japanese exam dates into typed calendar events and answers schedule filters locally
+through an interval index
+"""
+
+import calendar
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from services.metrics import registry
+
+# data/schedules.json と同じく、日付は日本時間の0時をUTCで表す
+JST = timezone(timedelta(hours=9))
+
+# フロントエンドの ScheduleEventType と同じ種別
+EVENT_TYPES = ("exam", "application_deadline", "announcement", "orientation", "interview", "other")
+# カレンダーに登録するときのタイトル（AddScheduleDialog と同じ表記）
+EVENT_TITLES = {
+    "application_deadline": "願書締切",
+    "exam": "入試試験",
+    "announcement": "合格発表",
+    "orientation": "入学説明会",
+    "interview": "面接",
+}
+
+# ラベル → 種別（先に一致したものを使う。AddScheduleDialog / lib/dal/schedule.ts の判定に合わせる）
+_LABEL_TYPES = (
+    (("願書", "締切", "受付", "出願"), "application_deadline"),
+    (("面接",), "interview"),
+    (("発表", "合格"), "announcement"),
+    (("説明会", "オリエンテーション"), "orientation"),
+    (("試験", "入試", "実施"), "exam"),
+)
+
+_ERAS = {"令和": 2018, "平成": 1988}
+
+# 年は西暦・和暦（令和7年、令和元年）、区切りは「年月日」または "/" "." "-"
+_DATE_RE = re.compile(
+    r"(?:(?:(?P<era>令和|平成)\s*(?P<era_year>元|\d{1,2})|(?P<year>\d{4}))\s*年\s*)?"
+    r"(?:(?P<month>\d{1,2})\s*月\s*)?(?P<day>\d{1,2})\s*日"
+    r"|(?P<num_year>\d{4})\s*[/.\-]\s*(?P<num_month>\d{1,2})\s*[/.\-]\s*(?P<num_day>\d{1,2})(?!\d)"
+    r"|(?<![\d/])(?P<slash_month>\d{1,2})/(?P<slash_day>\d{1,2})(?![\d/])"
+)
+# 日付の後ろの曜日・時刻表記（「(水)」「17:00」など）
+_SUFFIX_RE = re.compile(r"\s*(?:\([^)]{0,8}\)\s*)?(?:\d{1,2}:\d{2}\s*)?(?:必着|消印有効)?")
+_RANGE_SEP_RE = re.compile(r"\s*(?:〜|~|-|–|—|ー|から)\s*$")
+# 「出願締切: 2025年1月15日」のラベル部分（時刻の ":" は含めない）
+_LABEL_RE = re.compile(r"\s*([^\d:]+?)\s*:\s*(.*)", re.S)
+_YEAR_HINT_RE = re.compile(r"(?:(令和|平成)\s*(元|\d{1,2})|(\d{4}))\s*[年/.\-]\s*(\d{1,2})")
+
+Interval = Tuple[int, int]
+
+SCHEDULE_FILTERED = registry.counter(
+    "uninavi_schedule_filtered_total",
+    "Universities excluded by the exam schedule filter without an LLM call",
+)
+
+
+def _normalize(text: str) -> str:
+    # 全角数字・全角記号を半角に（"～" は "~" になる）
+    return unicodedata.normalize("NFKC", text)
+
+
+def _year_of(era: Optional[str], era_year: Optional[str], year: Optional[str]) -> Optional[int]:
+    if era:
+        return _ERAS[era] + (1 if era_year == "元" else int(era_year))
+    return int(year) if year else None
+
+
+def _academic_year(year: int, month: int) -> int:
+    # 4月始まりの年度
+    return year if month >= 4 else year - 1
+
+
+def _year_for(month: int, academic_year: int) -> int:
+    return academic_year if month >= 4 else academic_year + 1
+
+
+@lru_cache(maxsize=8192)
+def _year_hint(text: str) -> Optional[int]:
+    match = _YEAR_HINT_RE.search(_normalize(text))
+    if match is None:
+        return None
+    year = _year_of(match.group(1), match.group(2), match.group(3))
+    return _academic_year(year, int(match.group(4)))
+
+
+def academic_year_hint(texts: Iterable[str]) -> Optional[int]:
+    """The academic year (April start) of the first fully dated text, used to date entries written without a year."""
+    for text in texts:
+        if text:
+            hint = _year_hint(text)
+            if hint is not None:
+                return hint
+    return None
+
+
+def _make_date(year: Optional[int], month: Optional[int], day: int) -> Optional[date]:
+    if year is None or month is None:
+        return None
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=8192)
+def parse_dates(text: str, academic_year: Optional[int] = None) -> Tuple[Tuple[date, date], ...]:
+    """
+    Dates and date ranges in ``text`` as ``(start, end)`` pairs (``start == end`` for single days).
+
+    Handles 年月日 and numeric forms, 令和/平成 eras, full-width digits and ranges such as
+    ``2025年2月1日〜2月3日`` or ``2月1日〜3日``, where the end inherits the missing year and month.
+    Dates without a year are placed in ``academic_year`` when given and skipped otherwise.
+    """
+    normalized = _normalize(text or "")
+    results: List[Tuple[date, date]] = []
+    previous: Optional[date] = None
+    previous_end = 0
+    for match in _DATE_RE.finditer(normalized):
+        if match.group("num_day"):
+            year, month, day = int(match.group("num_year")), int(match.group("num_month")), int(match.group("num_day"))
+        elif match.group("slash_day"):
+            year, month, day = None, int(match.group("slash_month")), int(match.group("slash_day"))
+        else:
+            year = _year_of(match.group("era"), match.group("era_year"), match.group("year"))
+            month = int(match.group("month")) if match.group("month") else None
+            day = int(match.group("day"))
+
+        gap = normalized[previous_end:match.start()]
+        is_range_end = previous is not None and bool(_RANGE_SEP_RE.match(_SUFFIX_RE.sub("", gap, count=1)))
+        if is_range_end:
+            # 範囲の終わりは、省略された年・月を始まりから引き継ぐ
+            if month is None:
+                month = previous.month
+            if year is None:
+                year = previous.year + (1 if month < previous.month else 0)
+        elif year is None and month is not None and academic_year is not None:
+            year = _year_for(month, academic_year)
+
+        parsed = _make_date(year, month, day)
+        previous_end = match.end()
+        if parsed is None:
+            previous = None
+            continue
+        if is_range_end and parsed >= previous:
+            results[-1] = (previous, parsed)
+            previous = None
+        else:
+            results.append((parsed, parsed))
+            previous = parsed
+    return tuple(results)
+
+
+def event_type(label: str) -> str:
+    """Map a schedule label such as ``出願締切`` or ``合格発表`` to a ScheduleEventType."""
+    for keywords, kind in _LABEL_TYPES:
+        if any(keyword in label for keyword in keywords):
+            return kind
+    return "other"
+
+
+@lru_cache(maxsize=4096)
+def to_iso(day: date) -> str:
+    """Midnight JST of ``day`` as a UTC ISO string, the format used by data/schedules.json."""
+    moment = datetime(day.year, day.month, day.day, tzinfo=JST).astimezone(timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _split_label(text: str) -> Tuple[str, str]:
+    normalized = _normalize(text)
+    match = _LABEL_RE.match(normalized)
+    return (match.group(1).strip(), match.group(2)) if match else ("", normalized)
+
+
+@lru_cache(maxsize=8192)
+def _schedule_item(text: str, academic_year: Optional[int]) -> Tuple[str, str, Tuple[Tuple[date, date], ...]]:
+    # 同じ日程の文字列は多くの学部・入試形態で繰り返されるため、解析結果を文字列単位で保持する
+    label, value = _split_label(text)
+    return event_type(label or value), label, parse_dates(value, academic_year)
+
+
+def extract_events(university: dict) -> List[dict]:
+    """
+    Calendar events for ``examSchedules``, ``applicationDeadline`` and ``examDate``, in the
+    ``title``/``date``/``type``/``description`` shape of data/schedules.json, sorted by date.
+    Ranges carry an ``endDate``; the same type and date is only listed once.
+    """
+    schedules = [text for text in university.get("examSchedules") or [] if isinstance(text, str)]
+    deadline = university.get("applicationDeadline") or ""
+    exam_date = university.get("examDate") or ""
+    academic_year = academic_year_hint([*schedules, deadline, exam_date])
+    prefix = " ".join(part for part in (university.get("name"), university.get("faculty")) if part)
+
+    # (説明, 単独の項目か)。単独の項目は examSchedules に含まれる日付なら追加しない
+    candidates: List[Tuple[str, bool]] = [(text, False) for text in schedules]
+    if deadline:
+        candidates.append((f"願書締切日: {deadline}", True))
+    if exam_date:
+        candidates.append((f"試験日: {exam_date}", True))
+
+    events: List[dict] = []
+    seen: List[Tuple[str, date, date]] = []
+    for description, single_field in candidates:
+        kind, label, dates = _schedule_item(description, academic_year)
+        for start, end in dates:
+            if single_field:
+                covered = any(other == kind and first <= start and end <= last for other, first, last in seen)
+            else:
+                covered = (kind, start, end) in seen
+            if covered:
+                continue
+            seen.append((kind, start, end))
+            title = EVENT_TITLES.get(kind) or label or "入試日程"
+            event = {
+                "title": f"{prefix} {title}".strip(),
+                "date": to_iso(start),
+                "type": kind,
+                "description": description,
+            }
+            if end != start:
+                event["endDate"] = to_iso(end)
+            events.append(event)
+    events.sort(key=lambda event: event["date"])
+    return events
+
+
+def event_interval(event: dict) -> Optional[Interval]:
+    """The event's days in JST as ``(first, last)`` date ordinals."""
+    try:
+        start = datetime.fromisoformat(event["date"].replace("Z", "+00:00"))
+        end = datetime.fromisoformat((event.get("endDate") or event["date"]).replace("Z", "+00:00"))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+    return start.astimezone(JST).date().toordinal(), end.astimezone(JST).date().toordinal()
+
+
+class ScheduleIndex:
+    """
+    Interval index of schedule events over a batch of universities.
+
+    Intervals are kept sorted by start; since no event is longer than ``max_length`` days,
+    an overlap query only scans the starts in ``[query_start - max_length, query_end]``.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, List[Tuple[int, int, int]]] = {}
+        self._starts: Dict[str, List[int]] = {}
+        self._max_length: Dict[str, int] = {}
+        self._owners: Dict[str, Set[int]] = {}
+        self._dirty = False
+
+    def add(self, owner: int, events: Iterable[dict]) -> None:
+        for event in events:
+            interval = event_interval(event)
+            if interval is None:
+                continue
+            kind = event.get("type", "other")
+            self._entries.setdefault(kind, []).append((interval[0], interval[1], owner))
+            self._owners.setdefault(kind, set()).add(owner)
+            self._max_length[kind] = max(self._max_length.get(kind, 0), interval[1] - interval[0])
+            self._dirty = True
+
+    def _build(self) -> None:
+        for kind, entries in self._entries.items():
+            entries.sort()
+            self._starts[kind] = [entry[0] for entry in entries]
+        self._dirty = False
+
+    def owners(self, kind: str) -> Set[int]:
+        """Owners with at least one event of ``kind``."""
+        return self._owners.get(kind, set())
+
+    def years(self) -> range:
+        """Calendar years covered by the indexed events."""
+        starts = [entries[0][0] for entries in self._entries.values() if entries]
+        ends = [max(entry[1] for entry in entries) for entries in self._entries.values() if entries]
+        if not starts:
+            return range(0)
+        return range(date.fromordinal(min(starts)).year, date.fromordinal(max(ends)).year + 1)
+
+    def overlapping(self, kind: str, start: int, end: int) -> Set[int]:
+        """Owners with an event of ``kind`` overlapping the ordinal interval ``[start, end]``."""
+        if self._dirty:
+            self._build()
+        entries = self._entries.get(kind)
+        if not entries:
+            return set()
+        starts = self._starts[kind]
+        low = bisect_left(starts, start - self._max_length[kind])
+        high = bisect_right(starts, end)
+        return {owner for first, last, owner in entries[low:high] if last >= start}
+
+
+# (開始月, 開始日, 終了月, 終了日) の毎年繰り返す期間
+RecurringWindow = Tuple[int, int, int, int]
+
+_FILTER_PART_SPLIT_RE = re.compile(r"\s+/\s+|\n|;|、")
+_MONTH_RE = re.compile(r"(\d{1,2})\s*月(?!\s*\d{1,2}\s*日)")
+_DAY_RANGE_RE = re.compile(r"(\d{1,2})\s*日?\s*(?:〜|~|-|から)\s*(\d{1,2})\s*日")
+_OPEN_END_RE = re.compile(r"(以降|以後|から)\s*$")
+_OPEN_START_RE = re.compile(r"(以前|まで|までに)\s*$")
+
+
+class ScheduleCondition:
+    """Date constraints on one event type; an event satisfies it when it overlaps any of the windows."""
+
+    def __init__(self) -> None:
+        self.months: List[int] = []
+        self.day_range: Optional[Tuple[int, int]] = None
+        self.intervals: List[Interval] = []
+        self.recurring: List[RecurringWindow] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.months or self.day_range or self.intervals or self.recurring)
+
+    def windows(self, years: Iterable[int]) -> List[Interval]:
+        windows = list(self.intervals)
+        recurring = list(self.recurring)
+        if self.months or self.day_range:
+            first_day, last_day = self.day_range or (1, 31)
+            for month in self.months or range(1, 13):
+                recurring.append((month, first_day, month, last_day))
+        for year in years:
+            for start_month, start_day, end_month, end_day in recurring:
+                end_year = year + (1 if end_month < start_month else 0)
+                start = _clamped(year, start_month, start_day)
+                end = _clamped(end_year, end_month, end_day)
+                if start is not None and end is not None and start <= end:
+                    windows.append((start, end))
+        return windows
+
+
+def _clamped(year: int, month: int, day: int) -> Optional[int]:
+    if not 1 <= month <= 12 or year < 1:
+        return None
+    last = calendar.monthrange(year, month)[1]
+    return date(year, month, max(1, min(day, last))).toordinal()
+
+
+class ScheduleFilter:
+    """
+    Parsed ``exam_schedule`` condition, e.g. ``実施月: 1月・2月 / 実施日: 1日〜15日`` from the search
+    form, ``2025年2月1日〜2月10日`` or a deadline window such as ``出願締切: 2025年1月20日以降``.
+    Each labelled part constrains the event type its label names (exam dates when unlabelled).
+    """
+
+    def __init__(self, conditions: Dict[str, ScheduleCondition]) -> None:
+        self.conditions = conditions
+
+    def judge(self, universities: List[dict]) -> List[Optional[bool]]:
+        """
+        Whether each university satisfies the filter: False when an event of a constrained type
+        falls outside the windows, True when every constrained type has an event and all of them
+        match, and None when some constrained type has no parsed event, so the dates cannot decide.
+        """
+        index = ScheduleIndex()
+        for position, university in enumerate(universities):
+            index.add(position, _filterable_events(university.get("scheduleEvents") or []))
+        years = index.years()
+
+        verdicts: List[Optional[bool]] = [True] * len(universities)
+        for kind, condition in self.conditions.items():
+            owners = index.owners(kind)
+            matched: Set[int] = set()
+            for start, end in condition.windows(years):
+                matched |= index.overlapping(kind, start, end)
+            for position in range(len(universities)):
+                if position not in owners:
+                    if verdicts[position] is True:
+                        verdicts[position] = None
+                elif position not in matched:
+                    verdicts[position] = False
+        return verdicts
+
+
+def _filterable_events(events: List[dict]) -> List[dict]:
+    # 「願書受付」も application_deadline になるため、締切の条件は最後の出願イベントの終了日だけで判定する
+    deadlines = [event for event in events if event.get("type") == "application_deadline"]
+    if len(deadlines) <= 1 and not any("endDate" in event for event in deadlines):
+        return events
+    others = [event for event in events if event.get("type") != "application_deadline"]
+    last = max(deadlines, key=lambda event: event.get("endDate") or event["date"])
+    return others + [{"type": "application_deadline", "date": last.get("endDate") or last["date"]}]
+
+
+def parse_schedule_filter(text: str) -> Optional[ScheduleFilter]:
+    """Parse an ``exam_schedule`` filter value; returns None when it contains no usable dates."""
+    conditions: Dict[str, ScheduleCondition] = {}
+    for part in _FILTER_PART_SPLIT_RE.split(_normalize(text or "")):
+        if not part.strip():
+            continue
+        label, value = _split_label(part)
+        kind = event_type(label) if label else event_type(value)
+        if kind == "other":
+            kind = "exam"
+        condition = conditions.setdefault(kind, ScheduleCondition())
+
+        dated = parse_dates(value)
+        if dated:
+            if len(dated) == 1 and dated[0][0] == dated[0][1]:
+                day = dated[0][0].toordinal()
+                if _OPEN_END_RE.search(value):
+                    condition.intervals.append((day, date.max.toordinal()))
+                    continue
+                if _OPEN_START_RE.search(value):
+                    condition.intervals.append((date.min.toordinal(), day))
+                    continue
+            condition.intervals.extend((start.toordinal(), end.toordinal()) for start, end in dated)
+            continue
+
+        # 年のない「2月1日〜2月10日」は毎年の期間として扱う
+        recurring = _recurring_windows(value)
+        if recurring:
+            condition.recurring.extend(recurring)
+            continue
+        day_range = _DAY_RANGE_RE.search(value)
+        if day_range:
+            condition.day_range = (int(day_range.group(1)), int(day_range.group(2)))
+        condition.months.extend(int(month) for month in _MONTH_RE.findall(value) if 1 <= int(month) <= 12)
+
+    conditions = {kind: condition for kind, condition in conditions.items() if condition}
+    return ScheduleFilter(conditions) if conditions else None
+
+
+def _recurring_windows(value: str) -> List[RecurringWindow]:
+    # 基準年度を仮に置いて解析し、月日だけを取り出す
+    windows = []
+    for start, end in parse_dates(value, academic_year=2000):
+        windows.append((start.month, start.day, end.month, end.day))
+    return windows
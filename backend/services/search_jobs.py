@@ -0,0 +1,130 @@
+"""
+Search Job Service
+Runs university searches as resumable background jobs with a replayable event log
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JobEvent = Tuple[int, str, dict]
+
+
+class SearchJob:
+    """
+    A single search run whose events are buffered for replay.
+
+    Event IDs are the 1-based position in the log, so a reconnecting client that
+    sends ``Last-Event-ID: n`` resumes from the ``n + 1``-th event.
+    """
+
+    def __init__(self, job_id: str) -> None:
+        self.id = job_id
+        self.status = "running"  # running | completed | failed
+        self.created_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._events: List[JobEvent] = []
+        self._condition = asyncio.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def event_count(self) -> int:
+        return len(self._events)
+
+    async def append(self, event: str, data: dict) -> None:
+        async with self._condition:
+            self._events.append((len(self._events) + 1, event, data))
+            self._condition.notify_all()
+
+    async def finish(self, status: str) -> None:
+        async with self._condition:
+            self.status = status
+            self.finished_at = time.monotonic()
+            self._condition.notify_all()
+
+    async def stream(self, last_event_id: int = 0) -> AsyncIterator[JobEvent]:
+        """Yield buffered events after ``last_event_id`` and follow new ones until the job ends."""
+        index = max(0, min(last_event_id, len(self._events)))
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: len(self._events) > index or self.finished)
+                pending = self._events[index:]
+                done = self.finished
+            for event in pending:
+                yield event
+            index += len(pending)
+            if done and index >= len(self._events):
+                return
+
+
+class SearchJobStore:
+    """In-memory registry of search jobs; finished jobs are kept for ``ttl_seconds``."""
+
+    def __init__(self, ttl_seconds: float = 600.0, max_jobs: int = 1000) -> None:
+        self._ttl_seconds = ttl_seconds
+        self._max_jobs = max_jobs
+        self._jobs: Dict[str, SearchJob] = {}
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def create(self, runner: Callable[[SearchJob], Awaitable[None]]) -> SearchJob:
+        """Register a new job and start ``runner`` in the background."""
+        self.purge_expired()
+        if len(self._jobs) >= self._max_jobs:
+            raise RuntimeError("Too many search jobs in progress")
+
+        job = SearchJob(uuid.uuid4().hex)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, runner))
+        logger.info(f"Search job {job.id} started")
+        return job
+
+    def get(self, job_id: str) -> Optional[SearchJob]:
+        self.purge_expired()
+        return self._jobs.get(job_id)
+
+    def purge_expired(self) -> None:
+        now = time.monotonic()
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self._ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if expired:
+            logger.debug(f"Purged {len(expired)} expired search jobs")
+
+    async def shutdown(self) -> None:
+        """Cancel jobs that are still running."""
+        tasks = [job.task for job in self._jobs.values() if job.task and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    @staticmethod
+    async def _run(job: SearchJob, runner: Callable[[SearchJob], Awaitable[None]]) -> None:
+        try:
+            await runner(job)
+        except asyncio.CancelledError:
+            await job.finish("failed")
+            raise
+        except Exception as exc:  # noqa: BLE001
+            logger.error(f"Search job {job.id} failed: {exc}")
+            await job.append("error", {"message": str(exc)})
+            await job.finish("failed")
+        else:
+            await job.finish("completed")
+            logger.info(f"Search job {job.id} completed with {job.event_count} events")
@@ -0,0 +1,41 @@
+"""
+Serialization helpers
+Fast JSON encoding for API responses and Server-Sent Events frames
+"""
+
+import json
+import os
+from typing import Any, Optional
+
+from fastapi.responses import Response
+
+try:  # orjson is optional; the stdlib encoder is used when it is not installed
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# FAST_JSON=0 で従来のpydantic検証付きレスポンスに戻す
+FAST_JSON_ENABLED = os.getenv("FAST_JSON", "1") != "0"
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps(data: Any) -> bytes:
+    """Encode ``data`` as compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def format_sse(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    """Build a complete, pre-encoded SSE frame."""
+    id_line = f"id: {event_id}\n".encode("ascii") if event_id is not None else b""
+    return b"%sevent: %s\ndata: %s\n\n" % (id_line, event.encode("utf-8"), dumps(data))
+
+
+class FastJSONResponse(Response):
+    """JSON response that encodes already-normalized content without re-validation."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
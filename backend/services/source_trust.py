@@ -0,0 +1,158 @@
+"""
+Source Trust
+One trust table for ranking search results, choosing between duplicate entries and picking the official URL,
+matched by hostname suffix through a reverse-label trie
+"""
+
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 追加・上書きする信頼度テーブル（JSON: {"example.ac.jp": {"score": 130, "official": true, "label": "..."}}）
+SOURCE_TRUST_FILE = os.getenv("SOURCE_TRUST_FILE", "")
+HOST_CACHE_SIZE = 4096
+URL_CACHE_SIZE = 16384
+
+# [scheme:]//[userinfo@]host[:port]... のホスト部分
+_HOST_RE = re.compile(r"(?:(?:[A-Za-z][A-Za-z0-9+.-]*:)?//)?(?:[^@/?#]*@)?([^:/?#]*)")
+
+
+@dataclass(frozen=True)
+class SourceTrust:
+    score: int
+    # 大学自身の公式サイトか（officialUrl の候補として優先する）
+    official: bool = False
+    label: str = ""
+
+
+UNKNOWN = SourceTrust(score=10, label="other")
+
+# ドメインは接尾辞で一致し、最も長く一致したものが使われる
+DEFAULT_TRUST_TABLE: Dict[str, SourceTrust] = {
+    "passnavi.obunsha.co.jp": SourceTrust(200, label="PassNavi"),
+    "passnavi.evidus.com": SourceTrust(200, label="PassNavi"),
+    "keinet.ne.jp": SourceTrust(180, label="Kei-Net"),
+    "dnc.ac.jp": SourceTrust(150, label="大学入試センター"),
+    "ac.jp": SourceTrust(120, official=True, label="university"),
+    "yozemi.ac.jp": SourceTrust(100, label="代々木ゼミナール"),
+    "manabi.benesse.ne.jp": SourceTrust(100, label="マナビジョン"),
+    "toshin.com": SourceTrust(100, label="東進"),
+}
+
+
+class _Node:
+    __slots__ = ("children", "trust")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_Node"] = {}
+        self.trust: Optional[SourceTrust] = None
+
+
+class TrustTable:
+    """
+    Hostname suffix → ``SourceTrust``. Domains are stored label by label from the TLD
+    (``jp → ac → u-tokyo``) so a lookup walks at most as many nodes as the host has labels.
+    Results are memoized per host.
+    """
+
+    def __init__(self, rules: Dict[str, SourceTrust], default: SourceTrust = UNKNOWN) -> None:
+        self.default = default
+        self._root = _Node()
+        self._cache: Dict[str, SourceTrust] = {}
+        # 同じURLは出典リストや検索結果に繰り返し現れるため、URL単位でも結果を保持する
+        self._url_cache: Dict[str, SourceTrust] = {}
+        for domain, trust in rules.items():
+            self.add(domain, trust)
+
+    def add(self, domain: str, trust: SourceTrust) -> None:
+        node = self._root
+        for label in reversed(domain.strip(".").lower().split(".")):
+            node = node.children.setdefault(label, _Node())
+        node.trust = trust
+        self._cache.clear()
+        self._url_cache.clear()
+
+    def lookup_host(self, host: str) -> SourceTrust:
+        cached = self._cache.get(host)
+        if cached is not None:
+            return cached
+        node = self._root
+        match = self.default
+        for label in reversed(host.split(".")):
+            node = node.children.get(label)
+            if node is None:
+                break
+            if node.trust is not None:
+                match = node.trust
+        if len(self._cache) >= HOST_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[host] = match
+        return match
+
+    def lookup(self, url: str) -> SourceTrust:
+        cached = self._url_cache.get(url)
+        if cached is not None:
+            return cached
+        trust = self.lookup_host(host_of(url))
+        if len(self._url_cache) >= URL_CACHE_SIZE:
+            self._url_cache.clear()
+        self._url_cache[url] = trust
+        return trust
+
+
+def host_of(url: str) -> str:
+    """Lowercase hostname of ``url`` (bare hosts and scheme-less URLs are accepted)."""
+    if not isinstance(url, str):
+        return ""
+    # 完全な正規化は不要なので、ホスト部分だけを切り出す
+    return _HOST_RE.match(url.strip()).group(1).rstrip(".").lower()
+
+
+def _load_rules(path: str) -> Dict[str, SourceTrust]:
+    rules = dict(DEFAULT_TRUST_TABLE)
+    if not path:
+        return rules
+    try:
+        with open(path, encoding="utf-8") as handle:
+            overrides = json.load(handle)
+        for domain, spec in overrides.items():
+            rules[domain] = SourceTrust(
+                score=int(spec.get("score", UNKNOWN.score)),
+                official=bool(spec.get("official", False)),
+                label=str(spec.get("label", domain)),
+            )
+    except (OSError, ValueError, AttributeError) as exc:
+        logger.error(f"Could not load source trust table from {path}: {exc}")
+    return rules
+
+
+trust_table = TrustTable(_load_rules(SOURCE_TRUST_FILE))
+
+
+def trust_score(url: str) -> int:
+    """Trust of a single source; higher is better."""
+    return trust_table.lookup(url).score if url else 0
+
+
+def sources_score(urls: Iterable[object]) -> int:
+    """Combined trust of an entry's sources, used to choose between duplicate entries."""
+    return sum(trust_table.lookup(url).score for url in urls or [] if isinstance(url, str))
+
+
+def official_rank(url: str) -> int:
+    """
+    Sort key for canonical officialUrl candidates (lower is better):
+    university domains, then admissions pages, then www hosts.
+    """
+    if trust_table.lookup(url).official:
+        return 0
+    if "admissions" in url:
+        return 1
+    if url.startswith(("https://www.", "http://www.")):
+        return 2
+    return 3
@@ -0,0 +1,104 @@
+"""
+Startup
+Readiness tracking for the warmup phase plus time-to-ready and first-request latency metrics
+"""
+
+import logging
+import time
+from typing import Dict, Optional
+
+from services.config import PROCESS_STARTED
+from services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# 初回リクエスト計測の対象外とするパス（ヘルスチェック・監視用）
+_PROBE_PATHS = ("/health", "/ready", "/metrics", "/debug")
+
+
+class StartupState:
+    """Warmup steps and their outcome; the service is ready once every step has finished."""
+
+    def __init__(self) -> None:
+        self.steps: Dict[str, Dict[str, object]] = {}
+        self.ready_at: Optional[float] = None
+        self.first_request_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    @property
+    def time_to_ready(self) -> Optional[float]:
+        return self.ready_at - PROCESS_STARTED if self.ready_at is not None else None
+
+    def step_started(self, name: str) -> None:
+        self.steps[name] = {"status": "running", "started": time.monotonic()}
+
+    def step_finished(self, name: str, status: str = "ok", detail: object = None) -> None:
+        step = self.steps.setdefault(name, {"started": time.monotonic()})
+        step["status"] = status
+        step["durationMs"] = round((time.monotonic() - step["started"]) * 1000, 1)
+        if detail is not None:
+            step["detail"] = detail
+
+    def mark_ready(self) -> None:
+        self.ready_at = time.monotonic()
+        logger.info(f"Service ready after {self.time_to_ready:.2f}s")
+
+    def record_first_request(self, seconds: float) -> None:
+        if self.first_request_seconds is None:
+            self.first_request_seconds = seconds
+            logger.info(f"First request answered in {seconds * 1000:.0f} ms")
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.ready,
+            "timeToReadySeconds": round(self.time_to_ready, 3) if self.time_to_ready is not None else None,
+            "firstRequestSeconds": self.first_request_seconds,
+            "steps": {
+                name: {key: value for key, value in step.items() if key != "started"}
+                for name, step in self.steps.items()
+            },
+        }
+
+
+startup_state = StartupState()
+
+registry.gauge(
+    "uninavi_time_to_ready_seconds",
+    "Seconds from process start until warmup finished",
+    callback=lambda: [({}, startup_state.time_to_ready)] if startup_state.time_to_ready is not None else [],
+)
+registry.gauge(
+    "uninavi_first_request_seconds",
+    "Latency until the response headers of the first non-probe request after startup",
+    callback=lambda: (
+        [({}, startup_state.first_request_seconds)] if startup_state.first_request_seconds is not None else []
+    ),
+)
+
+
+class FirstRequestTimer:
+    """Record how long the first real request after startup takes to start its response."""
+
+    def __init__(self, app, state: StartupState = startup_state) -> None:
+        self.app = app
+        self.state = state
+
+    async def __call__(self, scope, receive, send) -> None:
+        if (
+            scope["type"] != "http"
+            or self.state.first_request_seconds is not None
+            or scope.get("path", "").startswith(_PROBE_PATHS)
+        ):
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+
+        async def timed_send(message) -> None:
+            if message["type"] == "http.response.start":
+                self.state.record_first_request(time.perf_counter() - started)
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
@@ -0,0 +1,112 @@
+"""
+Streaming helpers
+Bounded event queue used by the Server-Sent Events endpoints
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from services.entities import entity_key
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingEventQueue:
+    """
+    Bounded FIFO queue for SSE events.
+
+    ``put`` waits while the queue is full so a slow client applies backpressure
+    to the search pipeline instead of growing memory without limit.
+    Pending ``progress`` events are coalesced per ``stage``: a newer progress
+    payload replaces the one still waiting in the queue and never blocks.
+    Once ``close`` is called, ``put`` drops events instead of waiting for a consumer.
+    """
+
+    def __init__(self, maxsize: int = 64) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be a positive integer")
+        self._maxsize = maxsize
+        self._items: Deque[List[Any]] = deque()
+        self._pending_progress: Dict[str, List[Any]] = {}
+        self._condition = asyncio.Condition()
+        self._closed = False
+        self.coalesced = 0
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    async def put(self, event_type: str, payload: dict) -> None:
+        async with self._condition:
+            if self._closed:
+                return
+            stage = payload.get("stage") if event_type == "progress" else None
+            if stage is not None:
+                pending = self._pending_progress.get(stage)
+                if pending is not None:
+                    # 未送信の同一ステージのイベントを最新の内容で置き換える
+                    pending[1] = payload
+                    self.coalesced += 1
+                    return
+
+            await self._condition.wait_for(lambda: self._closed or len(self._items) < self._maxsize)
+            if self._closed:
+                return
+            entry = [event_type, payload]
+            self._items.append(entry)
+            if stage is not None:
+                self._pending_progress[stage] = entry
+            self._condition.notify_all()
+
+    async def get(self) -> Tuple[str, dict]:
+        async with self._condition:
+            await self._condition.wait_for(lambda: bool(self._items))
+            entry = self._items.popleft()
+            if entry[0] == "progress":
+                stage = entry[1].get("stage")
+                if self._pending_progress.get(stage) is entry:
+                    del self._pending_progress[stage]
+            self._condition.notify_all()
+            return entry[0], entry[1]
+
+    async def close(self) -> None:
+        """Wake producers blocked on a full queue; the consumer is gone."""
+        async with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class UniversityRefTracker:
+    """
+    Assign short refs to streamed universities so final events can reference them.
+    Each entity keeps one ref; the tracker remembers the record last sent under it.
+    """
+
+    def __init__(self) -> None:
+        self._refs: Dict[Tuple[str, str, str], str] = {}
+        self._sent: Dict[str, dict] = {}
+        self._next = 0
+
+    def get(self, university: dict) -> Optional[str]:
+        return self._refs.get(entity_key(university))
+
+    def assign(self, university: dict) -> str:
+        """Ref of ``university``'s entity (a new one the first time), recording it as sent."""
+        key = entity_key(university)
+        ref = self._refs.get(key)
+        if ref is None:
+            self._next += 1
+            ref = self._refs[key] = str(self._next)
+        self._sent[ref] = dict(university)
+        return ref
+
+    def resolve(self, university: dict) -> Tuple[str, bool]:
+        """
+        Ref for a final result and whether its body must be sent: the entity was never streamed,
+        or dedup chose a different record than the one last sent under the ref.
+        """
+        ref = self.get(university)
+        if ref is not None and self._sent.get(ref) == university:
+            return ref, False
+        return self.assign(university), True
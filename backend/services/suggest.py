@@ -0,0 +1,193 @@
+"""
+Name Suggestions
+Autocomplete for university and faculty names over a prefix trie with per-node top-K lists
+and a character-bigram index for infix matches and typos
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from services.entities import ALIASES, canonical_value, normalize_text
+
+SUGGEST_LIMIT = 10
+# 各トライノードが保持する候補数（limit の上限）
+NODE_TOP_K = 20
+SUGGEST_CACHE_SIZE = 4096
+# バイグラムの一致度（Dice 係数）がこれ以上なら候補にする
+BIGRAM_MIN_SCORE = 0.4
+
+# 複数の大学を指す略称
+GROUP_ALIASES: Dict[str, List[str]] = {
+    "早慶": ["早稲田大学", "慶應義塾大学"],
+    "旧帝大": ["東京大学", "京都大学", "大阪大学", "東北大学", "名古屋大学", "九州大学", "北海道大学"],
+    "march": ["明治大学", "青山学院大学", "立教大学", "中央大学", "法政大学"],
+    "gmarch": ["学習院大学", "明治大学", "青山学院大学", "立教大学", "中央大学", "法政大学"],
+    "関関同立": ["関西大学", "関西学院大学", "同志社大学", "立命館大学"],
+    "日東駒専": ["日本大学", "東洋大学", "駒澤大学", "専修大学"],
+    "産近甲龍": ["京都産業大学", "近畿大学", "甲南大学", "龍谷大学"],
+}
+# 大学名と組み合わせて入力されることの多い学部名
+COMMON_FACULTIES = (
+    "工学部", "理学部", "理工学部", "医学部", "歯学部", "薬学部", "看護学部", "農学部", "獣医学部",
+    "法学部", "経済学部", "経営学部", "商学部", "文学部", "外国語学部", "国際学部", "教育学部",
+    "社会学部", "心理学部", "情報学部", "総合政策学部", "芸術学部", "体育学部", "人間科学部",
+)
+
+_KIND_ORDER = {"university": 0, "alias": 1, "faculty": 2}
+
+
+def _key(value: str) -> str:
+    return normalize_text(value).lower().replace(" ", "")
+
+
+def _bigrams(text: str) -> Set[str]:
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[index:index + 2] for index in range(len(text) - 1)}
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_Node"] = {}
+        # (順位キー, 候補番号) を順位順に NODE_TOP_K 件まで
+        self.top: List[Tuple[tuple, int]] = []
+
+
+class SuggestIndex:
+    """
+    Suggestions are stored once; every matchable form (the name itself and its aliases) is
+    inserted into the trie, and each node keeps its best ``NODE_TOP_K`` suggestions so a prefix
+    lookup costs one walk down the query. When prefixes give too few results, a bigram inverted
+    index supplies names containing the query or close to it.
+    """
+
+    def __init__(self) -> None:
+        self._root = _Node()
+        self._suggestions: List[dict] = []
+        self._ids: Dict[Tuple[str, str], int] = {}
+        # 候補ごとの照合用の表記とそのバイグラム
+        self._forms: List[List[Tuple[str, Set[str]]]] = []
+        self._bigrams: Dict[str, Set[int]] = {}
+        self._cache: "OrderedDict[Tuple[str, int], List[dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.seeded = False
+
+    def __len__(self) -> int:
+        return len(self._suggestions)
+
+    def add(self, text: str, kind: str, forms: Iterable[str] = (), targets: Optional[List[str]] = None) -> None:
+        """Add a suggestion matched by ``text`` and ``forms``; ``targets`` are the names it resolves to."""
+        text = normalize_text(text)
+        if not text:
+            return
+        with self._lock:
+            index = self._ids.get((kind, text))
+            if index is None:
+                index = len(self._suggestions)
+                self._ids[(kind, text)] = index
+                self._suggestions.append({"text": text, "kind": kind, "names": targets or [text]})
+                self._forms.append([])
+            rank = (_KIND_ORDER.get(kind, 9), len(text), text)
+            for form in (text, *forms):
+                key = _key(form)
+                if key and all(key != existing for existing, _ in self._forms[index]):
+                    bigrams = _bigrams(key)
+                    self._forms[index].append((key, bigrams))
+                    self._insert(key, rank, index)
+                    for bigram in bigrams:
+                        self._bigrams.setdefault(bigram, set()).add(index)
+            self._cache.clear()
+
+    def _insert(self, key: str, rank: tuple, index: int) -> None:
+        node = self._root
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+            top = node.top
+            if any(existing == index for _, existing in top):
+                continue
+            if len(top) < NODE_TOP_K or rank < top[-1][0]:
+                top.append((rank, index))
+                top.sort()
+                del top[NODE_TOP_K:]
+
+    def _prefix(self, key: str) -> List[int]:
+        node = self._root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [index for _, index in node.top]
+
+    def _similar(self, key: str, exclude: Set[int], limit: int) -> List[int]:
+        query = _bigrams(key)
+        candidates: Set[int] = set()
+        for bigram in query:
+            candidates.update(self._bigrams.get(bigram, ()))
+        scored = []
+        for index in candidates - exclude:
+            forms = self._forms[index]
+            # 別名を含む各表記のうち最も近いものの Dice 係数
+            score = max(2 * len(query & bigrams) / (len(query) + len(bigrams)) for _, bigrams in forms)
+            contains = any(key in form for form, _ in forms)
+            if contains or score >= BIGRAM_MIN_SCORE:
+                suggestion = self._suggestions[index]
+                scored.append((not contains, -score, _KIND_ORDER.get(suggestion["kind"], 9), len(suggestion["text"]), index))
+        scored.sort()
+        return [entry[-1] for entry in scored[:limit]]
+
+    def suggest(self, query: str, limit: int = SUGGEST_LIMIT) -> List[dict]:
+        """Up to ``limit`` suggestions: prefix matches first, then infix and near matches."""
+        key = _key(query)
+        if not key:
+            return []
+        limit = max(1, min(limit, NODE_TOP_K))
+        cache_key = (key, limit)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        indices = self._prefix(key)[:limit]
+        if len(indices) < limit:
+            indices += self._similar(key, set(indices), limit - len(indices))
+        results = [dict(self._suggestions[index]) for index in indices]
+
+        with self._lock:
+            self._cache[cache_key] = results
+            if len(self._cache) > SUGGEST_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return results
+
+    def add_universities(self, names: Iterable[str]) -> None:
+        """Add university names, matched by their aliases (東工大, 阪大, ...) as well."""
+        aliases: Dict[str, List[str]] = {}
+        for alias, canonical in ALIASES.get("name", {}).items():
+            aliases.setdefault(_key(canonical), []).append(alias)
+        for name in names:
+            canonical = canonical_value("name", name)
+            forms = list(aliases.get(_key(canonical), []))
+            if canonical != normalize_text(name):
+                # 旧称（東京工業大学など）も正式名称の表記として扱う
+                forms.append(name)
+            self.add(canonical, "university", forms)
+
+    def add_records(self, universities: Iterable[dict]) -> None:
+        """Add the university and faculty names of normalized search results."""
+        universities = list(universities)
+        self.add_universities(uni.get("name", "") for uni in universities)
+        for uni in universities:
+            if uni.get("faculty"):
+                self.add(uni["faculty"], "faculty")
+
+    def seed(self, universities: Iterable[str]) -> None:
+        self.add_universities(universities)
+        for faculty in COMMON_FACULTIES:
+            self.add(faculty, "faculty")
+        for alias, names in GROUP_ALIASES.items():
+            self.add(alias if not alias.isascii() else alias.upper(), "alias", targets=names)
+        self.seeded = True
+
+
+suggest_index = SuggestIndex()
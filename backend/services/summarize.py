@@ -10,14 +10,43 @@ import logging
 import time
 import asyncio
 import contextlib
+import re
+import sqlite3
 from textwrap import dedent
-from typing import Awaitable, Callable, Dict, Any, AsyncIterator, List, Optional
+from typing import Awaitable, Callable, Dict, Any, AsyncIterator, List, Optional, Set, Tuple
 import httpx
 
-from dotenv import load_dotenv # 👈 追加
-
-# 🚨 【修正】環境変数ロード
-load_dotenv() # 👈 追加: .envファイルから環境変数を読み込む
+from services.catalog import university_catalog
+from services.entities import canonical_value, entity_id, normalize_text, resolve_entities
+from services.http_client import upstream_client
+from services.logging_config import PAYLOAD
+from services.metrics import (
+    CACHE_REQUESTS,
+    MOCK_FALLBACKS,
+    STAGE_DURATION,
+    UPSTREAM_DURATION,
+    UPSTREAM_RETRIES,
+    record_llm_usage,
+)
+from services.prefetch import (
+    PREFETCH_BUDGET_CALLS,
+    PREFETCH_BUDGET_WINDOW_SECONDS,
+    PREFETCH_ENABLED,
+    PREFETCH_MAX_PER_SEARCH,
+    PREFETCH_NEIGHBOURS,
+    PREFETCH_QUEUE_SIZE,
+    SpeculativePrefetcher,
+)
+from services.processing import estimate_size, run_cpu
+from services.refresh import filter_popularity
+from services.result_cache import SearchResultCache, VerdictCache, verdict_key
+from services.schedules import SCHEDULE_FILTERED, extract_events, parse_schedule_filter
+from services.source_trust import official_rank, sources_score, trust_score
+from services.suggest import suggest_index
+from services.topk import TopKCollector
+from services.urls import URL_DUPLICATES, canonicalize_url, dedupe_urls, url_key
+from services.verdict_model import verdict_features, verdict_model
+from services.tracing import add_event, current_span, start_span, traced
 
 # ロギング設定
 logger = logging.getLogger(__name__)
@@ -32,8 +61,9 @@ def _debug_log(message: str) -> None:
 # 🚨 【修正箇所】Hugging Face Chat Completions API configuration
 # 📝 サンプルコードに合わせてURLとモデルを更新
 HF_API_KEY = os.getenv("HF_API_KEY", "")
-# Chat Completions APIのURL
-HUGGINGFACE_API_URL = "https://router.huggingface.co/v1/chat/completions"
+# Chat Completions APIのURL（ローカルのシミュレーターに向ける場合は HF_API_BASE_URL を変更）
+HF_API_BASE_URL = os.getenv("HF_API_BASE_URL", "https://router.huggingface.co/v1").rstrip("/")
+HUGGINGFACE_API_URL = f"{HF_API_BASE_URL}/chat/completions"
 # Chat Completions APIで利用可能な日本語に強いInstructモデル
 # 優先順位: 無料/低コストモデルを優先
 PREFERRED_MODELS = [
@@ -69,26 +99,30 @@ async def select_optimal_model() -> str:
         "temperature": 0.1,
     }
 
-    for model in PREFERRED_MODELS:
+    async def _probe(model: str) -> bool:
         try:
             logger.debug(f"Testing model: {model}")
-            test_payload["model"] = model
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with upstream_client() as client:
                 response = await client.post(
                     HUGGINGFACE_API_URL,
                     headers=headers,
-                    json=test_payload,
+                    json={**test_payload, "model": model},
+                    timeout=10.0,
                 )
                 if response.status_code == 200:
                     result = response.json()
-                    if 'choices' in result and result['choices']:
-                        logger.info(f"Selected optimal model: {model}")
-                        return model
-                else:
-                    logger.debug(f"Model {model} failed with status {response.status_code}")
+                    return bool('choices' in result and result['choices'])
+                logger.debug(f"Model {model} failed with status {response.status_code}")
         except Exception as e:
             logger.debug(f"Model {model} test failed: {str(e)}")
-            continue
+        return False
+
+    # 全候補を並列に試し、優先順位の最も高い利用可能なモデルを選ぶ
+    available = await asyncio.gather(*(_probe(model) for model in PREFERRED_MODELS))
+    for model, ok in zip(PREFERRED_MODELS, available):
+        if ok:
+            logger.info(f"Selected optimal model: {model}")
+            return model
 
     # Fallback to first model if all fail
     logger.warning("All models failed, using fallback")
@@ -96,16 +130,38 @@ async def select_optimal_model() -> str:
 
 # グローバル変数として選択されたモデルを保持
 SELECTED_MODEL = None
+# 起動時のバックグラウンド解決と最初のリクエストが同時にプローブしないようにする
+_model_lock = asyncio.Lock()
 
 async def initialize_model():
     global SELECTED_MODEL
     if SELECTED_MODEL is None:
-        SELECTED_MODEL = await select_optimal_model()
+        async with _model_lock:
+            if SELECTED_MODEL is None:
+                SELECTED_MODEL = await select_optimal_model()
     return SELECTED_MODEL
 
 # Tavily API (alternative: Serper.dev)
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY", "")
 SERPER_API_KEY = os.getenv("SERPER_API_KEY", "")
+TAVILY_API_URL = os.getenv("TAVILY_API_URL", "https://api.tavily.com/search")
+SERPER_API_URL = os.getenv("SERPER_API_URL", "https://google.serper.dev/search")
+
+# 検索結果キャッシュ（同一条件の再検索でパイプラインを省略）
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "1800"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "256"))
+# TTLをランダムに最大この割合だけ短くし、同時に作られたエントリの期限切れを分散する
+SEARCH_CACHE_TTL_JITTER = float(os.getenv("SEARCH_CACHE_TTL_JITTER", "0.1"))
+search_result_cache = SearchResultCache(
+    ttl_seconds=SEARCH_CACHE_TTL_SECONDS,
+    max_entries=SEARCH_CACHE_MAX_ENTRIES,
+    jitter=SEARCH_CACHE_TTL_JITTER,
+)
+
+# 大学ごとの条件判定（フィルタリング）結果のキャッシュ
+VERDICT_CACHE_TTL_SECONDS = float(os.getenv("VERDICT_CACHE_TTL_SECONDS", "1800"))
+VERDICT_CACHE_MAX_ENTRIES = int(os.getenv("VERDICT_CACHE_MAX_ENTRIES", "4096"))
+verdict_cache = VerdictCache(ttl_seconds=VERDICT_CACHE_TTL_SECONDS, max_entries=VERDICT_CACHE_MAX_ENTRIES)
 
 logger.info(f"Hugging Face Model ID: {HUGGINGFACE_MODEL_ID}")
 logger.info(f"Tavily API Key configured: {bool(TAVILY_API_KEY)}")
@@ -163,21 +219,6 @@ def _ensure_list_of_strings(value: Any) -> List[str]:
     return [string_value]
 
 
-def _format_url(url: str) -> str:
-    if not url:
-        return ""
-    cleaned = url.strip()
-    if not cleaned:
-        return ""
-    if cleaned.startswith("http://") or cleaned.startswith("https://"):
-        return cleaned
-    if cleaned.startswith("//"):
-        return f"https:{cleaned}"
-    if cleaned.startswith("www."):
-        return f"https://{cleaned}"
-    return f"https://{cleaned}"
-
-
 def _select_official_url(candidate: Any, sources: Any) -> str:
     candidates: List[str] = []
     candidate_str = _to_string(candidate)
@@ -187,20 +228,14 @@ def _select_official_url(candidate: Any, sources: Any) -> str:
     for source in _ensure_list_of_strings(sources):
         candidates.append(source)
 
-    seen: set[str] = set()
-    prioritized: List[str] = []
-    for value in candidates:
-        formatted = _format_url(value)
-        if not formatted or formatted in seen:
-            continue
-        seen.add(formatted)
-        prioritized.append(formatted)
+    # officialUrl は通常 sources にも含まれるため、ここでの重複は集計しない
+    prioritized = dedupe_urls(candidates, stage=None)
 
     if not prioritized:
         return ""
 
-    prioritized.sort(key=lambda url: (-100 if ".ac.jp" in url else -50 if "admissions" in url else -10 if url.startswith("https://www.") else 0))
-    return prioritized[0]
+    # min は同順位なら先頭の候補を返すため、安定ソートして先頭を取るのと同じ結果になる
+    return min(prioritized, key=official_rank)
 
 
 def _normalize_university_entry(entry: dict) -> dict:
@@ -212,7 +247,7 @@ def _normalize_university_entry(entry: dict) -> dict:
     entry.setdefault("subjectHighlights", [])
 
     entry["requiredSubjects"] = _ensure_list_of_strings(entry.get("requiredSubjects"))
-    entry["sources"] = _ensure_list_of_strings(entry.get("sources"))
+    entry["sources"] = dedupe_urls(_ensure_list_of_strings(entry.get("sources")))
     entry["examSchedules"] = _ensure_list_of_strings(entry.get("examSchedules"))
     entry["admissionMethods"] = _ensure_list_of_strings(entry.get("admissionMethods"))
     entry["subjectHighlights"] = _ensure_list_of_strings(entry.get("subjectHighlights"))
@@ -223,16 +258,115 @@ def _normalize_university_entry(entry: dict) -> dict:
     entry["applicationDeadline"] = _to_string(entry.get("applicationDeadline"))
     entry["examDate"] = _to_string(entry.get("examDate"))
     entry["aiSummary"] = _to_string(entry.get("aiSummary"))
-    entry["faculty"] = _to_string(entry.get("faculty"))
-    entry["department"] = _to_string(entry.get("department"))
-    entry["examType"] = _to_string(entry.get("examType"))
+    entry["faculty"] = canonical_value("faculty", entry.get("faculty"))
+    entry["department"] = normalize_text(entry.get("department"))
+    entry["examType"] = canonical_value("examType", entry.get("examType"))
     entry["deviationScore"] = _to_string(entry.get("deviationScore"))
     entry["commonTestScore"] = _to_string(entry.get("commonTestScore"))
-    entry["name"] = _to_string(entry.get("name"))
+    entry["name"] = canonical_value("name", entry.get("name"))
+    # LLMが振るIDは重複するため、大学・学部・入試形態から決まるIDに置き換える
+    entry["id"] = entity_id(entry)
+    # 日程の文字列から、カレンダー登録と日程条件の判定に使うイベントを作っておく
+    entry["scheduleEvents"] = extract_events(entry)
 
     return entry
 
 
+def _priority(u: str) -> int:
+    # PassNavi/Kei-Net > 大学入試センター > 公式（*.ac.jp）> 予備校 > その他（services/source_trust.py のテーブル）
+    return trust_score(u)
+
+
+def _dedupe_by_source(universities: List[dict]) -> List[dict]:
+    """Keep one entry per resolved (name, faculty, examType) entity, preferring the one with the most trusted sources."""
+    # max は同点なら先に現れたエントリを返す
+    return resolve_entities(universities, choose=lambda group: max(group, key=lambda uni: sources_score(uni.get("sources"))))
+
+
+_JSON_ARRAY_RE = re.compile(r'\[.*\]', re.DOTALL)
+
+# 要約プロンプトに含める検索結果の件数と1件あたりの本文の長さ
+SUMMARY_MAX_SOURCES = 25
+SUMMARY_SNIPPET_CHARS = 500
+
+
+def _extract_university_array(content: str) -> list:
+    """Pull the JSON array out of an LLM completion and parse it; runs off the event loop for large responses."""
+    start_idx = content.find('[')
+    end_idx = content.rfind(']') + 1
+
+    if start_idx == -1 or end_idx == 0:
+        # モデルによっては、JSONの前に説明文を追加することがあるため、柔軟に処理
+        logger.warning("Could not find JSON array in response. Attempting to clean...")
+        stripped = content.strip()
+        # もしJSONコードブロックとして返された場合（例: ```json[...]```）
+        if stripped.startswith('```') and stripped.endswith('```'):
+            content = stripped[stripped.find('\n')+1 : stripped.rfind('```')].strip()
+            start_idx = content.find('[')
+            end_idx = content.rfind(']') + 1
+            if start_idx != -1 and end_idx != 0:
+                json_str = content[start_idx:end_idx]
+            else:
+                # Try to find any JSON-like structure
+                json_match = _JSON_ARRAY_RE.search(content)
+                if not json_match:
+                    raise ValueError("Could not find JSON array in response even after code block cleaning")
+                json_str = json_match.group()
+        else:
+            # Try to find any JSON-like structure
+            json_match = _JSON_ARRAY_RE.search(content)
+            if not json_match:
+                raise ValueError("Could not find JSON array in response")
+            json_str = json_match.group()
+    else:
+        json_str = content[start_idx:end_idx]
+
+    logger.debug("Raw AI response: %s", json_str, extra=PAYLOAD)
+
+    universities = json.loads(json_str)
+    if not isinstance(universities, list):
+        universities = [universities]
+    return universities
+
+
+def _normalize_universities(raw_universities: List[dict]) -> List[dict]:
+    """Normalize every entry and make sure the official URL leads its sources."""
+    universities = [_normalize_university_entry(uni) for uni in raw_universities]
+    for uni in universities:
+        official = uni.get("officialUrl")
+        if official and url_key(official) not in {url_key(source) for source in uni["sources"]}:
+            uni["sources"].insert(0, official)
+    return universities
+
+
+def _result_url(result: dict) -> str:
+    return result.get("url") or result.get("link") or ""
+
+
+def _result_key(result: dict) -> str:
+    return url_key(_result_url(result))
+
+
+def _result_priority(result: dict) -> int:
+    return _priority(_result_url(result))
+
+
+def _compact_result(result: dict) -> dict:
+    """Keep only the fields and snippet length the summarization prompt uses."""
+    return {
+        "title": result.get("title", "No title"),
+        "url": canonicalize_url(_result_url(result)),
+        "content": (result.get("content") or "No content")[:SUMMARY_SNIPPET_CHARS],
+    }
+
+
+def _dedupe_and_sort(universities: List[dict]) -> List[dict]:
+    """Deduplicate by (name, faculty, examType) and sort by the same key."""
+    universities = _dedupe_by_source(universities)
+    universities.sort(key=lambda x: ((x.get("name") or ""), (x.get("faculty") or ""), (x.get("examType") or "")))
+    return universities
+
+
 # 🚨 【修正箇所】Hugging Face Chat Completions APIのクエリ関数
 async def query_hf_inference(messages: List[Dict[str, str]], max_retries: int = 3, initial_delay: float = 1.0) -> Dict[str, Any]:
     """
@@ -247,50 +381,71 @@ async def query_hf_inference(messages: List[Dict[str, str]], max_retries: int =
     }
     
     # 🚨 【修正箇所】ペイロードを Chat Completions API 形式に変更
+    model = SELECTED_MODEL or HUGGINGFACE_MODEL_ID or PREFERRED_MODELS[0]
     payload = {
         "messages": messages, # 'messages' 形式の入力をそのまま使用
-        "model": SELECTED_MODEL or HUGGINGFACE_MODEL_ID or PREFERRED_MODELS[0],
+        "model": model,
         "temperature": 0.2, # 構造化されたJSON出力を得るため、温度を低めに設定
         "max_tokens": 2000, # 返却件数を増やすため少し拡大
         "top_p": 0.9,
     }
+    upstream = f"hf:{model}"
     
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        delay = initial_delay
-        for attempt in range(max_retries):
-            try:
-                response = await client.post(
-                    HUGGINGFACE_API_URL,
-                    headers=headers,
-                    json=payload,
-                )
+    prompt_chars = sum(len(message.get("content", "")) for message in messages)
+    with start_span("hf.chat_completion", model=model, promptChars=prompt_chars) as span:
+        async with upstream_client() as client:
+            delay = initial_delay
+            received_bytes = 0
+            for attempt in range(max_retries):
+                if attempt > 0:
+                    UPSTREAM_RETRIES.inc(upstream=upstream)
+                started = time.perf_counter()
+                status = "error"
+                # 待機は所要時間の計測を終えてから行う
+                backoff: Optional[float] = None
+                span.set_attribute("retries", attempt)
+                try:
+                    response = await client.post(
+                        HUGGINGFACE_API_URL,
+                        headers=headers,
+                        json=payload,
+                        timeout=120.0,
+                    )
+                    status = str(response.status_code)
+                    received_bytes += len(response.content)
+                    span.set_attribute("bytes", received_bytes)
+
+                    if response.status_code == 200:
+                        result = response.json()
+                        # 応答形式は {"choices": [{"message": {"role": "...", "content": "..."}}]}
+                        if 'choices' in result and result['choices'] and 'message' in result['choices'][0]:
+                            record_llm_usage(model, result)
+                            span.set_attribute("usage", result.get("usage"))
+                            # 形式はそのまま返却 (summarize_with_aiで利用するため)
+                            return result
+                        else:
+                            raise ValueError(f"Unexpected HF response format: {result}")
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    # 応答形式は {"choices": [{"message": {"role": "...", "content": "..."}}]}
-                    if 'choices' in result and result['choices'] and 'message' in result['choices'][0]:
-                        # 形式はそのまま返却 (summarize_with_aiで利用するため)
-                        return result
+                    elif response.status_code == 429 or response.status_code >= 500: # Rate limited or server error
+                        backoff = float(response.headers.get("Retry-After", delay * 2))
+                        logger.warning(f"Rate limited/Server error. Retrying after {backoff:.2f} seconds...")
+                    
                     else:
-                        raise ValueError(f"Unexpected HF response format: {result}")
-                
-                elif response.status_code == 429 or response.status_code >= 500: # Rate limited or server error
-                    retry_after = float(response.headers.get("Retry-After", delay * 2))
-                    logger.warning(f"Rate limited/Server error. Retrying after {retry_after:.2f} seconds...")
-                    await asyncio.sleep(retry_after)
+                        logger.error(f"HF Chat API error: {response.status_code} - {response.text}")
+                        response.raise_for_status() # 4xxエラーは即座に例外を発生させる
+
+                except Exception as e:
+                    logger.error(f"Error querying HF Chat API: {str(e)}")
+                    if attempt == max_retries - 1:
+                        raise
+                    backoff = delay
+                finally:
+                    UPSTREAM_DURATION.observe(time.perf_counter() - started, upstream=upstream, status=status)
+                    span.set_attribute("status", status)
+                if backoff is not None:
+                    await asyncio.sleep(backoff)
                     delay *= 2
-                    
-                else:
-                    logger.error(f"HF Chat API error: {response.status_code} - {response.text}")
-                    response.raise_for_status() # 4xxエラーは即座に例外を発生させる
 
-            except Exception as e:
-                logger.error(f"Error querying HF Chat API: {str(e)}")
-                if attempt == max_retries - 1:
-                    raise
-                await asyncio.sleep(delay)
-                delay *= 2
-    
     raise Exception("Failed to get response from HF Chat API after multiple retries")
 
 
@@ -309,50 +464,70 @@ async def search_web(query: str) -> List[dict]:
         if not TAVILY_API_KEY:
             return []
         logger.debug("Attempting Tavily search...")
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as http_client:
-                response = await http_client.post(
-                    "https://api.tavily.com/search",
-                    json={"api_key": TAVILY_API_KEY, "query": query, "max_results": 20},
-                )
-            if response.status_code == 200:
-                data = response.json()
-                results = data.get("results", [])
-                logger.info(f"Tavily search successful, found {len(results)} results")
-                _debug_log(f"[search_web] Tavily returned {len(results)} results")
-                return results
-            logger.warning(f"Tavily search returned status {response.status_code}: {response.text}")
-        except Exception as exc:  # noqa: BLE001
-            logger.error(f"Tavily search failed: {exc}")
+        started = time.perf_counter()
+        status = "error"
+        with start_span("tavily.search", query=query) as span:
+            try:
+                async with upstream_client() as http_client:
+                    response = await http_client.post(
+                        TAVILY_API_URL,
+                        json={"api_key": TAVILY_API_KEY, "query": query, "max_results": 20},
+                        timeout=30.0,
+                    )
+                status = str(response.status_code)
+                span.set_attribute("bytes", len(response.content))
+                if response.status_code == 200:
+                    data = response.json()
+                    results = data.get("results", [])
+                    logger.info(f"Tavily search successful, found {len(results)} results")
+                    _debug_log(f"[search_web] Tavily returned {len(results)} results")
+                    span.set_attribute("results", len(results))
+                    return results
+                logger.warning(f"Tavily search returned status {response.status_code}: {response.text}")
+            except Exception as exc:  # noqa: BLE001
+                logger.error(f"Tavily search failed: {exc}")
+            finally:
+                UPSTREAM_DURATION.observe(time.perf_counter() - started, upstream="tavily", status=status)
+                span.set_attribute("status", status)
         return []
 
     async def _search_serper() -> List[dict]:
         if not SERPER_API_KEY:
             return []
         logger.debug("Attempting Serper search...")
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as http_client:
-                response = await http_client.post(
-                    "https://google.serper.dev/search",
-                    json={"q": query, "num": 20},
-                    headers={"X-API-KEY": SERPER_API_KEY},
-                )
-            if response.status_code == 200:
-                data = response.json()
-                organic = data.get("organic", [])
-                logger.info(f"Serper search successful, found {len(organic)} results")
-                _debug_log(f"[search_web] Serper returned {len(organic)} results")
-                return [
-                    {
-                        "title": item.get("title", ""),
-                        "url": item.get("link", ""),
-                        "content": item.get("snippet", ""),
-                    }
-                    for item in organic
-                ]
-            logger.warning(f"Serper search returned status {response.status_code}: {response.text}")
-        except Exception as exc:  # noqa: BLE001
-            logger.error(f"Serper search failed: {exc}")
+        started = time.perf_counter()
+        status = "error"
+        with start_span("serper.search", query=query) as span:
+            try:
+                async with upstream_client() as http_client:
+                    response = await http_client.post(
+                        SERPER_API_URL,
+                        json={"q": query, "num": 20},
+                        headers={"X-API-KEY": SERPER_API_KEY},
+                        timeout=30.0,
+                    )
+                status = str(response.status_code)
+                span.set_attribute("bytes", len(response.content))
+                if response.status_code == 200:
+                    data = response.json()
+                    organic = data.get("organic", [])
+                    logger.info(f"Serper search successful, found {len(organic)} results")
+                    _debug_log(f"[search_web] Serper returned {len(organic)} results")
+                    span.set_attribute("results", len(organic))
+                    return [
+                        {
+                            "title": item.get("title", ""),
+                            "url": item.get("link", ""),
+                            "content": item.get("snippet", ""),
+                        }
+                        for item in organic
+                    ]
+                logger.warning(f"Serper search returned status {response.status_code}: {response.text}")
+            except Exception as exc:  # noqa: BLE001
+                logger.error(f"Serper search failed: {exc}")
+            finally:
+                UPSTREAM_DURATION.observe(time.perf_counter() - started, upstream="serper", status=status)
+                span.set_attribute("status", status)
         return []
 
     tasks: List[tuple[str, asyncio.Task[List[dict]]]] = []
@@ -375,12 +550,19 @@ async def search_web(query: str) -> List[dict]:
 
     merged_results: List[dict] = []
     seen_urls: set[str] = set()
+    duplicates = 0
     for label in ("tavily", "serper"):
         for item in results_by_priority.get(label, []):
-            url = item.get("url") or item.get("link") or ""
-            if url and url not in seen_urls:
-                merged_results.append(item)
-                seen_urls.add(url)
+            key = _result_key(item)
+            if not key:
+                continue
+            if key in seen_urls:
+                duplicates += 1
+                continue
+            merged_results.append(item)
+            seen_urls.add(key)
+    if duplicates:
+        URL_DUPLICATES.inc(duplicates, stage="provider_merge")
 
     if merged_results:
         logger.info(f"Search aggregation complete. Returning {len(merged_results)} merged results")
@@ -398,20 +580,60 @@ async def filter_universities_by_conditions(
     filters: Dict[str, str],
     progress_callback: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
     university_callback: Optional[Callable[[dict], Awaitable[None]]] = None,
+    verified: Optional[Set[str]] = None,
 ) -> List[dict]:
     """
-    Filter universities based on search conditions using AI verification
+    Filter universities based on search conditions using AI verification.
+    IDs of entries that were actually judged to match are added to ``verified``; entries kept
+    without a verdict (no API key, failed calls, model predictions) are not.
     """
-    if not HF_API_KEY:
-        logger.warning("No Hugging Face API key configured for filtering")
-        return universities
+
+    def _mark_verified(university: dict) -> None:
+        if verified is not None and university.get("id"):
+            verified.add(university["id"])
 
     if not universities:
         return universities
 
+    # (大学, LLMに渡す条件)。入試日程の条件は解析済みの日程からローカルに判定し、
+    # 条件の種別の日程が見つからず判定できない大学だけ入試日程もLLMで確認する
+    pending: List[Tuple[dict, Dict[str, str]]] = [(uni, filters) for uni in universities]
+    accepted: List[dict] = []
+    schedule_filter = parse_schedule_filter(filters.get("exam_schedule", ""))
+    if schedule_filter is not None:
+        verdicts = schedule_filter.judge(universities)
+        SCHEDULE_FILTERED.inc(verdicts.count(False))
+        remaining = {**filters, "exam_schedule": ""}
+        pending = []
+        for uni, verdict in zip(universities, verdicts):
+            if verdict is None:
+                pending.append((uni, filters))
+            elif verdict and any(remaining.values()):
+                pending.append((uni, remaining))
+            elif verdict:
+                # 残りの条件がなければLLMでの確認は不要
+                accepted.append(uni)
+                _mark_verified(uni)
+        logger.info(
+            f"Schedule filter rejected {verdicts.count(False)} of {len(verdicts)} universities, "
+            f"{verdicts.count(None)} undetermined"
+        )
+        if university_callback is not None:
+            for uni in accepted:
+                await university_callback(uni)
+        if not pending:
+            return accepted
+
+    if not HF_API_KEY:
+        logger.warning("No Hugging Face API key configured for filtering")
+        return accepted + [uni for uni, _ in pending]
+
+    universities = [uni for uni, _ in pending]
+
     logger.info(f"Filtering {len(universities)} universities with AI verification")
 
     async def _emit_progress(stage: str, detail: Optional[Dict[str, Any]] = None) -> None:
+        add_event(stage, detail)
         if progress_callback is None:
             return
         payload = {"stage": stage}
@@ -424,7 +646,7 @@ async def filter_universities_by_conditions(
     # Parallel filtering of universities
     semaphore = asyncio.Semaphore(5)  # Limit concurrent AI calls to avoid rate limits
 
-    async def _filter_single_university(university: dict) -> Optional[dict]:
+    async def _filter_single_university(university: dict, filters: Dict[str, str]) -> Optional[dict]:
         async with semaphore:
             # Build verification prompt
             system_prompt = """あなたは日本の大学受験アドバイザーです。
@@ -441,6 +663,7 @@ async def filter_universities_by_conditions(
 必要科目: {', '.join(university.get('requiredSubjects', []))}
 地域: {university.get('region', '')}
 都道府県: {university.get('prefecture', '')}
+入試日程: {', '.join(str(text) for text in university.get('examSchedules') or [])}
 """
 
             search_conditions = f"""
@@ -476,8 +699,25 @@ async def filter_universities_by_conditions(
                 {"role": "user", "content": user_prompt}
             ]
 
+            # 正規化済みの同じ大学情報と条件の組み合わせは、LLMに問い合わせず前回の判定を使う
+            cache_key = verdict_key(university_info, filters)
+            cached_verdict = verdict_cache.get(cache_key)
+            CACHE_REQUESTS.inc(cache="verdict", result="miss" if cached_verdict is None else "hit")
+            if cached_verdict is not None:
+                if cached_verdict:
+                    _mark_verified(university)
+                return university if cached_verdict else None
+
+            # 過去のLLMの判定で学習したモデルが確信を持てる場合はLLMを呼ばない
+            features = verdict_features(university, filters)
+            predicted, probability = verdict_model.decide(features)
+            if predicted is not None:
+                # 予測はLLMの判定ではないため、判定キャッシュには入れない
+                return university if predicted else None
+
             try:
-                response_data = await query_hf_inference(messages, max_retries=2, initial_delay=0.5)
+                with start_span("filter_university", university=university.get("name", ""), faculty=university.get("faculty", "")):
+                    response_data = await query_hf_inference(messages, max_retries=2, initial_delay=0.5)
 
                 if not response_data or not response_data.get('choices'):
                     logger.warning(f"Invalid AI response for university {university.get('name', '')}")
@@ -500,8 +740,11 @@ async def filter_universities_by_conditions(
                 reason = result.get('reason', '')
 
                 logger.debug(f"Filtering result for {university.get('name', '')}: matches={matches}, reason={reason}")
+                verdict_cache.set(cache_key, bool(matches))
+                verdict_model.record(features, bool(matches), probability, str(reason))
 
                 if matches:
+                    _mark_verified(university)
                     return university
                 return None
 
@@ -511,10 +754,10 @@ async def filter_universities_by_conditions(
                 return university
 
     # Execute filtering in parallel and emit results as they complete
-    filtering_tasks = [_filter_single_university(uni) for uni in universities]
+    filtering_tasks = [_filter_single_university(uni, uni_filters) for uni, uni_filters in pending]
     
     # Process results as they complete for streaming
-    filtered_universities = []
+    filtered_universities = list(accepted)
     completed_count = 0
     
     for coro in asyncio.as_completed(filtering_tasks):
@@ -538,21 +781,23 @@ async def filter_universities_by_conditions(
             completed_count += 1
             # On exception, we can't determine which university, so skip progress update
 
+    verdict_model.maybe_train()
     return filtered_universities
 
-async def summarize_with_ai(search_results: List[dict], query: str):
+async def summarize_with_ai(search_results: List[dict], query: str, fallback: bool = True):
     """
     Use Hugging Face model to summarize search results into structured university data
+    Falls back to mock data on failure unless ``fallback`` is False, in which case the error is raised
     """
     
     # Format search results as text
     results_text = ""
-    for i, result in enumerate(search_results[:25], 1):  # Use up to first 25 results for broader coverage
+    for i, result in enumerate(search_results[:SUMMARY_MAX_SOURCES], 1):  # Use up to first 25 results for broader coverage
         title = result.get("title", "No title")
         url = result.get("url", "No URL")
         content = result.get("content", "No content")
         # 500文字制限
-        results_text += f"Result {i}:\nTitle: {title}\nURL: {url}\nContent: {content[:500]}...\n\n" 
+        results_text += f"Result {i}:\nTitle: {title}\nURL: {url}\nContent: {content[:SUMMARY_SNIPPET_CHARS]}...\n\n" 
 
     _debug_log(f"[summarize_with_ai] results_text length={len(results_text)} characters")
 
@@ -621,47 +866,8 @@ async def summarize_with_ai(search_results: List[dict], query: str):
             
         content = response_data['choices'][0]['message']['content']
         
-        # Clean up the response - extract just the JSON part
-        start_idx = content.find('[')
-        end_idx = content.rfind(']') + 1
-        
-        # ... (JSONパースロジックは変更なし)
-        if start_idx == -1 or end_idx == 0:
-            # モデルによっては、JSONの前に説明文を追加することがあるため、柔軟に処理
-            logger.warning("Could not find JSON array in response. Attempting to clean...")
-            # もしJSONコードブロックとして返された場合（例: ```json[...]```）
-            if content.strip().startswith('```') and content.strip().endswith('```'):
-                content = content.strip()[content.strip().find('\n')+1 : content.strip().rfind('```')].strip()
-                start_idx = content.find('[')
-                end_idx = content.rfind(']') + 1
-                if start_idx != -1 and end_idx != 0:
-                    json_str = content[start_idx:end_idx]
-                else:
-                    # Try to find any JSON-like structure
-                    import re
-                    json_match = re.search(r'\[.*\]', content, re.DOTALL)
-                    if json_match:
-                        json_str = json_match.group()
-                    else:
-                        raise ValueError("Could not find JSON array in response even after code block cleaning")
-            else:
-                # Try to find any JSON-like structure
-                import re
-                json_match = re.search(r'\[.*\]', content, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group()
-                else:
-                    raise ValueError("Could not find JSON array in response")
-
-        else:
-            json_str = content[start_idx:end_idx]
-        
-        logger.debug(f"Raw AI response: {json_str}")
-        
-        # Parse the JSON
-        universities = json.loads(json_str)
-        if not isinstance(universities, list):
-            universities = [universities]
+        # JSONの抽出とパースは応答サイズに応じてイベントループ外で実行
+        universities = await run_cpu(_extract_university_array, content, size=len(content))
             
         logger.info(f"AI summarization successful, extracted {len(universities)} universities")
         _debug_log(f"[summarize_with_ai] extracted {len(universities)} universities from response")
@@ -669,13 +875,18 @@ async def summarize_with_ai(search_results: List[dict], query: str):
         
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse AI response as JSON: {str(e)}")
-        logger.debug(f"Problematic content: {content if 'content' in locals() else 'N/A'}")
+        logger.debug("Problematic content: %s", content if 'content' in locals() else 'N/A', extra=PAYLOAD)
         _debug_log(f"[summarize_with_ai] JSON decode error: {str(e)}")
+        if not fallback:
+            raise
     except Exception as e:
         logger.error(f"AI summarization failed: {str(e)}")
         _debug_log(f"[summarize_with_ai] summarization exception: {str(e)}")
+        if not fallback:
+            raise
         
     # Fall back to mock data if anything goes wrong
+    MOCK_FALLBACKS.inc()
     return generate_mock_universities()
 
 
@@ -970,6 +1181,30 @@ REGIONAL_UNIVERSITIES = {
 }
 
 
+def seed_suggest_index() -> int:
+    """Fill the name suggestion index from REGIONAL_UNIVERSITIES and the catalog."""
+    suggest_index.seed(name for names in REGIONAL_UNIVERSITIES.values() for name in names)
+    if university_catalog is not None:
+        try:
+            suggest_index.add_records(university_catalog.names())
+        except sqlite3.Error as exc:
+            logger.warning(f"Could not read catalog names for suggestions: {exc}")
+    return len(suggest_index)
+
+
+def preload_static_data() -> Dict[str, int]:
+    """Touch the static lookup tables at startup so the first search does not pay for them."""
+    universities = sum(len(names) for names in REGIONAL_UNIVERSITIES.values())
+    mock = generate_mock_universities()
+    return {
+        "regions": len(REGIONAL_UNIVERSITIES),
+        "regionalUniversities": universities,
+        "mockUniversities": len(mock),
+        "suggestions": seed_suggest_index(),
+    }
+
+
+@traced("search_universities")
 async def search_universities(
     region: str = "",
     faculty: str = "",
@@ -988,15 +1223,20 @@ async def search_universities(
     exam_schedule: str = "",
     progress_callback: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
     university_callback: Optional[Callable[[dict], Awaitable[None]]] = None,
+    force_refresh: bool = False,
+    background: bool = False,
 ) -> List[dict]:
     # ... (メイン検索関数は変更なし)
     """
     Main search function
-    Searches web and returns structured university data
+    Searches web and returns structured university data.
+    ``force_refresh`` skips the result cache and catalog; ``background`` runs (refresh, prefetch) are not
+    counted as demand and do not trigger prefetches.
     """
     logger.info(f"Starting university search with filters: region={region}, faculty={faculty}")
 
     async def _emit_progress(stage: str, detail: Optional[Dict[str, Any]] = None) -> None:
+        add_event(stage, detail)
         if progress_callback is None:
             return
         payload = {"stage": stage}
@@ -1005,8 +1245,66 @@ async def search_universities(
         _debug_log(f"[search_universities] progress stage={stage} detail={detail}")
         await progress_callback(payload)
 
+    filters_dict = {
+        "region": region,
+        "faculty": faculty,
+        "exam_type": exam_type,
+        "use_common_test": use_common_test,
+        "deviation_score": deviation_score,
+        "institution_type": institution_type,
+        "prefecture": prefecture,
+        "name_keyword": name_keyword,
+        "common_test_score": common_test_score,
+        "external_english": external_english,
+        "required_subjects": required_subjects,
+        "tuition_max": tuition_max,
+        "scholarship": scholarship,
+        "qualification": qualification,
+        "exam_schedule": exam_schedule,
+    }
+    span = current_span()
+    if span is not None:
+        span.set_attribute("filters", {key: value for key, value in filters_dict.items() if value})
+
+    if not background:
+        filter_popularity.record(filters_dict)
+    cached = None if force_refresh else search_result_cache.get(filters_dict)
+    if not background:
+        CACHE_REQUESTS.inc(cache="search", result="miss" if cached is None else "hit")
+        if cached is not None:
+            speculative_prefetcher.note_hit(filters_dict)
+    if cached is not None:
+        logger.info(f"Search cache hit, returning {len(cached)} cached results")
+        await _emit_progress("cache_hit", {"count": len(cached)})
+        if university_callback is not None:
+            for uni in cached:
+                await university_callback(uni)
+        await _emit_progress("completed", {"count": len(cached)})
+        return cached
+
+    # ローカルカタログに条件を満たす新しいレコードが十分あれば、Web検索とLLMを省略する
+    if university_catalog is not None and not force_refresh:
+        with STAGE_DURATION.time(stage="catalog"), start_span("catalog_lookup") as catalog_span:
+            try:
+                catalog_hits = await asyncio.to_thread(university_catalog.lookup, filters_dict)
+            except sqlite3.Error as exc:
+                logger.warning(f"Catalog lookup failed, falling back to web search: {exc}")
+                catalog_hits = None
+            catalog_span.set_attribute("hits", -1 if catalog_hits is None else len(catalog_hits))
+        if catalog_hits is not None:
+            logger.info(f"Answered search from the catalog with {len(catalog_hits)} results")
+            await _emit_progress("catalog_hit", {"count": len(catalog_hits)})
+            if university_callback is not None:
+                for uni in catalog_hits:
+                    await university_callback(uni)
+            search_result_cache.set(filters_dict, catalog_hits)
+            await _emit_progress("completed", {"count": len(catalog_hits)})
+            return catalog_hits
+
     # Initialize optimal model selection
-    selected_model = await initialize_model()
+    pipeline_started = time.perf_counter()
+    with STAGE_DURATION.time(stage="model_selection"), start_span("model_selection"):
+        selected_model = await initialize_model()
     logger.info(f"Using AI model: {selected_model}")
     await _emit_progress("model_selected", {"model": selected_model})
 
@@ -1099,20 +1397,23 @@ async def search_universities(
     # Limit queries to prevent excessive API calls
     queries = queries[:50]  # Maximum 50 queries to balance coverage and efficiency
 
-    aggregated_results: List[dict] = []
-    seen_urls = set()
+    # 要約に使う上位の結果だけを到着順に保持する。順序キー（クエリ番号, 位置）により
+    # 完了順に依存せず、全件をクエリ順に統合してソートした場合と同じ結果になる
+    top_results = TopKCollector(
+        SUMMARY_MAX_SOURCES, priority=_result_priority, key=_result_key, compact=_compact_result
+    )
 
     async def _run_single_query(idx: int, q: str) -> None:
-        try:
-            await _emit_progress("searching", {"current": idx, "total": len(queries), "query": q})
-            results = await search_web(q)
-            for item in results:
-                url = item.get("url") or item.get("link") or ""
-                if url and url not in seen_urls:
-                    aggregated_results.append(item)
-                    seen_urls.add(url)
-        except Exception as exc:  # noqa: BLE001
-            logger.warning(f"Search failed for query '{q}': {exc}")
+        with start_span("search_query", query=q, index=idx) as span:
+            try:
+                await _emit_progress("searching", {"current": idx, "total": len(queries), "query": q})
+                results = await search_web(q)
+                for position, item in enumerate(results):
+                    top_results.offer(item, (idx, position))
+                span.set_attribute("results", len(results))
+            except Exception as exc:  # noqa: BLE001
+                logger.warning(f"Search failed for query '{q}': {exc}")
+                span.set_attribute("error", str(exc))
 
     # Execute queries with controlled concurrency to improve throughput
     semaphore = asyncio.Semaphore(10)
@@ -1121,104 +1422,96 @@ async def search_universities(
         async with semaphore:
             await _run_single_query(idx, q)
 
-    await asyncio.gather(*(_bounded_query(index, q) for index, q in enumerate(queries, start=1)))
+    with STAGE_DURATION.time(stage="search_fanout"), start_span("search_fanout", queries=len(queries)) as fanout_span:
+        await asyncio.gather(*(_bounded_query(index, q) for index, q in enumerate(queries, start=1)))
+        fanout_span.set_attribute("unique", top_results.unique)
+        fanout_span.set_attribute("evicted", top_results.evicted)
+        fanout_span.set_attribute("duplicates", top_results.duplicates)
+    if top_results.duplicates:
+        URL_DUPLICATES.inc(top_results.duplicates, stage="fanout")
 
-    await _emit_progress("search_complete", {"results": len(aggregated_results)})
+    await _emit_progress("search_complete", {"results": top_results.unique})
 
     # Prioritize trusted sources (PassNavi/Kei-Net), then official (*.ac.jp), then others
-    def _priority(u: str) -> int:
-        if not u:
-            return 0
-        if "passnavi.obunsha.co.jp" in u:
-            return 200  # Increased priority for PassNavi
-        if "keinet.ne.jp" in u:
-            return 180  # Increased priority for Kei-Net
-        if "www.dnc.ac.jp" in u:  # 大学入試センター（公式）
-            return 150
-        if u.endswith(".ac.jp") or ".ac.jp/" in u:
-            return 120
-        if "yozemi.ac.jp" in u:  # 代々木ゼミナール（信頼できる予備校）
-            return 100
-        return 10
-
-    aggregated_results.sort(key=lambda r: _priority(r.get("url") or r.get("link") or ""), reverse=True)
-    search_results = aggregated_results
+    search_results = top_results.results()
 
     # Summarize with AI
     await _emit_progress("summarizing", {"sources": len(search_results)})
     joined_query = " | ".join(queries)
-    raw_universities = await summarize_with_ai(search_results, joined_query)
+    cacheable = True
+    try:
+        with STAGE_DURATION.time(stage="summarize"), start_span("summarize", sources=len(search_results)):
+            raw_universities = await summarize_with_ai(search_results, joined_query, fallback=False)
+    except Exception:  # noqa: BLE001
+        # モックデータはキャッシュしない
+        MOCK_FALLBACKS.inc()
+        raw_universities = generate_mock_universities()
+        cacheable = False
     _debug_log(f"[search_universities] summarize_with_ai returned {len(raw_universities)} entries for '{joined_query[:80]}'")
-    universities = [_normalize_university_entry(uni) for uni in raw_universities]
-    for uni in universities:
-        official = uni.get("officialUrl")
-        if official and official not in uni["sources"]:
-            uni["sources"].insert(0, official)
+    universities = await run_cpu(_normalize_universities, raw_universities, size=estimate_size(raw_universities))
     await _emit_progress("summarize_complete", {"count": len(universities)})
 
     # Filter universities by search conditions using AI
-    filters_dict = {
-        "region": region,
-        "faculty": faculty,
-        "exam_type": exam_type,
-        "use_common_test": use_common_test,
-        "deviation_score": deviation_score,
-        "institution_type": institution_type,
-        "prefecture": prefecture,
-        "name_keyword": name_keyword,
-        "common_test_score": common_test_score,
-        "external_english": external_english,
-        "required_subjects": required_subjects,
-        "tuition_max": tuition_max,
-        "scholarship": scholarship,
-        "qualification": qualification,
-        "exam_schedule": exam_schedule,
-    }
-    universities = await filter_universities_by_conditions(universities, filters_dict, progress_callback, university_callback)
-
-    # Deduplicate by (name, faculty, examType) keeping entries with preferred sources
-    def _src_score(urls: list) -> int:
-        score = 0
-        for u in urls or []:
-            if not isinstance(u, str):
-                continue
-            if "passnavi.obunsha.co.jp" in u:
-                score += 100
-            elif "keinet.ne.jp" in u:
-                score += 90
-            elif "www.dnc.ac.jp" in u:  # 大学入試センター（公式）
-                score += 85
-            elif u.endswith(".ac.jp") or ".ac.jp/" in u:
-                score += 80
-            elif "yozemi.ac.jp" in u:  # 代々木ゼミナール（信頼できる予備校）
-                score += 75
-            else:
-                score += 10
-        return score
-
-    dedup: dict = {}
-    for uni in universities:
-        name = (uni.get("name") or "").strip()
-        faculty_val = (uni.get("faculty") or "").strip()
-        exam_val = (uni.get("examType") or "").strip()
-        key = (name, faculty_val, exam_val)
-        current_best = dedup.get(key)
-        if current_best is None:
-            dedup[key] = uni
-        else:
-            if _src_score(uni.get("sources")) > _src_score(current_best.get("sources")):
-                dedup[key] = uni
-
-    universities = list(dedup.values())
+    verified: Set[str] = set()
+    with STAGE_DURATION.time(stage="filter"), start_span("filter", candidates=len(universities)):
+        universities = await filter_universities_by_conditions(
+            universities, filters_dict, progress_callback, university_callback, verified=verified
+        )
 
-    # Sort by name, faculty, examType
-    universities.sort(key=lambda x: ((x.get("name") or ""), (x.get("faculty") or ""), (x.get("examType") or "")))
+    # Deduplicate by (name, faculty, examType) keeping entries with preferred sources, then sort by the same key
+    universities = await run_cpu(_dedupe_and_sort, universities, size=estimate_size(universities))
     
+    if cacheable:
+        search_result_cache.set(filters_dict, universities)
+        if university_catalog is not None:
+            try:
+                await asyncio.to_thread(university_catalog.store, universities, filters_dict, verified=verified)
+            except sqlite3.Error as exc:
+                logger.warning(f"Could not store results in the catalog: {exc}")
+        suggest_index.add_records(universities)
+        filter_popularity.mark_fetched(filters_dict)
+        if not background:
+            speculative_prefetcher.schedule(filters_dict, universities)
+
+    STAGE_DURATION.observe(time.perf_counter() - pipeline_started, stage="total")
     logger.info(f"University search completed, returning {len(universities)} results")
     await _emit_progress("completed", {"count": len(universities)})
     return universities
 
 
+async def refresh_search(filters: Dict[str, str]) -> List[dict]:
+    """Re-run the pipeline for a filter set past the caches; used by the background refresh scheduler."""
+    return await search_universities(**filters, force_refresh=True, background=True)
+
+
+async def _prefetch_search(filters: Dict[str, str]) -> List[dict]:
+    return await search_universities(**filters, background=True)
+
+
+async def _derive_refinement(universities: List[dict], filters: Dict[str, str]) -> Optional[List[dict]]:
+    """Results for a narrower filter set taken from a broader search's results, without a web search."""
+    if not HF_API_KEY:
+        # 条件の判定にはLLMが必要
+        return None
+    universities = await filter_universities_by_conditions([dict(uni) for uni in universities], filters)
+    return await run_cpu(_dedupe_and_sort, universities, size=estimate_size(universities))
+
+
+# 検索の後に続けて検索されやすい条件を先読みする
+speculative_prefetcher = SpeculativePrefetcher(
+    search_result_cache,
+    filter_popularity,
+    derive=_derive_refinement,
+    fetch=_prefetch_search,
+    enabled=PREFETCH_ENABLED,
+    max_per_search=PREFETCH_MAX_PER_SEARCH,
+    budget_calls=PREFETCH_BUDGET_CALLS,
+    budget_window=PREFETCH_BUDGET_WINDOW_SECONDS,
+    queue_size=PREFETCH_QUEUE_SIZE,
+    neighbours=PREFETCH_NEIGHBOURS,
+)
+
+
 # --- 実行例 ---
 async def main():
     # 🚨 【修正箇所】環境変数のチェックはそのまま
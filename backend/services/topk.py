@@ -0,0 +1,96 @@
+"""
+Top-K Collector
+Keeps only the K highest-priority search results while query results stream in
+"""
+
+import heapq
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def _negate(order: Tuple[int, ...]) -> Tuple[int, ...]:
+    # ヒープの根が「優先度が最も低く、順序が最も遅い」要素になるよう順序を反転する
+    return tuple(-part for part in order)
+
+
+class TopKCollector:
+    """
+    Bounded min-heap of the ``k`` best results by ``(priority desc, order asc)``.
+
+    ``order`` is supplied by the caller (e.g. ``(query_index, position)``) so the
+    outcome is the same as deduplicating everything in order and sorting, no matter
+    which query finishes first. Results that fall out of the top K are released
+    immediately, and admitted results are stored through ``compact``.
+    """
+
+    def __init__(
+        self,
+        k: int,
+        priority: Callable[[dict], int],
+        key: Callable[[dict], str],
+        compact: Optional[Callable[[dict], dict]] = None,
+    ) -> None:
+        if k <= 0:
+            raise ValueError("k must be a positive integer")
+        self.k = k
+        self._priority = priority
+        self._key = key
+        self._compact = compact or (lambda item: item)
+        # ヒープ要素: [priority, 反転した順序, dedupキー, 圧縮済みの結果]
+        self._heap: List[list] = []
+        # dedupキーごとの最良の順序と、ヒープ内にあればその要素
+        self._best_order: Dict[str, Tuple[int, ...]] = {}
+        self._live: Dict[str, list] = {}
+        self.offered = 0
+        self.duplicates = 0
+        self.evicted = 0
+
+    @property
+    def unique(self) -> int:
+        """Distinct keys seen so far, including those that did not make the top K."""
+        return len(self._best_order)
+
+    def offer(self, item: dict, order: Tuple[int, ...]) -> bool:
+        """Consider ``item``; returns True when it is currently in the top K."""
+        self.offered += 1
+        key = self._key(item)
+        if not key:
+            return False
+
+        best = self._best_order.get(key)
+        self._best_order[key] = order if best is None else min(order, best)
+        if best is not None:
+            self.duplicates += 1
+            if order >= best:
+                return False
+            live = self._live.get(key)
+            if live is not None:
+                # 同じキーでより早い順序の結果に置き換える（優先度はキーから決まるので不変）
+                live[1] = _negate(order)
+                live[3] = self._compact(item)
+                heapq.heapify(self._heap)
+                return True
+
+        priority = self._priority(item)
+        heap = self._heap
+        if len(heap) >= self.k:
+            # 大半の結果はここで捨てられるので、順序キーの生成より先に優先度だけで判定する
+            root = heap[0]
+            if priority < root[0]:
+                return False
+            negated = _negate(order)
+            if priority == root[0] and negated <= root[1]:
+                return False
+            entry = [priority, negated, key, self._compact(item)]
+            dropped = heapq.heapreplace(heap, entry)
+            del self._live[dropped[2]]
+            self.evicted += 1
+        else:
+            entry = [priority, _negate(order), key, self._compact(item)]
+            heapq.heappush(heap, entry)
+        self._live[key] = entry
+        return True
+
+    def results(self) -> List[dict]:
+        """The collected results, best first."""
+        ordered = sorted(self._heap, key=lambda entry: (-entry[0], _negate(entry[1])))
+        return [entry[3] for entry in ordered]
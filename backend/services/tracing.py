@@ -0,0 +1,247 @@
+"""
+Tracing
+Lightweight per-request span trees for the search pipeline with local exporters
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") != "0"
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+# JSONLファイルへの出力（未設定ならメモリ上のリングバッファのみ）
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "3"))
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("uninavi_current_span", default=None)
+
+
+class Span:
+    """One timed unit of work; spans of a request share a trace and form a tree via ``parent_id``."""
+
+    __slots__ = (
+        "trace", "span_id", "parent_id", "name", "attributes", "events",
+        "status", "start_time", "_start_perf", "duration_ms",
+    )
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> None:
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.events: List[Dict[str, Any]] = []
+        self.status = "ok"
+        self.start_time = time.time()
+        self._start_perf = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        trace.spans.append(self)
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        offset_ms = (time.perf_counter() - self._start_perf) * 1000
+        self.events.append({"name": name, "offsetMs": round(offset_ms, 3), **(attributes or {})})
+
+    def end(self, status: Optional[str] = None) -> None:
+        if self.duration_ms is not None:
+            return
+        if status is not None:
+            self.status = status
+        self.duration_ms = (time.perf_counter() - self._start_perf) * 1000
+        if self.parent_id is None:
+            self.trace.finish()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "spanId": self.span_id,
+            "parentId": self.parent_id,
+            "name": self.name,
+            "startTime": self.start_time,
+            "durationMs": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "status": self.status,
+            "attributes": self.attributes,
+            "events": self.events,
+        }
+
+
+class Trace:
+    def __init__(self, exporter: "TraceExporter") -> None:
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self._exporter = exporter
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    def finish(self) -> None:
+        self._exporter.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Nest spans under their parents for reading the request as a tree."""
+        nodes = {span.span_id: {**span.to_dict(), "children": []} for span in self.spans}
+        roots = []
+        for span in self.spans:
+            node = nodes[span.span_id]
+            parent = nodes.get(span.parent_id) if span.parent_id else None
+            (parent["children"] if parent else roots).append(node)
+        root = self.root
+        return {
+            "traceId": self.trace_id,
+            "name": root.name,
+            "startTime": root.start_time,
+            "durationMs": round(root.duration_ms, 3) if root.duration_ms is not None else None,
+            "status": root.status,
+            "spanCount": len(self.spans),
+            "spans": roots,
+        }
+
+
+class TraceExporter:
+    """Keep the latest traces in a ring buffer and optionally append them to a rotating JSONL file."""
+
+    def __init__(self, buffer_size: int = 200, file_path: str = "") -> None:
+        self._buffer_size = buffer_size
+        self._traces: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._file_logger: Optional[logging.Logger] = None
+        if file_path:
+            handler = logging.handlers.RotatingFileHandler(
+                file_path, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._file_logger = logging.getLogger("uninavi.traces")
+            self._file_logger.setLevel(logging.INFO)
+            self._file_logger.propagate = False
+            self._file_logger.addHandler(handler)
+
+    def export(self, trace: Trace) -> None:
+        data = trace.to_dict()
+        self._traces[trace.trace_id] = data
+        while len(self._traces) > self._buffer_size:
+            self._traces.popitem(last=False)
+        if self._file_logger is not None:
+            self._file_logger.info(json.dumps(data, ensure_ascii=False, default=str))
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        return self._traces.get(trace_id)
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        summaries = []
+        for data in reversed(self._traces.values()):
+            summaries.append({key: data[key] for key in ("traceId", "name", "startTime", "durationMs", "status", "spanCount")})
+            if len(summaries) >= limit:
+                break
+        return summaries
+
+
+exporter = TraceExporter(buffer_size=TRACE_BUFFER_SIZE, file_path=TRACE_FILE)
+
+
+class _NoopSpan:
+    """Stand-in used when tracing is disabled so call sites need no checks."""
+
+    trace_id = ""
+    span_id = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        pass
+
+    def end(self, status: Optional[str] = None) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def begin_trace(name: str, **attributes: Any) -> Span:
+    """Create the root span of a new trace without making it current; call ``end()`` when done."""
+    if not TRACING_ENABLED:
+        return _NOOP_SPAN
+    return Span(Trace(exporter), name, None, attributes)
+
+
+@contextlib.contextmanager
+def use_span(span: Span) -> Iterator[Span]:
+    """Make ``span`` the parent of spans started in this context (e.g. inside a background task)."""
+    if isinstance(span, _NoopSpan):
+        yield span
+        return
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+
+
+@contextlib.contextmanager
+def start_span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Time a block as a child of the current span.
+    Without a current span a new trace is started and exported when the block exits.
+    """
+    if not TRACING_ENABLED:
+        yield _NOOP_SPAN
+        return
+    parent = _current_span.get()
+    if parent is None:
+        span = Span(Trace(exporter), name, None, attributes)
+    else:
+        span = Span(parent.trace, name, parent.span_id, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.set_attribute("error", f"{type(exc).__name__}: {exc}")
+        span.status = "cancelled" if isinstance(exc, asyncio.CancelledError) else "error"
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+def add_event(name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+    """Record an event on the current span, if any."""
+    span = _current_span.get()
+    if span is not None:
+        span.add_event(name, attributes)
+
+
+def traced(name: str) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Decorator running an async function inside ``start_span(name)``."""
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            with start_span(name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
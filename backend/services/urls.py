@@ -0,0 +1,153 @@
+"""
+URL Canonicalization
+Normalizes URLs from search providers and LLM output so the same page is only fetched, counted and cited once
+"""
+
+import os
+import posixpath
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit, urlunsplit
+
+from services.metrics import registry
+
+# 常に取り除くトラッキング用パラメータ（utm_* は接頭辞で判定）
+TRACKING_PARAMS = {
+    "gclid", "dclid", "fbclid", "msclkid", "yclid", "twclid", "igshid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "ref_src", "srsltid", "spm",
+}
+# トラッキング用と同名でもページの内容を変えるため残すパラメータ（カンマ区切り）
+URL_KEEP_PARAMS = {
+    name.strip().lower() for name in os.getenv("URL_KEEP_PARAMS", "").split(",") if name.strip()
+}
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_NON_WEB_SCHEMES = ("mailto:", "tel:", "javascript:", "data:")
+# パスで再エンコードしない文字（RFC 3986 の unreserved + sub-delims + ":" "@" "/"）
+_PATH_SAFE = "/:@!$&'()*+,;=-._~"
+# 正規化済みに近い形（スキーム・ホスト・ASCIIのパスのみ）
+_SIMPLE_URL_RE = re.compile(r"(?:(https?):)?(?://)?([A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+)(/[A-Za-z0-9/_.~-]*)?")
+
+URL_DUPLICATES = registry.counter(
+    "uninavi_url_duplicates_total",
+    "Search results and sources dropped because their canonical URL was already present",
+    ["stage"],
+)
+
+
+def _is_tracking(name: str) -> bool:
+    lowered = name.lower()
+    if lowered in URL_KEEP_PARAMS:
+        return False
+    return lowered.startswith("utm_") or lowered in TRACKING_PARAMS
+
+
+def _host(hostname: str) -> str:
+    host = hostname.strip().rstrip(".").lower()
+    if host.isascii():
+        return host
+    try:
+        return host.encode("idna").decode("ascii")
+    except UnicodeError:
+        return host
+
+
+def _path(path: str) -> str:
+    if not path:
+        return "/"
+    # %XX の大文字・小文字や未エンコードの日本語を同じ表記にそろえる
+    if "%" in path or not path.isascii():
+        path = quote(unquote(path), safe=_PATH_SAFE)
+    # ほとんどのパスは正規化済みなので、"." や "//" を含む場合だけ整理する
+    if "/." not in path and "//" not in path:
+        return path
+    trailing = path.endswith("/")
+    path = posixpath.normpath(path)
+    if path.startswith("//"):
+        path = "/" + path.lstrip("/")
+    if path == ".":
+        return "/"
+    return path + "/" if trailing and path != "/" else path
+
+
+def _parts(url: str) -> Tuple[str, str, str, str]:
+    """Return (host with non-default port, path, sorted query without tracking params, scheme)."""
+    cleaned = url.strip()
+    if cleaned.startswith("//"):
+        cleaned = f"https:{cleaned}"
+    elif "://" not in cleaned:
+        cleaned = f"https://{cleaned}"
+    parts = urlsplit(cleaned)
+    scheme = parts.scheme.lower()
+    host = _host(parts.hostname or "")
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    query = ""
+    if parts.query:
+        query = urlencode(sorted(
+            (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking(name)
+        ))
+    return host, _path(parts.path), query, scheme
+
+
+@lru_cache(maxsize=8192)
+def canonicalize_url(url: str) -> str:
+    """
+    Canonical, still fetchable form of ``url``: the original scheme (https when missing), lowercase
+    IDNA host without default port, normalized path, tracking parameters removed, remaining parameters
+    sorted and no fragment. Returns an empty string for values that are not URLs.
+    """
+    if not url or not url.strip() or url.strip().lower().startswith(_NON_WEB_SCHEMES):
+        return ""
+    simple = _SIMPLE_URL_RE.fullmatch(url.strip())
+    if simple and "//" not in (simple.group(3) or "") and "/." not in (simple.group(3) or ""):
+        # クエリ・ポート・エンコードを含まない大半のURLは分解せずに正規化する
+        return f"{simple.group(1) or 'https'}://{simple.group(2).lower()}{simple.group(3) or '/'}"
+    host, path, query, scheme = _parts(url)
+    # "PassNavi" のようなURLでない出典表記は捨てる
+    if "." not in host:
+        return ""
+    if scheme not in _DEFAULT_PORTS:
+        return url.strip()
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+@lru_cache(maxsize=8192)
+def url_key(url: str) -> str:
+    """
+    Comparison key for ``url``: the canonical URL without scheme, ``www.`` prefix and trailing slash,
+    so variants of the same page (including http and https) compare equal.
+    """
+    canonical = canonicalize_url(url)
+    if canonical.startswith("https://"):
+        key = canonical[len("https://"):]
+    elif canonical.startswith("http://"):
+        key = canonical[len("http://"):]
+    else:
+        return canonical
+    if key.startswith("www."):
+        key = key[len("www."):]
+    path_end = key.find("?")
+    if path_end == -1:
+        return key.rstrip("/")
+    return key[:path_end].rstrip("/") + key[path_end:]
+
+
+def dedupe_urls(urls: Iterable[str], stage: Optional[str] = "sources") -> List[str]:
+    """Canonicalize ``urls`` and drop later duplicates, counting them under ``stage`` unless it is None."""
+    seen: set[str] = set()
+    unique: List[str] = []
+    for url in urls:
+        key = url_key(url)
+        if not key or key in seen:
+            if key and stage:
+                URL_DUPLICATES.inc(stage=stage)
+            continue
+        seen.add(key)
+        unique.append(canonicalize_url(url))
+    return unique
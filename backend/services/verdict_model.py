@@ -0,0 +1,449 @@
+"""
+Verdict Model
+Logs the LLM's per-university filter verdicts with features and trains a logistic regression on them,
+so confident predictions can answer filter checks without an LLM call
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from services.columnar import match_text, parse_score_range, required_subjects
+from services.entities import canonical_value
+from services.metrics import registry
+
+try:  # numpy is optional; training falls back to pure-Python SGD when it is not installed
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# on: 確信度の高い予測でLLMを省略 / shadow: 記録・学習・一致率の計測のみ / off: 無効
+VERDICT_MODEL_MODE = os.getenv("VERDICT_MODEL_MODE", "shadow")
+# 判定の記録先（JSON Lines、空なら保存しない）
+VERDICT_LOG_PATH = os.getenv("VERDICT_LOG_PATH", "")
+VERDICT_LOG_MAX = int(os.getenv("VERDICT_LOG_MAX", "20000"))
+# 予測確率がこの値以上（または 1 - この値以下）ならLLMを省略する
+VERDICT_MODEL_THRESHOLD = float(os.getenv("VERDICT_MODEL_THRESHOLD", "0.95"))
+# 学習に必要な判定数と、再学習までに増えるべき判定数
+VERDICT_MODEL_MIN_EXAMPLES = int(os.getenv("VERDICT_MODEL_MIN_EXAMPLES", "300"))
+VERDICT_MODEL_RETRAIN_EVERY = int(os.getenv("VERDICT_MODEL_RETRAIN_EVERY", "200"))
+# 検証データで確信度の高い予測がこの正解率に届かなければモデルを使わない
+VERDICT_MODEL_MIN_ACCURACY = float(os.getenv("VERDICT_MODEL_MIN_ACCURACY", "0.97"))
+# 確信度の高い予測のうちLLMでも確認して一致率を測る割合
+VERDICT_MODEL_AUDIT_RATE = float(os.getenv("VERDICT_MODEL_AUDIT_RATE", "0.05"))
+
+# 特徴量の定義を変えたら上げる（古い記録は読み込まない）
+FEATURE_VERSION = 1
+
+# 範囲条件: (条件キー, 大学側のフィールド, 差の尺度)
+SCORE_FIELDS = (("deviation_score", "deviationScore", 10.0), ("common_test_score", "commonTestScore", 20.0))
+# 文字列条件: (条件キー, 照合する大学側のフィールド)
+TEXT_FIELDS = (
+    ("region", ("region",)),
+    ("prefecture", ("prefecture",)),
+    ("institution_type", ("name", "aiSummary")),
+    ("faculty", ("faculty", "department")),
+    ("exam_type", ("examType", "admissionMethods", "examSchedules")),
+    ("name_keyword", ("name",)),
+    ("qualification", ("selectionNotes", "aiSummary", "subjectHighlights")),
+    ("external_english", ("selectionNotes", "aiSummary", "admissionMethods")),
+)
+FLAG_FIELDS = ("tuition_max", "scholarship", "exam_schedule")
+INFO_FIELDS = ("faculty", "department", "deviationScore", "commonTestScore", "examType", "requiredSubjects", "region", "prefecture")
+
+FEATURE_NAMES: List[str] = (
+    [f"{key}_{part}" for key, _, _ in SCORE_FIELDS for part in ("set", "missing", "overlap", "gap")]
+    + [f"{key}_{part}" for key, _ in TEXT_FIELDS for part in ("set", "match", "overlap")]
+    + ["required_subjects_set", "required_subjects_coverage"]
+    + ["use_common_test_yes", "use_common_test_no", "use_common_test_score"]
+    + [f"{key}_set" for key in FLAG_FIELDS]
+    + ["filters", "text_overlap", "completeness"]
+)
+
+VERDICT_DECISIONS = registry.counter(
+    "uninavi_verdict_model_decisions_total",
+    "Filter verdicts by source: predicted (LLM skipped), llm, or audit (confident prediction checked by the LLM)",
+    ["source"],
+)
+VERDICT_AGREEMENT = registry.counter(
+    "uninavi_verdict_model_agreement_total",
+    "LLM verdicts compared with the model's prediction",
+    ["confident", "agreed"],
+)
+
+
+def _avoided_ratio():
+    predicted = VERDICT_DECISIONS.value(source="predicted")
+    total = predicted + VERDICT_DECISIONS.value(source="llm") + VERDICT_DECISIONS.value(source="audit")
+    yield {}, (predicted / total if total else 0.0)
+
+
+registry.gauge(
+    "uninavi_verdict_model_avoided_ratio",
+    "Share of filter verdicts answered by the local model instead of the LLM",
+    callback=_avoided_ratio,
+)
+
+
+def _text(university: dict, fields: Sequence[str]) -> str:
+    parts = []
+    for field in fields:
+        value = university.get(field)
+        parts.append(" ".join(map(str, value)) if isinstance(value, list) else str(value or ""))
+    return match_text(" ".join(parts))
+
+
+def _bigrams(text: str) -> set:
+    return {text[index:index + 2] for index in range(len(text) - 1)} if len(text) > 1 else {text} - {""}
+
+
+def _overlap(needle: str, haystack: str) -> float:
+    """Share of the filter text's bigrams found in the university text."""
+    wanted = _bigrams(needle)
+    return len(wanted & _bigrams(haystack)) / len(wanted) if wanted else 0.0
+
+
+def verdict_features(university: dict, filters: Dict[str, str]) -> List[float]:
+    """Feature vector (``FEATURE_NAMES``) of a university against a filter set."""
+    features: List[float] = []
+    for key, field, scale in SCORE_FIELDS:
+        wanted = parse_score_range(filters.get(key))
+        own = parse_score_range(university.get(field))
+        if wanted is None:
+            features += [0.0, 0.0, 0.0, 0.0]
+            continue
+        if own is None:
+            features += [1.0, 1.0, 0.0, 0.0]
+            continue
+        gap = max(wanted[0] - own[1], own[0] - wanted[1], 0.0)
+        features += [1.0, 0.0, 1.0 if gap == 0 else 0.0, min(gap / scale, 3.0)]
+
+    for key, fields in TEXT_FIELDS:
+        value = filters.get(key, "")
+        if not value:
+            features += [0.0, 0.0, 0.0]
+            continue
+        wanted = match_text(canonical_value(key, value))
+        text = _text(university, fields)
+        features += [1.0, 1.0 if wanted and wanted in text else 0.0, _overlap(wanted, text)]
+
+    subjects = required_subjects(filters.get("required_subjects"))
+    if subjects:
+        own = set(required_subjects(_text(university, ("requiredSubjects", "subjectHighlights"))))
+        features += [1.0, sum(subject in own for subject in subjects) / len(subjects)]
+    else:
+        features += [0.0, 0.0]
+
+    common_test = filters.get("use_common_test", "")
+    has_score = 1.0 if parse_score_range(university.get("commonTestScore")) else 0.0
+    features += [1.0 if common_test == "あり" else 0.0, 1.0 if common_test == "なし" else 0.0, has_score]
+    features += [1.0 if filters.get(key) else 0.0 for key in FLAG_FIELDS]
+
+    filter_text = match_text(" ".join(value for value in filters.values() if isinstance(value, str)))
+    features += [
+        sum(1 for value in filters.values() if value) / 10,
+        _overlap(filter_text, _text(university, INFO_FIELDS + ("name", "admissionMethods", "aiSummary"))),
+        sum(1 for field in INFO_FIELDS if university.get(field)) / len(INFO_FIELDS),
+    ]
+    return features
+
+
+def _sigmoid(value: float) -> float:
+    if value >= 0:
+        return 1.0 / (1.0 + math.exp(-value))
+    exp = math.exp(value)
+    return exp / (1.0 + exp)
+
+
+def train_logistic(
+    rows: List[List[float]], labels: List[int], l2: float = 1e-3, epochs: int = 300, learning_rate: float = 0.5,
+) -> Tuple[List[float], float]:
+    """Weights and bias of an L2-regularized logistic regression on standardized ``rows``."""
+    if np is not None:
+        x = np.asarray(rows, dtype=np.float64)
+        y = np.asarray(labels, dtype=np.float64)
+        weights = np.zeros(x.shape[1])
+        bias = 0.0
+        for _ in range(epochs):
+            error = 1.0 / (1.0 + np.exp(-(x @ weights + bias))) - y
+            weights -= learning_rate * (x.T @ error / len(y) + l2 * weights)
+            bias -= learning_rate * float(error.mean())
+        return weights.tolist(), bias
+
+    # NumPy がなければ確率的勾配降下法で数周だけ回す
+    rng = random.Random(0)
+    weights = [0.0] * len(rows[0])
+    bias = 0.0
+    order = list(range(len(rows)))
+    step = learning_rate / 5
+    for _ in range(10):
+        rng.shuffle(order)
+        for index in order:
+            row = rows[index]
+            error = _sigmoid(sum(w * v for w, v in zip(weights, row)) + bias) - labels[index]
+            for feature, value in enumerate(row):
+                weights[feature] -= step * (error * value + l2 * weights[feature])
+            bias -= step * error
+    return weights, bias
+
+
+class VerdictModel:
+    """
+    Keep the last ``max_examples`` LLM verdicts as ``(features, matches)`` (appended to ``path``, which
+    is cut back to as many rows on each training) and retrain every ``retrain_every`` new verdicts.
+    A trained model is used only when its confident predictions (probability beyond ``threshold``)
+    reached ``min_accuracy`` on a held-out fifth of the examples; a share ``audit_rate`` of confident
+    predictions still goes to the LLM to measure agreement.
+    """
+
+    def __init__(
+        self,
+        path: str = "",
+        mode: str = "shadow",
+        threshold: float = 0.95,
+        min_examples: int = 300,
+        retrain_every: int = 200,
+        min_accuracy: float = 0.97,
+        audit_rate: float = 0.05,
+        max_examples: int = 20000,
+    ) -> None:
+        self.path = path
+        self.mode = mode
+        self.threshold = threshold
+        self.min_examples = min_examples
+        self.retrain_every = retrain_every
+        self.min_accuracy = min_accuracy
+        self.audit_rate = audit_rate
+        self._examples: Deque[Tuple[List[float], int]] = deque(maxlen=max_examples)
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+        # ログファイルの読み書き（close の追記と学習スレッドの書き直しが重ならないように）
+        self._file_lock = threading.Lock()
+        self._loaded = False
+        # (平均, 標準偏差, 重み, バイアス)
+        self._model: Optional[Tuple[List[float], List[float], List[float], float]] = None
+        self._training: Optional[asyncio.Task] = None
+        self._seen = 0
+        self._trained_at = 0
+        self.last_training: Optional[dict] = None
+        self.avoided = 0
+        self.llm_calls = 0
+        self.audited = 0
+        self.audit_agreed = 0
+        self.compared = 0
+        self.agreed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("on", "shadow")
+
+    def load(self) -> int:
+        """
+        Read the logged verdicts once, ahead of those recorded since. This blocks on file I/O;
+        run it in a worker thread before serving requests. Returns the number of verdicts read.
+        """
+        if self._loaded or not self.path:
+            return 0
+        self._loaded = True
+        loaded: List[Tuple[List[float], int]] = []
+        try:
+            with self._file_lock:
+                if not os.path.exists(self.path):
+                    return 0
+                with open(self.path, encoding="utf-8") as handle:
+                    for line in handle:
+                        record = json.loads(line)
+                        if record.get("v") == FEATURE_VERSION:
+                            loaded.append((record["x"], int(record["y"])))
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning(f"Could not read verdict log {self.path}: {exc}")
+        with self._lock:
+            self._examples = deque(loaded + list(self._examples), maxlen=self._examples.maxlen)
+            self._seen += len(loaded)
+        logger.info(f"Loaded {len(loaded)} logged filter verdicts")
+        return len(loaded)
+
+    def probability(self, features: List[float]) -> Optional[float]:
+        model = self._model
+        if model is None:
+            return None
+        mean, scale, weights, bias = model
+        return _sigmoid(sum(w * (v - m) / s for w, v, m, s in zip(weights, features, mean, scale)) + bias)
+
+    def decide(self, features: List[float]) -> Tuple[Optional[bool], Optional[float]]:
+        """``(verdict, probability)``; the verdict is set only when the LLM call can be skipped."""
+        if not self.enabled:
+            return None, None
+        probability = self.probability(features)
+        if probability is None or self.mode != "on":
+            return None, probability
+        if 1.0 - self.threshold < probability < self.threshold or random.random() < self.audit_rate:
+            return None, probability
+        self.avoided += 1
+        VERDICT_DECISIONS.inc(source="predicted")
+        return probability >= 0.5, probability
+
+    def record(self, features: List[float], matches: bool, probability: Optional[float] = None, reason: str = "") -> None:
+        """Log an LLM verdict; ``probability`` is the model's prediction made before the call, if any."""
+        if not self.enabled:
+            return
+        label = 1 if matches else 0
+        confident = probability is not None and not 1.0 - self.threshold < probability < self.threshold
+        if confident and self.mode == "on":
+            self.audited += 1
+            VERDICT_DECISIONS.inc(source="audit")
+        else:
+            self.llm_calls += 1
+            VERDICT_DECISIONS.inc(source="llm")
+        if probability is not None:
+            agreed = (probability >= 0.5) == bool(label)
+            self.compared += 1
+            self.agreed += agreed
+            if confident and self.mode == "on":
+                self.audit_agreed += agreed
+            VERDICT_AGREEMENT.inc(confident=str(confident).lower(), agreed=str(agreed).lower())
+        with self._lock:
+            self._examples.append((features, label))
+            self._seen += 1
+            if self.path:
+                self._pending.append(json.dumps(
+                    {"v": FEATURE_VERSION, "x": [round(value, 4) for value in features], "y": label, "reason": reason[:200]},
+                    ensure_ascii=False,
+                ))
+
+    def _flush(self) -> None:
+        with self._file_lock:
+            with self._lock:
+                lines, self._pending = self._pending, []
+            if not lines:
+                return
+            try:
+                with open(self.path, "a", encoding="utf-8") as handle:
+                    handle.write("\n".join(lines) + "\n")
+            except OSError as exc:
+                logger.warning(f"Could not append to verdict log {self.path}: {exc}")
+
+    def _compact(self) -> None:
+        """Flush and rewrite the log with its last ``max_examples`` rows, so it stops growing."""
+        with self._file_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            try:
+                lines: Deque[str] = deque(maxlen=self._examples.maxlen)
+                if os.path.exists(self.path):
+                    with open(self.path, encoding="utf-8") as handle:
+                        lines.extend(line.rstrip("\n") for line in handle if line.strip())
+                lines.extend(pending)
+                temporary = f"{self.path}.tmp"
+                with open(temporary, "w", encoding="utf-8") as handle:
+                    handle.writelines(f"{line}\n" for line in lines)
+                os.replace(temporary, self.path)
+            except OSError as exc:
+                logger.warning(f"Could not rewrite verdict log {self.path}: {exc}")
+
+    def maybe_train(self) -> None:
+        """Start retraining in a worker thread once enough new verdicts were logged."""
+        if not self.enabled or (self._training is not None and not self._training.done()):
+            return
+        if self._seen - self._trained_at >= self.retrain_every and len(self._examples) >= self.min_examples:
+            self._training = asyncio.get_running_loop().create_task(asyncio.to_thread(self.train))
+        elif self.path and len(self._pending) >= 100:
+            self._training = asyncio.get_running_loop().create_task(asyncio.to_thread(self._flush))
+
+    def train(self) -> Optional[dict]:
+        """Compact the log and fit a new model; the model is swapped in only if it passes validation."""
+        if self.path:
+            self._compact()
+        with self._lock:
+            examples = list(self._examples)
+            seen = self._seen
+        if seen - self._trained_at < self.retrain_every or len(examples) < self.min_examples:
+            return None
+        self._trained_at = seen
+        labels = [label for _, label in examples]
+        if len(set(labels)) < 2:
+            return None
+
+        random.Random(seen).shuffle(examples)
+        split = len(examples) * 4 // 5
+        train_rows = [features for features, _ in examples[:split]]
+        columns = list(zip(*train_rows))
+        mean = [sum(column) / len(column) for column in columns]
+        scale = [
+            math.sqrt(sum((value - m) ** 2 for value in column) / len(column)) or 1.0
+            for column, m in zip(columns, mean)
+        ]
+
+        def standardize(rows: List[List[float]]) -> List[List[float]]:
+            return [[(value - m) / s for value, m, s in zip(row, mean, scale)] for row in rows]
+
+        weights, bias = train_logistic(standardize(train_rows), [label for _, label in examples[:split]])
+        candidate = (mean, scale, weights, bias)
+
+        # 検証データで確信度の高い予測の正解率と割合を測る
+        confident = correct = 0
+        agreed = 0
+        holdout = examples[split:]
+        for features, label in holdout:
+            probability = _sigmoid(sum(w * (v - m) / s for w, v, m, s in zip(weights, features, mean, scale)) + bias)
+            agreed += (probability >= 0.5) == bool(label)
+            if not 1.0 - self.threshold < probability < self.threshold:
+                confident += 1
+                correct += (probability >= 0.5) == bool(label)
+        accuracy = correct / confident if confident else 0.0
+        accepted = confident > 0 and accuracy >= self.min_accuracy
+        if accepted:
+            self._model = candidate
+        self.last_training = {
+            "examples": len(examples),
+            "positiveShare": round(sum(labels) / len(labels), 4),
+            "holdout": len(holdout),
+            "holdoutAgreement": round(agreed / len(holdout), 4) if holdout else 0.0,
+            "confidentShare": round(confident / len(holdout), 4) if holdout else 0.0,
+            "confidentAccuracy": round(accuracy, 4),
+            "accepted": accepted,
+            "backend": "numpy" if np is not None else "python",
+        }
+        logger.info(f"Trained verdict model: {self.last_training}")
+        return self.last_training
+
+    def snapshot(self) -> dict:
+        decided = self.avoided + self.llm_calls + self.audited
+        return {
+            "mode": self.mode,
+            "active": self._model is not None,
+            "examples": len(self._examples),
+            "threshold": self.threshold,
+            "avoided": self.avoided,
+            "llmCalls": self.llm_calls + self.audited,
+            "avoidedShare": round(self.avoided / decided, 4) if decided else 0.0,
+            "audited": self.audited,
+            "auditAgreement": round(self.audit_agreed / self.audited, 4) if self.audited else None,
+            "agreement": round(self.agreed / self.compared, 4) if self.compared else None,
+            "lastTraining": self.last_training,
+            "features": FEATURE_NAMES,
+        }
+
+    def close(self) -> None:
+        if self.path:
+            self._flush()
+
+
+verdict_model = VerdictModel(
+    path=VERDICT_LOG_PATH,
+    mode=VERDICT_MODEL_MODE,
+    threshold=VERDICT_MODEL_THRESHOLD,
+    min_examples=VERDICT_MODEL_MIN_EXAMPLES,
+    retrain_every=VERDICT_MODEL_RETRAIN_EVERY,
+    min_accuracy=VERDICT_MODEL_MIN_ACCURACY,
+    audit_rate=VERDICT_MODEL_AUDIT_RATE,
+    max_examples=VERDICT_LOG_MAX,
+)
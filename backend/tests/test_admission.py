@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from services.admission import AdmissionController, AdmissionRejected
+
+
+def test_full_queue_is_shed_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, max_wait_seconds=5)
+        ticket = await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        assert controller.waiting == 1
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire()
+        assert rejected.value.reason == "queue_full"
+        assert rejected.value.retry_after >= 1
+        ticket.release()
+        (await waiter).release()
+        assert controller.active == 0
+        assert controller.snapshot()["shedTotal"] == {"queue_full": 1, "timeout": 0}
+
+    asyncio.run(scenario())
+
+
+def test_queued_request_times_out():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=4, max_wait_seconds=0.05)
+        async with controller.slot():
+            with pytest.raises(AdmissionRejected) as rejected:
+                await controller.acquire()
+        assert rejected.value.reason == "timeout"
+        assert controller.waiting == 0
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_try_acquire_does_not_wait():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1)
+        ticket = await controller.try_acquire()
+        assert ticket is not None
+        assert await controller.try_acquire() is None
+        ticket.release()
+        ticket.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_search_endpoint_answers_503_when_shedding(monkeypatch):
+    monkeypatch.setattr(main, "admission", AdmissionController(max_concurrent=0, max_queue=0))
+    with TestClient(main.app) as client:
+        response = client.post("/api/search", json={"region": "admission-test"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_search_trace_is_marked_cancelled_only_on_cancellation(monkeypatch):
+    async def slow_search(**kwargs):
+        await asyncio.sleep(10)
+        return []
+
+    async def fast_search(**kwargs):
+        return []
+
+    async def scenario():
+        monkeypatch.setattr(main, "search_universities", fast_search)
+        response = main.Response()
+        await main.search_endpoint(main.SearchRequest(region="trace-ok"), response)
+        finished = main.trace_exporter.get(response.headers["X-Trace-Id"])
+
+        monkeypatch.setattr(main, "search_universities", slow_search)
+        response = main.Response()
+        task = asyncio.create_task(main.search_endpoint(main.SearchRequest(region="trace-cancel"), response))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        cancelled = main.trace_exporter.get(response.headers["X-Trace-Id"])
+        return finished, cancelled
+
+    monkeypatch.setattr(main, "admission", AdmissionController(max_concurrent=1))
+    finished, cancelled = asyncio.run(scenario())
+    assert finished["status"] == "ok"
+    assert cancelled["status"] == "cancelled"
+    assert main.admission.active == 0
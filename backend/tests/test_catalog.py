@@ -0,0 +1,90 @@
+import pytest
+
+from services import entities
+from services.catalog import UniversityCatalog
+from services.entities import entity_id
+
+
+def _uni(name: str, faculty: str = "工学部", **fields) -> dict:
+    university = {"name": name, "faculty": faculty, "examType": "一般選抜", **fields}
+    university["id"] = entity_id(university)
+    return university
+
+
+def _catalog() -> UniversityCatalog:
+    return UniversityCatalog(":memory:")
+
+
+def test_tags_come_from_the_record():
+    catalog = _catalog()
+    catalog.store([_uni("東京大学", institutionType="国立", region="関東")], {}, now=100.0)
+    assert [uni["name"] for uni in catalog.search({"institution_type": "国立"}, now=100.0)] == ["東京大学"]
+    assert [uni["name"] for uni in catalog.search({"region": "関東"}, now=100.0)] == ["東京大学"]
+
+
+def test_filters_tag_only_verified_records():
+    catalog = _catalog()
+    verified = _uni("東京大学")
+    unverified = _uni("京都大学")
+    catalog.store([verified, unverified], {"region": "関東"}, now=100.0, verified={verified["id"]})
+    assert [uni["name"] for uni in catalog.search({"region": "関東"}, now=100.0)] == ["東京大学"]
+
+
+def test_known_tags_are_not_cleared():
+    catalog = _catalog()
+    university = _uni("東京大学")
+    catalog.store([university], {"prefecture": "東京都"}, now=100.0, verified={university["id"]})
+    catalog.store([university], {}, now=200.0)
+    assert len(catalog.search({"prefecture": "東京都"}, now=200.0)) == 1
+
+
+def test_stale_records_are_not_returned():
+    catalog = _catalog()
+    catalog.store([_uni("東京大学", region="関東")], {}, now=0.0)
+    assert catalog.search({"region": "関東"}, now=10 * 24 * 3600.0) == []
+
+
+def test_catalog_file_is_created_in_its_directory(tmp_path):
+    catalog = UniversityCatalog(str(tmp_path / "data" / "catalog.sqlite3"))
+    catalog.store([_uni("東京大学")], {}, now=100.0)
+    catalog.close()
+    assert (tmp_path / "data" / "catalog.sqlite3").exists()
+
+
+def _sql_catalog() -> UniversityCatalog:
+    catalog = UniversityCatalog(":memory:")
+    catalog._columns = None
+    return catalog
+
+
+PARITY_RECORDS = [
+    _uni("東京大学", "工学部", region="関東", prefecture="東京都", institutionType="国立", deviationScore="67.5",
+         requiredSubjects=["数学", "物理"]),
+    _uni("東京科学大学", "理学部", region="関東", prefecture="東京都", institutionType="国立", deviationScore="65"),
+    _uni("早稲田大学", "文学部", region="関東", prefecture="東京都", institutionType="私立", deviationScore="60-62.5",
+         requiredSubjects=["英語", "国語"]),
+    _uni("京都大学", "工学部", region="近畿", prefecture="京都府", institutionType="国立", deviationScore="65-67.5",
+         requiredSubjects=["数学"]),
+]
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {"region": "関東"},
+        {"faculty": "工学"},
+        {"faculty": "工学部別名"},
+        {"name_keyword": "東工大"},
+        {"institution_type": "国立", "deviation_score": "66-70"},
+        {"required_subjects": "数学"},
+        {"prefecture": "大阪府"},
+    ],
+)
+def test_sql_and_columnar_backends_agree(monkeypatch, filters):
+    monkeypatch.setitem(entities.ALIASES["faculty"], "工学部別名", "工学部")
+    columnar, sql = _catalog(), _sql_catalog()
+    assert columnar._columns is not None
+    for catalog in (columnar, sql):
+        catalog.store(PARITY_RECORDS, {}, now=100.0)
+    expected = [uni["id"] for uni in sql.search(filters, now=100.0)]
+    assert [uni["id"] for uni in columnar.search(filters, now=100.0)] == expected
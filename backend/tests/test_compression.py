@@ -0,0 +1,135 @@
+import asyncio
+import zlib
+
+import pytest
+
+from services.compression import (
+    CompressionMiddleware,
+    CompressionStats,
+    negotiate_encoding,
+    parse_exclude_paths,
+)
+
+EVENTS = [b"event: progress\ndata: {\"step\": %d}\n\n" % step for step in range(3)]
+
+
+def _buffered_app(body: bytes, content_type: bytes = b"application/json"):
+    async def app(scope, receive, send):
+        headers = [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body, "more_body": False})
+
+    return app
+
+
+async def _event_stream_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+    for event in EVENTS:
+        await send({"type": "http.response.body", "body": event, "more_body": True})
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _call(middleware, path: str = "/api/search", accept_encoding: str = "gzip") -> list:
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return messages
+
+
+def _headers(message: dict) -> dict:
+    return {key.decode(): value.decode() for key, value in message["headers"]}
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip, deflate", "gzip"),
+        ("br;q=0.5, gzip;q=0.8", "gzip"),
+        ("gzip;q=0", None),
+        ("*", "gzip"),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header, supported=("gzip",)) == expected
+
+
+def test_negotiate_prefers_earlier_encoding_on_tie():
+    assert negotiate_encoding("gzip, br", supported=("br", "gzip")) == "br"
+    assert negotiate_encoding("gzip, br;q=0.9", supported=("br", "gzip")) == "gzip"
+
+
+def test_parse_exclude_paths():
+    assert parse_exclude_paths(" /metrics, ,/api/health ") == ["/metrics", "/api/health"]
+    assert parse_exclude_paths("") == []
+
+
+def test_large_response_is_gzipped():
+    body = b'{"universities": []}' * 100
+    stats = CompressionStats()
+    start, message = _call(CompressionMiddleware(_buffered_app(body), minimum_size=512, stats=stats))
+
+    headers = _headers(start)
+    assert headers["content-encoding"] == "gzip"
+    assert headers["content-length"] == str(len(message["body"]))
+    assert "Accept-Encoding" in headers["vary"]
+    assert zlib.decompress(message["body"], 31) == body
+    assert stats.snapshot()["encodings"]["gzip"]["responses"] == 1
+
+
+def test_small_response_is_sent_uncompressed():
+    body = b'{"status": "ok"}'
+    stats = CompressionStats()
+    start, message = _call(CompressionMiddleware(_buffered_app(body), minimum_size=512, stats=stats))
+
+    assert "content-encoding" not in _headers(start)
+    assert message["body"] == body
+    assert stats.skipped_small == 1
+
+
+def test_excluded_path_and_missing_accept_encoding_pass_through():
+    body = b"x" * 4096
+    middleware = CompressionMiddleware(_buffered_app(body), minimum_size=16, exclude_paths=["/metrics"])
+
+    for messages in (_call(middleware, path="/metrics"), _call(middleware, accept_encoding="")):
+        start, message = messages
+        assert "content-encoding" not in _headers(start)
+        assert message["body"] == body
+
+
+def test_event_stream_flushes_every_event():
+    stats = CompressionStats()
+    messages = _call(CompressionMiddleware(_event_stream_app, minimum_size=1024, stats=stats))
+    start, *chunks = messages
+
+    assert _headers(start)["content-encoding"] == "gzip"
+    decompressor = zlib.decompressobj(31)
+    # イベントごとに flush されていれば、各チャンクだけで該当イベントを復元できる
+    for event, chunk in zip(EVENTS, chunks):
+        assert chunk["more_body"] is True
+        assert decompressor.decompress(chunk["body"]) == event
+    assert chunks[-1]["more_body"] is False
+    assert decompressor.decompress(chunks[-1]["body"]) == b""
+    assert decompressor.eof
+    assert stats.snapshot()["encodings"]["gzip"]["responses"] == 1
+
+
+def test_event_stream_compression_can_be_disabled():
+    messages = _call(CompressionMiddleware(_event_stream_app, compress_event_streams=False))
+    start, *chunks = messages
+
+    assert "content-encoding" not in _headers(start)
+    assert [chunk["body"] for chunk in chunks[:-1]] == EVENTS
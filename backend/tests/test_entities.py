@@ -0,0 +1,42 @@
+import pytest
+
+from services.entities import canonical_value, entity_id, resolve_entities
+
+
+def _uni(name: str, faculty: str, exam_type: str = "一般選抜") -> dict:
+    return {"name": name, "faculty": faculty, "examType": exam_type}
+
+
+def _first(group):
+    return group[0]
+
+
+@pytest.mark.parametrize(
+    "left, right",
+    [("理工学部", "工学部"), ("理学部", "理工学部"), ("文学部", "人文学部"), ("経済学部", "経営学部")],
+)
+def test_distinct_faculties_are_not_merged(left, right):
+    resolved = resolve_entities([_uni("日本大学", left), _uni("日本大学", right)], _first)
+    assert [uni["faculty"] for uni in resolved] == [left, right]
+
+
+def test_normalized_faculties_are_merged():
+    resolved = resolve_entities([_uni("日本大学", "理工学部"), _uni("日本大学", " 理工学部 ")], _first)
+    assert len(resolved) == 1
+
+
+def test_aliased_names_and_exam_types_are_merged():
+    resolved = resolve_entities(
+        [_uni("東京科学大学", "工学部"), _uni("東京工業大学", "工学部", "一般入試")], _first
+    )
+    assert len(resolved) == 1
+
+
+def test_different_institution_kinds_are_not_merged():
+    resolved = resolve_entities([_uni("東京大学", "工学部"), _uni("東京大学院", "工学部")], _first)
+    assert len(resolved) == 2
+
+
+def test_entity_id_is_stable_across_aliases():
+    assert entity_id(_uni("東京工業大学", "工学部")) == entity_id(_uni("東京科学大学", "工学部"))
+    assert canonical_value("examType", "ＡＯ入試") == "総合型選抜"
@@ -0,0 +1,71 @@
+import pytest
+
+from benchmarks import bench_hotpaths
+from services.summarize import _dedupe_by_source, _ensure_list_of_strings, _select_official_url
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (["数学", " ", 1], ["数学", "1"]),
+        ("数学、英語・国語", ["数学、英語", "国語"]),
+        ("数学・英語", ["数学", "英語"]),
+        ("数学", ["数学"]),
+        (None, []),
+    ],
+)
+def test_ensure_list_of_strings(value, expected):
+    assert _ensure_list_of_strings(value) == expected
+
+
+def test_select_official_url_prefers_official_site():
+    sources = ["https://passnavi.obunsha.co.jp/univ/1", "https://www.kyoto-u.ac.jp/admissions"]
+    assert _select_official_url("", sources) == "https://www.kyoto-u.ac.jp/admissions"
+    assert _select_official_url(None, []) == ""
+
+
+def test_dedupe_by_source_keeps_most_trusted_entry():
+    blog = {"name": "京都大学", "faculty": "工学部", "examType": "一般選抜", "sources": ["https://blog.example.com/1"]}
+    passnavi = {**blog, "sources": ["https://passnavi.obunsha.co.jp/univ/1"]}
+    other_exam = {**blog, "examType": "総合型選抜"}
+    assert _dedupe_by_source([blog, passnavi, other_exam]) == [passnavi, other_exam]
+
+
+def test_datasets_are_seeded():
+    assert bench_hotpaths.build_raw_entries(20) == bench_hotpaths.build_raw_entries(20)
+    assert bench_hotpaths.build_search_results(20) == bench_hotpaths.build_search_results(20)
+
+
+def test_cases_run_and_baseline_covers_them():
+    cases = bench_hotpaths.build_cases(50)
+    for _, func in cases:
+        func()
+    baseline = bench_hotpaths.load_baseline()
+    expected = {f"{name}[{size}]" for size in bench_hotpaths.SIZES for name, _ in cases}
+    assert expected <= set(baseline["results"])
+
+
+def test_compare_flags_only_slowdowns_above_threshold():
+    baseline = {"results": {"a[100]": {"median_ms": 1.0}, "b[100]": {"median_ms": 2.0}}}
+    results = {
+        "a[100]": {"median_ms": 1.2},
+        "b[100]": {"median_ms": 3.0},
+        "new[100]": {"median_ms": 9.0},
+    }
+    regressions = bench_hotpaths.compare(results, baseline, threshold=0.25)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("b[100]")
+
+
+def test_save_and_load_baseline(tmp_path):
+    path = str(tmp_path / "baselines" / "hotpaths.json")
+    results = {"a[100]": {"min_ms": 1.0, "median_ms": 1.1, "stddev_ms": 0.1, "rounds": 5}}
+    bench_hotpaths.save_baseline(results, path)
+    assert bench_hotpaths.load_baseline(path)["results"] == results
+    assert bench_hotpaths.load_baseline(str(tmp_path / "missing.json")) is None
+
+
+def test_compare_mode_exits_nonzero_without_baseline(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(bench_hotpaths, "run", lambda rounds: {"a[100]": {"min_ms": 1, "median_ms": 1, "stddev_ms": 0, "rounds": 1}})
+    assert bench_hotpaths.main(["--compare", "--baseline", str(tmp_path / "missing.json")]) == 1
+    assert "run with --save first" in capsys.readouterr().out
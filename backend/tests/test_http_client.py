@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from services import http_client
+from services.http_client import Budget, CassetteMiss, UpstreamUsage, classify_upstream, track_usage, use_cassette
+
+HF_URL = "https://router.huggingface.co/v1/chat/completions"
+TAVILY_URL = "https://api.tavily.com/search"
+
+
+def _upstream(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content)
+    if "chat/completions" in str(request.url):
+        usage = {"prompt_tokens": 120, "completion_tokens": 30}
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}], "usage": usage})
+    return httpx.Response(200, json={"query": body["query"], "results": []}, headers={"x-request-id": "abc"})
+
+
+async def _post(url: str, payload: dict, transport=None) -> httpx.Response:
+    async with http_client.create_client(transport=transport) as client:
+        return await client.post(url, json=payload, headers={"Authorization": "Bearer secret"})
+
+
+def test_record_then_replay_offline(tmp_path):
+    path = str(tmp_path / "cassettes" / "search.json")
+    transport = httpx.MockTransport(_upstream)
+
+    async def record():
+        with use_cassette(path, "record") as cassette:
+            await _post(TAVILY_URL, {"query": "関東 工学部", "api_key": "tvly-secret"}, transport)
+            await _post(HF_URL, {"messages": [{"role": "user", "content": "hi"}]}, transport)
+        return cassette
+
+    recorded = asyncio.run(record())
+    assert recorded.usage.to_dict()["calls"] == {"hf": 1, "tavily": 1}
+
+    text = open(path, encoding="utf-8").read()
+    assert "secret" not in text
+    interaction = json.loads(text)["interactions"][0]
+    assert "authorization" not in {key.lower() for key in interaction["request"]["headers"]}
+    assert set(interaction["response"]["headers"]) == {"content-type"}
+
+    async def replay():
+        with use_cassette(path) as cassette:
+            # api_key はキーに含まれないため、別のキーでも再生できる
+            tavily = await _post(TAVILY_URL, {"query": "関東 工学部", "api_key": "other"})
+            hf = await _post(HF_URL, {"messages": [{"role": "user", "content": "hi"}]})
+        return cassette, tavily, hf
+
+    cassette, tavily, hf = asyncio.run(replay())
+    assert tavily.json()["query"] == "関東 工学部"
+    assert hf.json()["choices"][0]["message"]["content"] == "ok"
+    assert cassette.usage.prompt_tokens == 120
+    assert cassette.usage.completion_tokens == 30
+    assert cassette.misses == []
+
+
+def test_replay_miss_raises_and_is_reported(tmp_path):
+    path = tmp_path / "empty.json"
+    path.write_text(json.dumps({"version": 1, "interactions": []}), encoding="utf-8")
+
+    async def scenario():
+        with use_cassette(str(path)) as cassette:
+            with pytest.raises(CassetteMiss):
+                await _post(TAVILY_URL, {"query": "q"})
+        return cassette
+
+    assert len(asyncio.run(scenario()).misses) == 1
+
+
+def test_repeated_requests_replay_in_recording_order(tmp_path):
+    path = str(tmp_path / "retry.json")
+    statuses = iter([429, 200])
+    transport = httpx.MockTransport(lambda request: httpx.Response(next(statuses), json={}, headers={"Retry-After": "1"}))
+
+    async def scenario(mode, transport=None):
+        with use_cassette(path, mode):
+            return [(await _post(TAVILY_URL, {"query": "q"}, transport)).status_code for _ in range(2)]
+
+    assert asyncio.run(scenario("record", transport)) == [429, 200]
+    assert asyncio.run(scenario("replay")) == [429, 200]
+
+
+def test_token_usage_from_streamed_completion():
+    stream = (
+        'data: {"choices": [{"delta": {"content": "a"}}]}\n\n'
+        'data: {"choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": 4}}\n\n'
+        "data: [DONE]\n\n"
+    )
+    usage = UpstreamUsage()
+    usage.record(httpx.Request("POST", HF_URL), 200, stream.encode("utf-8"))
+    assert (usage.prompt_tokens, usage.completion_tokens) == (10, 4)
+
+
+def test_budget_violations():
+    usage = UpstreamUsage(prompt_tokens=500, completion_tokens=50, bytes_sent=100, bytes_received=950)
+    usage.calls.update({"hf": 3, "tavily": 1})
+    budget = Budget.from_dict({"calls": {"hf": 2, "tavily": 5}, "promptTokens": 400, "completionTokens": 50, "bytes": 1000})
+    assert budget.violations(usage) == ["hf calls 3 > 2", "prompt tokens 500 > 400", "bytes 1050 > 1000"]
+    assert Budget().violations(usage) == []
+
+
+def test_track_usage_counts_calls_per_task():
+    transport = httpx.MockTransport(_upstream)
+
+    async def scenario():
+        with track_usage() as usage:
+            await asyncio.gather(
+                _post(TAVILY_URL, {"query": "q"}, transport),
+                asyncio.create_task(_post(HF_URL, {"messages": []}, transport)),
+            )
+        await _post(TAVILY_URL, {"query": "untracked"}, transport)
+        return usage
+
+    assert dict(asyncio.run(scenario()).calls) == {"tavily": 1, "hf": 1}
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        (HF_URL, "hf"),
+        ("http://127.0.0.1:8100/tavily/search", "tavily"),
+        ("https://google.serper.dev/search", "serper"),
+        ("https://www.kyoto-u.ac.jp/", "www.kyoto-u.ac.jp"),
+    ],
+)
+def test_classify_upstream(url, expected):
+    assert classify_upstream(url) == expected
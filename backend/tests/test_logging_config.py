@@ -0,0 +1,104 @@
+import asyncio
+import json
+import logging
+import queue
+
+from services import logging_config
+from services.logging_config import (
+    CategorySamplingFilter,
+    JsonFormatter,
+    RequestContextFilter,
+    RequestIdMiddleware,
+    parse_category_values,
+    request_id_var,
+)
+
+
+def _record(message: str, *args, **extra) -> logging.LogRecord:
+    record = logging.makeLogRecord({"name": "services.summarize", "levelname": "INFO", "levelno": logging.INFO})
+    record.msg, record.args = message, args
+    record.__dict__.update(extra)
+    return record
+
+
+def test_parse_category_values():
+    assert parse_category_values("payload=0.1, prompt=5,bad=x,,") == {"payload": 0.1, "prompt": 5.0}
+
+
+def test_records_without_category_always_pass():
+    sampling = CategorySamplingFilter({"payload": 0.0}, {"payload": 1})
+    assert all(sampling.filter(_record("plain")) for _ in range(10))
+
+
+def test_rate_limit_drops_and_reports_count():
+    sampling = CategorySamplingFilter({}, {"payload": 2})
+    records = [_record("payload %d", index, category="payload") for index in range(5)]
+    assert [sampling.filter(record) for record in records] == [True, True, False, False, False]
+
+    # トークンが補充されたら、捨てた件数を次のレコードに付ける
+    sampling._buckets["payload"] = (1.0, sampling._buckets["payload"][1])
+    record = _record("payload %d", 5, category="payload")
+    assert sampling.filter(record)
+    assert record.getMessage() == "payload 5 [3 similar records dropped]"
+
+
+def test_sample_rate_zero_drops_everything():
+    sampling = CategorySamplingFilter({"payload": 0.0}, {})
+    assert not any(sampling.filter(_record("x", category="payload")) for _ in range(5))
+
+
+def test_long_payload_is_truncated_once():
+    sampling = CategorySamplingFilter({}, {}, max_chars=10)
+    record = _record("%s", "あ" * 25, category="payload")
+    assert sampling.filter(record)
+    assert record.getMessage() == "あ" * 10 + "... [15 chars truncated]"
+    assert record.args is None
+
+
+def test_json_formatter_includes_request_id_category_and_extras():
+    token = request_id_var.set("req-1")
+    try:
+        record = _record("検索 %s", "工学部", category="payload", durationMs=12)
+        RequestContextFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+
+    data = json.loads(JsonFormatter().format(record))
+    assert data["message"] == "検索 工学部"
+    assert data["requestId"] == "req-1"
+    assert data["category"] == "payload"
+    assert data["durationMs"] == 12
+    assert data["level"] == "INFO"
+
+
+def test_full_queue_drops_instead_of_blocking(monkeypatch):
+    monkeypatch.setattr(logging_config._DroppingQueueHandler, "dropped", 0)
+    handler = logging_config._DroppingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(_record("first"))
+    handler.handle(_record("second"))
+    assert handler.queue.qsize() == 1
+    assert logging_config._DroppingQueueHandler.dropped == 1
+
+
+def _run_middleware(headers: list) -> tuple:
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(request_id_var.get())
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(RequestIdMiddleware(app)({"type": "http", "headers": headers}, None, send))
+    return seen[0], dict(sent[0]["headers"])[b"x-request-id"].decode()
+
+
+def test_request_id_is_propagated_or_generated():
+    assert _run_middleware([(b"x-request-id", b"abc")]) == ("abc", "abc")
+    generated, echoed = _run_middleware([])
+    assert generated == echoed
+    assert len(generated) == 16
+    assert request_id_var.get() == ""
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from services.loop_monitor import LoopLagMonitor, sample_stacks
+
+
+def _blocking_handler():
+    time.sleep(0.3)
+
+
+def test_stall_is_captured_with_the_blocking_stack():
+    async def scenario():
+        monitor = LoopLagMonitor(interval=0.01, slow_threshold=0.1)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        _blocking_handler()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(scenario())
+    snapshot = monitor.snapshot()
+    assert not snapshot["running"]
+    assert snapshot["samples"] > 0
+    assert snapshot["lagMs"]["max"] >= 200
+    (stall,) = snapshot["stalls"]
+    # ループ復帰後に実際の停止時間で更新される
+    assert stall["blockedMs"] >= 200
+    assert any("_blocking_handler" in line for line in stall["stack"])
+
+
+def test_idle_loop_records_no_stalls():
+    async def scenario():
+        monitor = LoopLagMonitor(interval=0.01, slow_threshold=0.2)
+        monitor.start()
+        monitor.start()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+        return monitor
+
+    snapshot = asyncio.run(scenario()).snapshot()
+    assert snapshot["stalls"] == []
+    assert snapshot["lagMs"]["p50"] < 50
+
+
+def test_sample_stacks_returns_collapsed_stacks():
+    stop = threading.Event()
+
+    def busy_worker():
+        while not stop.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy_worker, name="busy")
+    thread.start()
+    try:
+        collapsed = sample_stacks(0.05, interval=0.001)
+    finally:
+        stop.set()
+        thread.join()
+
+    lines = collapsed.strip().splitlines()
+    busy = [line for line in lines if line.startswith("busy;")]
+    assert busy
+    stack, count = busy[0].rsplit(" ", 1)
+    assert "busy_worker" in stack.split(";")[-1]
+    assert int(count) >= 1
+
+
+def test_profile_endpoint_requires_token(monkeypatch):
+    monkeypatch.setattr(main, "PROFILE_TOKEN", "")
+    with TestClient(main.app) as client:
+        assert client.get("/debug/profile").status_code == 404
+
+        monkeypatch.setattr(main, "PROFILE_TOKEN", "token")
+        assert client.get("/debug/profile", headers={"X-Profile-Token": "wrong"}).status_code == 403
+        response = client.get("/debug/profile", params={"seconds": 0.05}, headers={"X-Profile-Token": "token"})
+        assert response.status_code == 200
+        assert "attachment" in response.headers["content-disposition"]
@@ -0,0 +1,58 @@
+import asyncio
+import contextlib
+import time
+
+import httpx
+
+import services.summarize as summarize
+from services.metrics import MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_seconds", "Test durations", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+    histogram.observe(5.0, stage="a")
+    lines = registry.render().splitlines()
+    assert 'test_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="a",le="1"} 2' in lines
+    assert 'test_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="a"} 3' in lines
+
+
+def test_counter_labels_and_callbacks():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "Test events", ["result"])
+    counter.inc(result="hit")
+    counter.inc(2, result="hit")
+    registry.gauge("test_ratio", "Test ratio", callback=lambda: [({}, 0.25)])
+    lines = registry.render().splitlines()
+    assert 'test_total{result="hit"} 3' in lines
+    assert "test_ratio 0.25" in lines
+    assert registry.counter("test_total", "Registered again") is counter
+
+
+def test_hf_upstream_duration_excludes_backoff(monkeypatch):
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0.3"}),
+        httpx.Response(200, json={"choices": [{"message": {"role": "assistant", "content": "{}"}}]}),
+    ]
+
+    @contextlib.asynccontextmanager
+    async def client():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(lambda request: responses.pop(0))) as mock:
+            yield mock
+
+    observed = []
+    monkeypatch.setattr(summarize, "HF_API_KEY", "test")
+    monkeypatch.setattr(summarize, "upstream_client", client)
+    monkeypatch.setattr(
+        summarize.UPSTREAM_DURATION, "observe", lambda value, **labels: observed.append((value, labels["status"]))
+    )
+
+    started = time.perf_counter()
+    asyncio.run(summarize.query_hf_inference([{"role": "user", "content": "test"}], max_retries=2))
+    assert time.perf_counter() - started >= 0.3
+    assert [status for _, status in observed] == ["429", "200"]
+    assert all(value < 0.3 for value, _ in observed)
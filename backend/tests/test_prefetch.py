@@ -0,0 +1,74 @@
+import asyncio
+
+from services.admission import AdmissionController
+from services.logging_config import request_id_var
+from services.prefetch import SpeculativePrefetcher, neighbouring_prefectures
+from services.refresh import FilterPopularity
+from services.result_cache import SearchResultCache
+
+
+def _prefetcher(derive=None, fetch=None, **options) -> SpeculativePrefetcher:
+    async def no_derive(parent, filters):
+        return parent
+
+    async def no_fetch(filters):
+        return []
+
+    return SpeculativePrefetcher(
+        SearchResultCache(ttl_seconds=60),
+        FilterPopularity(),
+        derive=derive or no_derive,
+        fetch=fetch or no_fetch,
+        enabled=True,
+        **options,
+    )
+
+
+def test_neighbouring_prefectures():
+    assert neighbouring_prefectures("東京都") == ["千葉県", "神奈川県"]
+    assert neighbouring_prefectures("北海道") == []
+    assert neighbouring_prefectures("") == []
+
+
+def test_worker_does_not_inherit_request_context():
+    seen = []
+
+    async def derive(parent, filters):
+        seen.append(request_id_var.get())
+        return parent
+
+    async def scenario():
+        prefetcher = _prefetcher(derive=derive, neighbours=False)
+        request_id_var.set("first-request")
+        prefetcher.schedule({"region": "関東"}, [{"name": "東京大学"}])
+        await prefetcher._queue.join()
+        await prefetcher.stop()
+
+    asyncio.run(scenario())
+    assert seen and all(request_id == "" for request_id in seen)
+
+
+def test_prefetch_needs_a_free_admission_slot():
+    calls = []
+
+    async def derive(parent, filters):
+        calls.append(admission.active)
+        return parent
+
+    admission = AdmissionController(max_concurrent=1)
+
+    async def scenario():
+        prefetcher = _prefetcher(derive=derive, neighbours=False, admission=admission)
+        async with admission.slot():
+            prefetcher.schedule({"region": "関東"}, [{"name": "東京大学"}])
+            await prefetcher._queue.join()
+        assert calls == []
+        prefetcher.schedule({"region": "近畿"}, [{"name": "京都大学"}])
+        await prefetcher._queue.join()
+        await prefetcher.stop()
+        return prefetcher
+
+    prefetcher = asyncio.run(scenario())
+    assert calls and all(active == 1 for active in calls)
+    assert admission.active == 0
+    assert prefetcher.snapshot()["runs"].get("derive:busy", 0) >= 1
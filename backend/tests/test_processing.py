@@ -0,0 +1,57 @@
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+
+from services import processing
+from services.processing import estimate_size, run_cpu
+from services.summarize import _extract_university_array
+
+CONTENT = "以下が結果です。\n" + json.dumps([{"name": "京都大学", "faculty": "工学部"}], ensure_ascii=False) + "\n以上"
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    monkeypatch.setattr(processing, "PROCESSING_INLINE_MAX", 100)
+    monkeypatch.setattr(processing, "PROCESSING_PROCESS_MIN", 10000)
+    yield
+    processing.shutdown_pools()
+
+
+def _thread_ident() -> int:
+    return threading.get_ident()
+
+
+@pytest.mark.parametrize("size, inline", [(10, True), (1000, False)])
+def test_size_selects_inline_or_thread_pool(pools, size, inline):
+    async def scenario():
+        return threading.get_ident(), await run_cpu(_thread_ident, size=size)
+
+    loop_thread, worker_thread = asyncio.run(scenario())
+    assert (loop_thread == worker_thread) is inline
+
+
+def test_large_payloads_run_in_a_process(pools):
+    async def scenario():
+        return await run_cpu(os.getpid, size=10000), await run_cpu(_extract_university_array, CONTENT, size=10000)
+
+    pid, universities = asyncio.run(scenario())
+    assert pid != os.getpid()
+    assert universities == _extract_university_array(CONTENT) == [{"name": "京都大学", "faculty": "工学部"}]
+
+
+def test_process_pool_can_be_disabled(pools, monkeypatch):
+    monkeypatch.setattr(processing, "PROCESSING_PROCESS_MIN", 0)
+    assert asyncio.run(run_cpu(os.getpid, size=10 ** 9)) == os.getpid()
+    assert processing._process_pool is None
+
+
+def test_errors_propagate_from_the_pool(pools):
+    with pytest.raises(ValueError):
+        asyncio.run(run_cpu(_extract_university_array, "[{broken", size=1000))
+
+
+def test_estimate_size():
+    assert estimate_size([{}] * 3) == 3 * processing.ENTRY_SIZE_ESTIMATE
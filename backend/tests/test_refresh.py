@@ -0,0 +1,152 @@
+import asyncio
+from datetime import datetime
+
+import httpx
+import pytest
+
+from services.http_client import create_client
+from services.refresh import FilterPopularity, RefreshScheduler, parse_hours
+from services.schedules import JST
+
+HOUR = 3600
+NIGHT = datetime(2026, 1, 10, 3, 0, tzinfo=JST).timestamp()
+DAY = datetime(2026, 1, 10, 14, 0, tzinfo=JST).timestamp()
+
+KANTO = {"region": "関東", "faculty": "工学部"}
+KINKI = {"region": "近畿", "faculty": "経済学部"}
+
+
+def _refresher(calls_per_refresh: int = 2, fail: bool = False):
+    refreshed = []
+
+    async def refresh(filters):
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, json={}))
+        async with create_client(transport=transport) as client:
+            for _ in range(calls_per_refresh):
+                await client.post("https://api.tavily.com/search", json=filters)
+        if fail:
+            raise RuntimeError("upstream down")
+        refreshed.append(filters)
+        return [{"name": "京都大学"}]
+
+    return refresh, refreshed
+
+
+def _scheduler(popularity, refresh, **kwargs):
+    options = {"min_requests": 2, "hours": "2-6", "budget_calls": 5, "max_age_hours": 24, "jitter": 0.25}
+    options.update(kwargs)
+    return RefreshScheduler(popularity, refresh, **options)
+
+
+def _popularity(now=NIGHT):
+    popularity = FilterPopularity(half_life_hours=72)
+    for filters, count in ((KANTO, 3), (KINKI, 2), ({"region": "九州"}, 1)):
+        for _ in range(count):
+            popularity.record(filters, now=now - HOUR)
+    return popularity
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2-6", {2, 3, 4, 5}),
+        ("23-2", {23, 0, 1}),
+        ("5", {5}),
+        ("1-2, 4-5", {1, 4}),
+        ("", set()),
+        ("x-3", set()),
+    ],
+)
+def test_parse_hours(value, expected):
+    assert parse_hours(value) == expected
+
+
+def test_popularity_decays_and_ranks():
+    popularity = FilterPopularity(half_life_hours=1)
+    popularity.record(KANTO, now=0)
+    popularity.record(KANTO, now=0)
+    popularity.record(KINKI, now=HOUR)
+    assert popularity.score(KANTO, now=HOUR) == pytest.approx(1.0)
+    assert popularity.score({"region": "北海道"}) == 0.0
+    top = popularity.top(5, now=HOUR)
+    assert [entry["filters"] for entry in top] == [KANTO, KINKI]
+    assert [entry["filters"] for entry in popularity.top(5, min_requests=2, now=HOUR)] == [KANTO]
+
+
+def test_popularity_evicts_least_requested():
+    popularity = FilterPopularity(max_entries=3)
+    for index in range(3):
+        popularity.record({"region": "関東", "faculty": f"学部{index}"}, now=0)
+        popularity.record({"region": "関東", "faculty": f"学部{index}"}, now=0)
+    popularity.record({"region": "九州"}, now=0)
+    assert len(popularity) == 3
+    assert popularity.score({"region": "九州"}, now=0) == 0.0
+
+
+def test_refreshes_most_popular_due_set_at_night():
+    refresh, refreshed = _refresher()
+    popularity = _popularity()
+    scheduler = _scheduler(popularity, refresh)
+
+    assert asyncio.run(scheduler.tick(now=DAY)) == "off_hours"
+    assert asyncio.run(scheduler.tick(now=NIGHT)) == "refreshed"
+    assert refreshed == [KANTO]
+    assert scheduler.last_run["upstreamCalls"] == 2
+    # 試行済みの条件は再試行間隔が過ぎるまで選ばれない
+    assert asyncio.run(scheduler.tick(now=NIGHT + 60)) == "refreshed"
+    assert refreshed == [KANTO, KINKI]
+    assert asyncio.run(scheduler.tick(now=NIGHT + 120)) == "idle"
+
+
+def test_fresh_results_are_not_due_until_their_period():
+    refresh, refreshed = _refresher()
+    popularity = _popularity()
+    popularity.mark_fetched(KANTO, now=NIGHT - HOUR)
+    popularity.mark_fetched(KINKI, now=NIGHT - HOUR)
+    scheduler = _scheduler(popularity, refresh)
+
+    assert asyncio.run(scheduler.tick(now=NIGHT)) == "idle"
+    period = scheduler.period(popularity.top(1, now=NIGHT)[0]["key"])
+    assert 18 * HOUR <= period <= 24 * HOUR
+    assert scheduler.coverage(now=NIGHT)["demandShare"] == 1.0
+
+
+def test_budget_stops_refreshes_until_next_window():
+    refresh, refreshed = _refresher(calls_per_refresh=3)
+    popularity = _popularity()
+    scheduler = _scheduler(popularity, refresh, budget_calls=5, retry_minutes=0)
+
+    assert asyncio.run(scheduler.tick(now=NIGHT)) == "refreshed"
+    assert asyncio.run(scheduler.tick(now=NIGHT + 60)) == "budget"
+    assert scheduler.budget_used == 3
+    # 翌日の時間帯では予算がリセットされる
+    assert asyncio.run(scheduler.tick(now=NIGHT + 24 * HOUR)) == "refreshed"
+    assert scheduler.budget_used == 3
+    assert scheduler.runs == {"refreshed": 2, "failed": 0, "budget": 1}
+
+
+def test_failed_refresh_counts_calls_and_waits_for_retry():
+    refresh, _ = _refresher(fail=True)
+    popularity = _popularity()
+    scheduler = _scheduler(popularity, refresh, top_n=1, retry_minutes=60)
+
+    assert asyncio.run(scheduler.tick(now=NIGHT)) == "failed"
+    assert scheduler.budget_used == 2
+    assert scheduler.calls_per_refresh == 0.0
+    assert asyncio.run(scheduler.tick(now=NIGHT + 30 * 60)) == "idle"
+    assert asyncio.run(scheduler.tick(now=NIGHT + 61 * 60)) == "failed"
+
+
+def test_busy_service_skips_refresh():
+    refresh, refreshed = _refresher()
+    scheduler = _scheduler(_popularity(), refresh, is_busy=lambda: True)
+    assert asyncio.run(scheduler.tick(now=NIGHT)) == "busy"
+    assert refreshed == []
+
+
+def test_window_wrapping_midnight_is_counted_from_its_start():
+    scheduler = _scheduler(FilterPopularity(), None, hours="23-2")
+    late = datetime(2026, 1, 10, 23, 30, tzinfo=JST).timestamp()
+    early = datetime(2026, 1, 11, 1, 30, tzinfo=JST).timestamp()
+    assert scheduler._window_id(late) == scheduler._window_id(early) == "2026-01-10 23:00"
+    assert scheduler._window_id(DAY) is None
@@ -0,0 +1,93 @@
+from datetime import date
+
+import pytest
+
+from services.schedules import extract_events, parse_dates, parse_schedule_filter
+
+FORM_FILTER = "実施月: 1月・2月 / 実施日: 1日〜15日"
+
+
+def _uni(*schedules: str) -> dict:
+    university = {"name": "日本大学", "faculty": "理工学部", "examSchedules": list(schedules)}
+    university["scheduleEvents"] = extract_events(university)
+    return university
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("令和7年2月1日", date(2025, 2, 1)),
+        ("令和元年12月1日", date(2019, 12, 1)),
+        ("平成31年1月20日", date(2019, 1, 20)),
+        ("２０２５年２月１日", date(2025, 2, 1)),
+        ("2025/02/01", date(2025, 2, 1)),
+    ],
+)
+def test_single_dates(text, expected):
+    assert parse_dates(text) == ((expected, expected),)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("2025年2月1日〜2月3日", (date(2025, 2, 1), date(2025, 2, 3))),
+        ("2025年2月1日〜3日", (date(2025, 2, 1), date(2025, 2, 3))),
+        ("2025年2月1日(土)～2月3日(月)", (date(2025, 2, 1), date(2025, 2, 3))),
+        ("2024年12月20日から1月10日", (date(2024, 12, 20), date(2025, 1, 10))),
+    ],
+)
+def test_ranges_inherit_year_and_month(text, expected):
+    assert parse_dates(text) == (expected,)
+
+
+def test_dates_without_year_use_academic_year():
+    assert parse_dates("2月1日") == ()
+    assert parse_dates("2月1日", academic_year=2024) == ((date(2025, 2, 1), date(2025, 2, 1)),)
+    assert parse_dates("10月1日", academic_year=2024) == ((date(2024, 10, 1), date(2024, 10, 1)),)
+
+
+def test_unparseable_filter():
+    assert parse_schedule_filter("") is None
+    assert parse_schedule_filter("未定") is None
+
+
+def test_form_filter():
+    schedule_filter = parse_schedule_filter(FORM_FILTER)
+    verdicts = schedule_filter.judge(
+        [_uni("試験日: 2025年2月10日"), _uni("試験日: 2025年2月20日"), _uni("試験日: 2025年3月5日")]
+    )
+    assert verdicts == [True, False, False]
+
+
+def test_entries_without_parsed_dates_are_undetermined():
+    schedule_filter = parse_schedule_filter(FORM_FILTER)
+    verdicts = schedule_filter.judge([_uni("試験日: 2月下旬"), _uni(), _uni("出願締切: 2025年1月10日")])
+    assert verdicts == [None, None, None]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("出願締切: 2025年1月20日以降", [False, True]),
+        ("出願締切: 2025年1月20日まで", [True, False]),
+    ],
+)
+def test_open_ended_deadlines(text, expected):
+    schedule_filter = parse_schedule_filter(text)
+    assert list(schedule_filter.conditions) == ["application_deadline"]
+    verdicts = schedule_filter.judge([_uni("出願締切: 2025年1月10日"), _uni("出願締切: 2025年1月25日")])
+    assert verdicts == expected
+
+
+def test_deadline_uses_last_application_day():
+    schedule_filter = parse_schedule_filter("出願締切: 2025年1月20日以降")
+    verdicts = schedule_filter.judge([_uni("願書受付: 2025年1月6日〜1月24日")])
+    assert verdicts == [True]
+
+
+def test_every_constrained_type_must_be_present():
+    schedule_filter = parse_schedule_filter("出願締切: 2025年1月20日まで / 試験日: 2025年2月1日〜2月10日")
+    both = _uni("出願締切: 2025年1月15日", "試験日: 2025年2月5日")
+    exam_only = _uni("試験日: 2025年2月5日")
+    wrong_exam = _uni("試験日: 2025年2月25日")
+    assert schedule_filter.judge([both, exam_only, wrong_exam]) == [True, None, False]
@@ -0,0 +1,92 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import main
+from services.search_jobs import SearchJobStore
+
+
+async def _collect(job, last_event_id=0):
+    return [event async for event in job.stream(last_event_id)]
+
+
+def test_stream_replays_after_last_event_id_and_follows_new_events():
+    async def scenario():
+        store = SearchJobStore()
+        gate = asyncio.Event()
+
+        async def runner(job):
+            await job.append("progress", {"stage": "searching"})
+            await job.append("university", {"ref": "1"})
+            await gate.wait()
+            await job.append("complete", {"total": 1})
+
+        job = store.create(runner)
+        await asyncio.sleep(0)
+        reader = asyncio.create_task(_collect(job, last_event_id=1))
+        await asyncio.sleep(0)
+        gate.set()
+        events = await reader
+        await job.task
+        return job, events, await _collect(job, last_event_id=5)
+
+    job, events, past_end = asyncio.run(scenario())
+    assert job.status == "completed"
+    assert events == [(2, "university", {"ref": "1"}), (3, "complete", {"total": 1})]
+    assert past_end == []
+
+
+def test_failed_runner_appends_an_error_event():
+    async def scenario():
+        store = SearchJobStore()
+
+        async def runner(job):
+            raise RuntimeError("upstream down")
+
+        job = store.create(runner)
+        await job.task
+        return job, await _collect(job)
+
+    job, events = asyncio.run(scenario())
+    assert job.status == "failed"
+    assert events == [(1, "error", {"message": "upstream down"})]
+
+
+def test_finished_jobs_expire_after_ttl():
+    async def scenario():
+        store = SearchJobStore(ttl_seconds=60)
+
+        async def runner(job):
+            await job.append("complete", {"total": 0})
+
+        job = store.create(runner)
+        await job.task
+        job.finished_at -= 59
+        assert store.get(job.id) is job
+        job.finished_at -= 2
+        assert store.get(job.id) is None
+        assert len(store) == 0
+
+    asyncio.run(scenario())
+
+
+def test_job_events_resume_from_last_event_id_header(monkeypatch):
+    async def fake_search(progress_callback=None, university_callback=None, **kwargs):
+        await progress_callback({"stage": "searching"})
+        university = {"name": "東京大学", "faculty": "工学部", "examType": "一般選抜"}
+        await university_callback(university)
+        return [university]
+
+    monkeypatch.setattr(main, "search_universities", fake_search)
+    with TestClient(main.app) as client:
+        job_id = client.post("/api/search/jobs", json={"region": "jobs-test"}).json()["jobId"]
+        full = client.get(f"/api/search/jobs/{job_id}/events").text
+        resumed = client.get(f"/api/search/jobs/{job_id}/events", headers={"Last-Event-ID": "2"}).text
+        invalid = client.get(f"/api/search/jobs/{job_id}/events", headers={"Last-Event-ID": "x"})
+        missing = client.get("/api/search/jobs/unknown/events")
+
+    assert [line for line in full.splitlines() if line.startswith("id:")] == ["id: 1", "id: 2", "id: 3"]
+    assert [line for line in resumed.splitlines() if line.startswith("id:")] == ["id: 3"]
+    assert "event: complete" in resumed
+    assert invalid.status_code == 400
+    assert missing.status_code == 404
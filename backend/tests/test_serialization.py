@@ -0,0 +1,66 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from services import serialization
+from services.serialization import FastJSONResponse, dumps, format_sse
+from services.summarize import _normalize_university_entry
+
+def _without_nulls(value):
+    if isinstance(value, dict):
+        return {key: _without_nulls(item) for key, item in value.items() if item is not None}
+    if isinstance(value, list):
+        return [_without_nulls(item) for item in value]
+    return value
+
+
+PAYLOAD = {"universities": [{"name": "東京大学", "deviationScore": "67.5", "requiredSubjects": ["数学"]}], "count": 1}
+
+
+@pytest.mark.parametrize("backend", ["orjson", "json"])
+def test_dumps_is_compact_utf8(monkeypatch, backend):
+    if backend == "json":
+        monkeypatch.setattr(serialization, "orjson", None)
+    encoded = dumps(PAYLOAD)
+    assert json.loads(encoded) == PAYLOAD
+    assert "東京大学".encode("utf-8") in encoded
+    assert b", " not in encoded and b": " not in encoded
+
+
+def test_format_sse_frames():
+    assert format_sse("progress", {"stage": "searching"}) == b'event: progress\ndata: {"stage":"searching"}\n\n'
+    assert format_sse("complete", {"total": 0}, event_id=3) == b'id: 3\nevent: complete\ndata: {"total":0}\n\n'
+
+
+def test_fast_json_response_renders_content():
+    response = FastJSONResponse(PAYLOAD)
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == PAYLOAD
+
+
+def test_fast_json_search_response_matches_the_response_model(monkeypatch):
+    university = _normalize_university_entry({
+        "name": "東京大学", "faculty": "工学部", "deviationScore": "67.5", "examType": "一般選抜",
+        "requiredSubjects": ["数学"], "region": "関東", "prefecture": "東京都",
+        "officialUrl": "https://www.u-tokyo.ac.jp/", "examSchedules": ["試験日: 2025年2月25日"],
+    })
+
+    async def fake_search(**kwargs):
+        return [university]
+
+    monkeypatch.setattr(main, "search_universities", fake_search)
+    bodies = {}
+    with TestClient(main.app) as client:
+        for fast_json in (True, False):
+            monkeypatch.setattr(main, "FAST_JSON_ENABLED", fast_json)
+            response = client.post("/api/search", json={"region": f"fast-json-{fast_json}"})
+            assert response.status_code == 200
+            bodies[fast_json] = response.json()
+
+    fast, validated = bodies[True], bodies[False]
+    assert fast["count"] == validated["count"] == 1
+    # 高速経路は正規化済みの値をそのまま返す（モデルが補う null の省略可能フィールドは含まない）
+    expected = _without_nulls(validated["universities"][0])
+    assert {key: fast["universities"][0][key] for key in expected} == expected
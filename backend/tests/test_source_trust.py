@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from services import source_trust
+from services.source_trust import (
+    DEFAULT_TRUST_TABLE,
+    UNKNOWN,
+    SourceTrust,
+    TrustTable,
+    host_of,
+    official_rank,
+    sources_score,
+    trust_score,
+)
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("https://www.kyoto-u.ac.jp/admissions", "www.kyoto-u.ac.jp"),
+        ("HTTP://User@Keinet.ne.jp:8080/univ?id=1", "keinet.ne.jp"),
+        ("//passnavi.obunsha.co.jp/univ/1", "passnavi.obunsha.co.jp"),
+        ("www.dnc.ac.jp./kyotsu", "www.dnc.ac.jp"),
+        ("", ""),
+        (None, ""),
+    ],
+)
+def test_host_of(url, expected):
+    assert host_of(url) == expected
+
+
+@pytest.mark.parametrize(
+    "url, score",
+    [
+        ("https://passnavi.obunsha.co.jp/univ/1", 200),
+        ("https://www.keinet.ne.jp/univ/", 180),
+        ("https://www.dnc.ac.jp/kyotsu/", 150),
+        ("https://www.kyoto-u.ac.jp/", 120),
+        # 接尾辞は最長一致（yozemi.ac.jp は ac.jp より優先）
+        ("https://yozemi.ac.jp/nyushi/", 100),
+        ("https://blog.example.com/ac.jp/", 10),
+        ("https://notac.jp/", 10),
+        ("", 0),
+    ],
+)
+def test_trust_score(url, score):
+    assert trust_score(url) == score
+
+
+def test_sources_score_ignores_non_strings():
+    assert sources_score(["https://www.keinet.ne.jp/", None, 3, "https://example.com/"]) == 190
+    assert sources_score(None) == 0
+
+
+def test_official_rank_order():
+    urls = [
+        "https://example.com/page",
+        "https://www.example.com/",
+        "https://example.com/admissions/",
+        "https://www.kyoto-u.ac.jp/",
+    ]
+    assert sorted(urls, key=official_rank) == list(reversed(urls))
+
+
+def test_added_rule_invalidates_cached_lookups():
+    table = TrustTable(DEFAULT_TRUST_TABLE)
+    url = "https://www.example-juku.jp/univ"
+    assert table.lookup(url) is UNKNOWN
+    table.add("example-juku.jp", SourceTrust(90, label="塾"))
+    assert table.lookup(url).score == 90
+    assert table.lookup_host("sub.www.example-juku.jp").label == "塾"
+
+
+def test_rules_file_overrides_defaults(tmp_path):
+    path = tmp_path / "trust.json"
+    path.write_text(json.dumps({"toshin.com": {"score": 50}, "example.jp": {"score": 130, "official": True}}), encoding="utf-8")
+    rules = source_trust._load_rules(str(path))
+    assert rules["toshin.com"] == SourceTrust(50, label="toshin.com")
+    assert rules["example.jp"].official
+    assert rules["keinet.ne.jp"] == DEFAULT_TRUST_TABLE["keinet.ne.jp"]
+
+
+def test_unreadable_rules_file_keeps_defaults(tmp_path):
+    path = tmp_path / "broken.json"
+    path.write_text("{not json", encoding="utf-8")
+    assert source_trust._load_rules(str(path)) == DEFAULT_TRUST_TABLE
@@ -0,0 +1,105 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import main
+from services.startup import FirstRequestTimer, StartupState
+
+
+def test_startup_state_snapshot():
+    state = StartupState()
+    state.step_started("model")
+    state.step_finished("model", detail="Qwen")
+    state.step_finished("connections", status="error", detail="ConnectError")
+    assert not state.ready
+
+    state.mark_ready()
+    snapshot = state.snapshot()
+    assert snapshot["ready"]
+    assert snapshot["timeToReadySeconds"] >= 0
+    assert snapshot["steps"]["model"]["status"] == "ok"
+    assert snapshot["steps"]["model"]["detail"] == "Qwen"
+    assert snapshot["steps"]["connections"]["status"] == "error"
+    assert "started" not in snapshot["steps"]["model"]
+
+
+def test_first_request_timer_skips_probes_and_records_once():
+    state = StartupState()
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def send(message):
+        pass
+
+    async def scenario():
+        timer = FirstRequestTimer(app, state)
+        await timer({"type": "http", "path": "/ready"}, None, send)
+        assert state.first_request_seconds is None
+        await timer({"type": "http", "path": "/api/search"}, None, send)
+        first = state.first_request_seconds
+        await timer({"type": "http", "path": "/api/chat"}, None, send)
+        return first
+
+    first = asyncio.run(scenario())
+    assert first is not None
+    assert state.first_request_seconds == first
+
+
+def test_warmup_reports_failed_steps_and_becomes_ready(monkeypatch):
+    state = StartupState()
+    monkeypatch.setattr(main, "startup_state", state)
+
+    async def failing_warm_up(urls):
+        raise RuntimeError("dns")
+
+    async def model():
+        return "model-a"
+
+    monkeypatch.setattr(main, "warm_up", failing_warm_up)
+    monkeypatch.setattr(main, "initialize_model", model)
+    monkeypatch.setattr(main, "preload_static_data", lambda: {"aliases": 1})
+    asyncio.run(main._warm_up_service())
+
+    steps = state.snapshot()["steps"]
+    assert state.ready
+    assert (steps["connections"]["status"], steps["connections"]["detail"]) == ("error", "dns")
+    assert steps["model"]["detail"] == "model-a"
+    assert steps["static_data"]["detail"] == {"aliases": 1}
+
+
+def test_warmup_timeout_still_reports_ready(monkeypatch):
+    state = StartupState()
+    monkeypatch.setattr(main, "startup_state", state)
+    monkeypatch.setattr(main, "WARMUP_TIMEOUT_SECONDS", 0.05)
+
+    async def hanging_model():
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(main, "initialize_model", hanging_model)
+    monkeypatch.setattr(main, "warm_up", lambda urls: asyncio.sleep(0, {}))
+    monkeypatch.setattr(main, "preload_static_data", lambda: {})
+    asyncio.run(main._warm_up_service())
+
+    assert state.ready
+    assert state.snapshot()["steps"]["model"]["status"] == "running"
+
+
+def test_ready_endpoint_returns_503_until_warmup_finishes(monkeypatch):
+    state = StartupState()
+    monkeypatch.setattr(main, "startup_state", state)
+    monkeypatch.setattr(main, "WARMUP_ENABLED", True)
+
+    async def pending_warmup():
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(main, "_warm_up_service", pending_warmup)
+    with TestClient(main.app) as client:
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming_up"
+
+        state.mark_ready()
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
@@ -0,0 +1,72 @@
+import asyncio
+import contextlib
+
+from services.streaming import CoalescingEventQueue, UniversityRefTracker
+
+
+def _uni(name: str, faculty: str = "工学部", **fields) -> dict:
+    return {"name": name, "faculty": faculty, "examType": "一般選抜", **fields}
+
+
+def test_assign_reuses_ref_for_same_entity():
+    tracker = UniversityRefTracker()
+    assert tracker.assign(_uni("東京大学")) == "1"
+    assert tracker.assign(_uni("東京大学")) == "1"
+    assert tracker.assign(_uni("京都大学")) == "2"
+
+
+def test_refs_stay_unique_after_repeated_entities():
+    tracker = UniversityRefTracker()
+    refs = [tracker.assign(_uni(name)) for name in ("東京大学", "東京大学", "京都大学", "東京大学", "大阪大学")]
+    assert refs == ["1", "1", "2", "1", "3"]
+
+
+def test_resolve_sends_only_new_or_changed_records():
+    tracker = UniversityRefTracker()
+    streamed = _uni("東京大学", deviationScore="65")
+    tracker.assign(streamed)
+
+    assert tracker.resolve(dict(streamed)) == ("1", False)
+    chosen = _uni("東京大学", deviationScore="67.5")
+    assert tracker.resolve(chosen) == ("1", True)
+    # 再送後は同じレコードを送り直さない
+    assert tracker.resolve(dict(chosen)) == ("1", False)
+    assert tracker.resolve(_uni("京都大学")) == ("2", True)
+
+
+def test_close_releases_producer_blocked_on_full_queue():
+    async def scenario():
+        queue = CoalescingEventQueue(maxsize=1)
+        await queue.put("university", {"ref": "1"})
+
+        async def producer():
+            try:
+                await queue.put("university", {"ref": "2"})
+            finally:
+                # 検索タスクの finally と同じく、キャンセル後にも終端イベントを送る
+                await queue.put("done", {})
+
+        task = asyncio.create_task(producer())
+        await asyncio.sleep(0)
+        assert not task.done()
+        await queue.close()
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await asyncio.wait_for(task, timeout=1)
+        assert task.done()
+        assert queue.qsize() == 1
+
+    asyncio.run(scenario())
+
+
+def test_progress_events_are_coalesced_per_stage():
+    async def scenario():
+        queue = CoalescingEventQueue(maxsize=2)
+        await queue.put("progress", {"stage": "search", "current": 1})
+        await queue.put("progress", {"stage": "search", "current": 2})
+        await queue.put("progress", {"stage": "filtering", "current": 1})
+        assert queue.qsize() == 2
+        assert queue.coalesced == 1
+        assert await queue.get() == ("progress", {"stage": "search", "current": 2})
+
+    asyncio.run(scenario())
@@ -0,0 +1,72 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from services import suggest
+from services.suggest import SuggestIndex
+
+UNIVERSITIES = ["東京大学", "東京科学大学", "東京都立大学", "東北大学", "京都大学", "大阪大学", "早稲田大学", "慶應義塾大学"]
+
+
+@pytest.fixture
+def index():
+    index = SuggestIndex()
+    index.seed(UNIVERSITIES)
+    return index
+
+
+def _texts(results):
+    return [result["text"] for result in results]
+
+
+def test_prefix_matches_universities_first_and_shortest_first(index):
+    assert _texts(index.suggest("東京", limit=3)) == ["東京大学", "東京科学大学", "東京都立大学"]
+    assert index.suggest("東京")[0]["kind"] == "university"
+
+
+def test_width_and_case_are_normalized(index):
+    assert _texts(index.suggest("ｔｏｋｙｏ")) == []
+    assert _texts(index.suggest("march")) == _texts(index.suggest("ＭＡＲＣＨ")) == ["MARCH", "GMARCH"]
+
+
+def test_aliases_resolve_to_canonical_names(index):
+    assert _texts(index.suggest("東工大"))[0] == "東京科学大学"
+    assert _texts(index.suggest("東京工業"))[0] == "東京科学大学"
+    assert _texts(index.suggest("阪大"))[0] == "大阪大学"
+
+
+def test_group_alias_lists_its_universities(index):
+    (result,) = [result for result in index.suggest("早慶") if result["kind"] == "alias"]
+    assert result["names"] == ["早稲田大学", "慶應義塾大学"]
+
+
+def test_infix_and_typo_matches_fill_remaining_slots(index):
+    assert _texts(index.suggest("稲田"))[0] == "早稲田大学"
+    # 1文字違いでもバイグラムの一致で候補になる
+    assert "慶應義塾大学" in _texts(index.suggest("慶應議塾大学"))
+
+
+def test_limit_and_empty_query(index):
+    assert len(index.suggest("学部", limit=2)) == 2
+    assert index.suggest("  ") == []
+
+
+def test_added_records_invalidate_cache(index):
+    assert _texts(index.suggest("筑波")) == []
+    index.add_records([{"name": "筑波大学", "faculty": "理工学群"}])
+    assert _texts(index.suggest("筑波")) == ["筑波大学"]
+    assert index.suggest("理工学群")[0] == {"text": "理工学群", "kind": "faculty", "names": ["理工学群"]}
+    index.add_records([{"name": "筑波大学"}])
+    assert _texts(index.suggest("筑波")) == ["筑波大学"]
+
+
+def test_suggest_endpoint(monkeypatch, index):
+    monkeypatch.setattr(main, "suggest_index", index)
+    with TestClient(main.app) as client:
+        response = client.get("/api/suggest", params={"q": "京大", "limit": 1})
+        assert response.status_code == 200
+        assert response.json() == {
+            "query": "京大",
+            "suggestions": [{"text": "京都大学", "kind": "university", "names": ["京都大学"]}],
+        }
+        assert client.get("/api/suggest", params={"q": "京", "limit": suggest.NODE_TOP_K + 1}).status_code == 422
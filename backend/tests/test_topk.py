@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from services.summarize import _compact_result, _result_key, _result_priority
+from services.topk import TopKCollector
+
+HOSTS = [
+    "https://passnavi.obunsha.co.jp/univ/",
+    "https://www.keinet.ne.jp/univ/",
+    "https://www.kyoto-u.ac.jp/admissions/",
+    "https://blog.example.com/post/",
+]
+
+
+def _reference(batches, k):
+    """Deduplicate every result in (query, position) order, then stable-sort by priority."""
+    seen = {}
+    for query_index, batch in enumerate(batches):
+        for position, item in enumerate(batch):
+            seen.setdefault(_result_key(item), ((query_index, position), item))
+    ordered = sorted(seen.values(), key=lambda pair: (-_result_priority(pair[1]), pair[0]))
+    return [_compact_result(item) for _, item in ordered[:k]]
+
+
+def _batches(rng, queries=6, per_query=20, distinct=40):
+    return [
+        [
+            {"title": "入試情報", "url": f"{rng.choice(HOSTS)}{rng.randrange(distinct)}", "content": "偏差値"}
+            for _ in range(per_query)
+        ]
+        for _ in range(queries)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("k", [1, 5, 25])
+def test_matches_dedupe_then_sort_for_any_arrival_order(seed, k):
+    rng = random.Random(seed)
+    batches = _batches(rng)
+    arrival = list(enumerate(batches))
+    # クエリの完了順に関係なく同じ結果になること
+    rng.shuffle(arrival)
+
+    collector = TopKCollector(k, priority=_result_priority, key=_result_key, compact=_compact_result)
+    for query_index, batch in arrival:
+        for position, item in enumerate(batch):
+            collector.offer(item, (query_index, position))
+
+    assert collector.results() == _reference(batches, k)
+    assert collector.offered == sum(len(batch) for batch in batches)
+    assert collector.unique == len({_result_key(item) for batch in batches for item in batch})
+
+
+def test_earlier_duplicate_replaces_live_entry():
+    collector = TopKCollector(2, priority=lambda item: item["p"], key=lambda item: item["id"])
+    assert collector.offer({"id": "a", "p": 1, "v": "late"}, (1, 0))
+    assert collector.offer({"id": "a", "p": 1, "v": "early"}, (0, 5))
+    assert not collector.offer({"id": "a", "p": 1, "v": "later"}, (2, 0))
+    assert collector.results() == [{"id": "a", "p": 1, "v": "early"}]
+    assert collector.duplicates == 2
+
+
+def test_lower_priority_results_are_evicted():
+    collector = TopKCollector(2, priority=lambda item: item["p"], key=lambda item: item["id"])
+    for index, priority in enumerate([10, 10, 200, 5, 10]):
+        collector.offer({"id": str(index), "p": priority}, (0, index))
+    assert [item["id"] for item in collector.results()] == ["2", "0"]
+    assert collector.evicted == 1
+
+
+def test_items_without_key_are_ignored():
+    collector = TopKCollector(3, priority=lambda item: 1, key=lambda item: item.get("url", ""))
+    assert not collector.offer({"title": "no url"}, (0, 0))
+    assert collector.results() == []
+
+
+def test_k_must_be_positive():
+    with pytest.raises(ValueError):
+        TopKCollector(0, priority=lambda item: 0, key=lambda item: "")
@@ -0,0 +1,120 @@
+import asyncio
+import json
+
+import pytest
+
+from services import tracing
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = tracing.TraceExporter(buffer_size=2)
+    monkeypatch.setattr(tracing, "exporter", exporter)
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", True)
+    return exporter
+
+
+def test_nested_spans_form_a_tree(exporter):
+    root = tracing.begin_trace("search", faculty="工学部")
+    with tracing.use_span(root):
+        with tracing.start_span("retrieve"):
+            tracing.add_event("cache_miss", {"key": "k"})
+            with tracing.start_span("tavily"):
+                pass
+        with tracing.start_span("summarize"):
+            pass
+    assert exporter.get(root.trace_id) is None
+    root.end()
+
+    data = exporter.get(root.trace_id)
+    assert data["name"] == "search"
+    assert data["status"] == "ok"
+    assert data["spanCount"] == 4
+    (tree,) = data["spans"]
+    assert tree["attributes"] == {"faculty": "工学部"}
+    assert [child["name"] for child in tree["children"]] == ["retrieve", "summarize"]
+    retrieve = tree["children"][0]
+    assert [child["name"] for child in retrieve["children"]] == ["tavily"]
+    assert retrieve["events"][0]["name"] == "cache_miss"
+    assert retrieve["events"][0]["key"] == "k"
+
+
+def test_span_without_parent_starts_and_exports_a_trace(exporter):
+    with tracing.start_span("refresh") as span:
+        assert tracing.current_span() is span
+    assert tracing.current_span() is None
+    assert exporter.get(span.trace_id)["name"] == "refresh"
+
+
+def test_error_and_cancellation_status(exporter):
+    with pytest.raises(ValueError):
+        with tracing.start_span("parse") as failed:
+            raise ValueError("bad")
+    assert exporter.get(failed.trace_id)["status"] == "error"
+    assert exporter.get(failed.trace_id)["spans"][0]["attributes"]["error"] == "ValueError: bad"
+
+    with pytest.raises(asyncio.CancelledError):
+        with tracing.start_span("search") as cancelled:
+            raise asyncio.CancelledError()
+    assert exporter.get(cancelled.trace_id)["status"] == "cancelled"
+
+
+def test_end_is_idempotent(exporter):
+    root = tracing.begin_trace("search")
+    root.end("cancelled")
+    root.end("ok")
+    assert exporter.get(root.trace_id)["status"] == "cancelled"
+
+
+def test_ring_buffer_keeps_latest_traces(exporter):
+    spans = []
+    for name in ("a", "b", "c"):
+        with tracing.start_span(name) as span:
+            spans.append(span)
+
+    assert exporter.get(spans[0].trace_id) is None
+    assert [summary["name"] for summary in exporter.recent()] == ["c", "b"]
+    assert [summary["name"] for summary in exporter.recent(limit=1)] == ["c"]
+
+
+def test_traced_decorator_parents_spans_in_tasks(exporter):
+    @tracing.traced("fetch")
+    async def fetch(value):
+        return value * 2
+
+    async def scenario():
+        root = tracing.begin_trace("search")
+        with tracing.use_span(root):
+            results = await asyncio.gather(fetch(1), asyncio.create_task(fetch(2)))
+        root.end()
+        return root, results
+
+    root, results = asyncio.run(scenario())
+    assert results == [2, 4]
+    data = exporter.get(root.trace_id)
+    assert [child["name"] for child in data["spans"][0]["children"]] == ["fetch", "fetch"]
+
+
+def test_disabled_tracing_uses_noop_spans(exporter, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", False)
+    root = tracing.begin_trace("search")
+    with tracing.use_span(root):
+        with tracing.start_span("retrieve") as span:
+            span.set_attribute("k", "v")
+            assert tracing.current_span() is None
+    root.end()
+    assert root.trace_id == ""
+    assert exporter.recent() == []
+
+
+def test_file_exporter_writes_jsonl(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = tracing.TraceExporter(file_path=str(path))
+    trace = tracing.Trace(exporter)
+    tracing.Span(trace, "search", None, {}).end()
+    for handler in list(exporter._file_logger.handlers):
+        handler.close()
+        exporter._file_logger.removeHandler(handler)
+
+    line = path.read_text(encoding="utf-8").splitlines()[-1]
+    assert json.loads(line)["traceId"] == trace.trace_id
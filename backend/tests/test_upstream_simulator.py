@@ -0,0 +1,85 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.load_test import percentile
+from benchmarks.upstream_simulator import LatencyProfile, SimulatorConfig, create_app
+
+
+def _client(**overrides) -> TestClient:
+    config = SimulatorConfig(
+        latency={name: LatencyProfile(0) for name in ("tavily", "serper", "hf")},
+        token_interval=0.0,
+        seed=1,
+    )
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    return TestClient(create_app(config))
+
+
+def test_latency_profile_parse():
+    assert LatencyProfile.parse("800,0.4") == LatencyProfile(800, 0.4)
+    assert LatencyProfile.parse("200") == LatencyProfile(200, 0.3)
+    assert LatencyProfile(0).sample(None) == 0.0
+
+
+def test_search_results_are_deterministic_per_query():
+    client = _client(results_per_search=4)
+    first = client.post("/tavily/search", json={"query": "関東 工学部", "max_results": 10}).json()
+    second = client.post("/tavily/search", json={"query": "関東 工学部"}).json()
+    assert len(first["results"]) == 4
+    assert first == second
+
+    organic = client.post("/serper/search", json={"q": "関東 工学部", "num": 2}).json()["organic"]
+    assert [hit["link"] for hit in organic] == [hit["url"] for hit in first["results"][:2]]
+    assert client.get("/_stats").json()["calls"] == {"tavily": 2, "serper": 1}
+
+
+def test_rate_limited_requests_get_retry_after():
+    client = _client(rate_limit_ratio=1.0, retry_after=3)
+    response = client.post("/tavily/search", json={"query": "q"})
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "3"
+    assert client.get("/_stats").json()["rateLimited"] == {"tavily": 1}
+
+    client.post("/_reset")
+    assert client.get("/_stats").json() == {"calls": {}, "rateLimited": {}}
+
+
+@pytest.mark.parametrize(
+    "system, check",
+    [
+        ('{"matches": true}', lambda content: json.loads(content)["matches"] is True),
+        ("JSON配列で回答", lambda content: len(json.loads(content)) == 3),
+        ("アドバイザー", lambda content: content.startswith("シミュレーター")),
+    ],
+)
+def test_chat_completion_matches_prompt_shape(system, check):
+    client = _client()
+    messages = [{"role": "system", "content": system}, {"role": "user", "content": "工学部"}]
+    body = client.post("/hf/v1/chat/completions", json={"model": "m", "messages": messages}).json()
+    assert check(body["choices"][0]["message"]["content"])
+    assert body["usage"]["total_tokens"] == body["usage"]["prompt_tokens"] + body["usage"]["completion_tokens"]
+
+
+def test_streamed_completion_reassembles_to_full_text():
+    client = _client()
+    messages = [{"role": "user", "content": "志望校の選び方"}]
+    full = client.post("/hf/v1/chat/completions", json={"messages": messages}).json()
+    with client.stream("POST", "/hf/v1/chat/completions", json={"messages": messages, "stream": True}) as response:
+        lines = [line[len("data: "):] for line in response.iter_lines() if line.startswith("data: ")]
+
+    assert lines[-1] == "[DONE]"
+    chunks = [json.loads(line) for line in lines[:-1]]
+    text = "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks)
+    assert text == full["choices"][0]["message"]["content"]
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+
+
+def test_percentile_nearest_rank():
+    values = [5.0, 1.0, 3.0, 2.0, 4.0]
+    assert percentile(values, 50) == 3.0
+    assert percentile(values, 95) == 5.0
+    assert percentile(values, 0) == 1.0
+    assert percentile([], 50) == 0.0
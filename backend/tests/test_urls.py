@@ -0,0 +1,42 @@
+import pytest
+
+from services.urls import canonicalize_url, dedupe_urls, url_key
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("https://www.u-tokyo.ac.jp/ja/admissions/", "https://www.u-tokyo.ac.jp/ja/admissions/"),
+        ("http://www.example.ac.jp/nyushi", "http://www.example.ac.jp/nyushi"),
+        ("www.example.ac.jp", "https://www.example.ac.jp/"),
+        ("//example.ac.jp/a", "https://example.ac.jp/a"),
+        ("HTTPS://Example.AC.JP:443/a#top", "https://example.ac.jp/a"),
+        ("http://example.ac.jp:80/a", "http://example.ac.jp/a"),
+        ("http://example.ac.jp:8080/a", "http://example.ac.jp:8080/a"),
+        ("https://example.ac.jp/a/./b/../c", "https://example.ac.jp/a/c"),
+        ("https://example.ac.jp/入試", "https://example.ac.jp/%E5%85%A5%E8%A9%A6"),
+        ("https://example.ac.jp/%e5%85%a5%e8%a9%a6", "https://example.ac.jp/%E5%85%A5%E8%A9%A6"),
+    ],
+)
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+def test_tracking_params_are_removed_and_others_sorted():
+    url = "https://example.ac.jp/list?utm_source=x&page=2&gclid=abc&area=kanto&ref=top"
+    assert canonicalize_url(url) == "https://example.ac.jp/list?area=kanto&page=2&ref=top"
+
+
+@pytest.mark.parametrize("value", ["", "   ", "PassNavi", "mailto:info@example.ac.jp", "javascript:void(0)"])
+def test_non_urls_are_dropped(value):
+    assert canonicalize_url(value) == ""
+
+
+def test_url_key_ignores_scheme_www_and_trailing_slash():
+    assert url_key("http://www.example.ac.jp/nyushi/") == url_key("https://example.ac.jp/nyushi")
+    assert url_key("https://example.ac.jp:8080/a") != url_key("https://example.ac.jp/a")
+
+
+def test_dedupe_urls_keeps_first_variant():
+    urls = ["http://example.ac.jp/a", "https://www.example.ac.jp/a/", "https://other.ac.jp", "PassNavi"]
+    assert dedupe_urls(urls, stage=None) == ["http://example.ac.jp/a", "https://other.ac.jp/"]
@@ -0,0 +1,63 @@
+import json
+import threading
+
+from services.verdict_model import FEATURE_NAMES, VerdictModel
+
+
+def _features(value: float) -> list:
+    return [value] * len(FEATURE_NAMES)
+
+
+def test_training_compacts_the_log(tmp_path):
+    path = tmp_path / "verdicts.jsonl"
+    model = VerdictModel(path=str(path), mode="shadow", min_examples=5, retrain_every=5, max_examples=5)
+    for index in range(8):
+        model.record(_features(index), index % 2 == 0)
+    model.train()
+    for index in range(8, 10):
+        model.record(_features(index), index % 2 == 0)
+    model.train()
+
+    rows = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [row["x"][0] for row in rows] == [5, 6, 7, 8, 9]
+
+
+def test_shadow_mode_never_skips_the_llm():
+    model = VerdictModel(mode="shadow", min_examples=4, retrain_every=4)
+    for index in range(40):
+        model.record(_features(float(index % 2)), index % 2 == 1)
+    model.train()
+    assert model.decide(_features(1.0))[0] is None
+
+
+def test_load_puts_logged_verdicts_before_new_ones(tmp_path):
+    path = tmp_path / "verdicts.jsonl"
+    writer = VerdictModel(path=str(path))
+    for index in range(3):
+        writer.record(_features(index), True)
+    writer.close()
+
+    model = VerdictModel(path=str(path))
+    model.decide(_features(0.0))
+    assert len(model._examples) == 0
+    model.record(_features(9), False)
+    assert model.load() == 3
+    assert model.load() == 0
+    assert [features[0] for features, _ in model._examples] == [0, 1, 2, 9]
+
+
+def test_close_and_compaction_do_not_interleave(tmp_path):
+    path = tmp_path / "verdicts.jsonl"
+    model = VerdictModel(path=str(path), max_examples=50)
+    threads = []
+    for index in range(200):
+        model.record(_features(index), index % 2 == 0)
+        if index % 20 == 19:
+            threads.append(threading.Thread(target=model._compact if index % 40 == 19 else model.close))
+            threads[-1].start()
+    for thread in threads:
+        thread.join()
+    model.close()
+    model._compact()
+    rows = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [row["x"][0] for row in rows] == list(range(150, 200))